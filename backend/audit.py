@@ -0,0 +1,171 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+# -----------------------------------------------------------------------------
+# Audit trail of point-affecting events
+#
+# Rows are appended by the crud write paths inside the same transaction as
+# the change itself (record() never commits). Names are resolved at read
+# time, so writes stay a single INSERT. Listing is keyset-paginated on
+# (created_at, id) DESC, which the audit indexes serve directly.
+# -----------------------------------------------------------------------------
+CHECKIN = "checkin"
+CODE_REDEEM = "code_redeem"
+BUDGET_GRANT = "budget_grant"
+POINTS_DISTRIBUTION = "points_distribution"
+
+EXPORT_FIELDS = ["timestamp", "type", "user_name", "lider_name", "sector_name", "description", "points", "is_general"]
+EXPORT_BATCH_SIZE = 1000
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def record(
+    db: Session,
+    event_type: str,
+    *,
+    points: int,
+    user_id: Optional[int] = None,
+    actor_id: Optional[int] = None,
+    sector_id: Optional[int] = None,
+    is_general: bool = False,
+    description: Optional[str] = None,
+    ref_id: Optional[int] = None,
+) -> models.AuditLog:
+    entry = models.AuditLog(
+        created_at=_utcnow(),
+        event_type=event_type,
+        user_id=user_id,
+        actor_id=actor_id,
+        sector_id=sector_id,
+        points=points,
+        is_general=bool(is_general),
+        description=(description or "")[:255] or None,
+        ref_id=ref_id,
+    )
+    db.add(entry)
+    return entry
+
+
+# --- Cursor -------------------------------------------------------------------
+def encode_cursor(created_at: datetime, log_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    ts, log_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(ts), int(log_id)
+
+
+# --- Queries ------------------------------------------------------------------
+def _select(start: Optional[datetime] = None, end: Optional[datetime] = None, sector_id: Optional[int] = None,
+            cursor: Optional[str] = None):
+    receiver = aliased(models.User)
+    actor = aliased(models.User)
+    stmt = (
+        select(
+            models.AuditLog.id,
+            models.AuditLog.created_at,
+            models.AuditLog.event_type,
+            models.AuditLog.points,
+            models.AuditLog.is_general,
+            models.AuditLog.description,
+            receiver.username.label("user_name"),
+            actor.username.label("lider_name"),
+            models.Sector.name.label("sector_name"),
+        )
+        .outerjoin(receiver, receiver.user_id == models.AuditLog.user_id)
+        .outerjoin(actor, actor.user_id == models.AuditLog.actor_id)
+        .outerjoin(models.Sector, models.Sector.sector_id == models.AuditLog.sector_id)
+        .order_by(models.AuditLog.created_at.desc(), models.AuditLog.id.desc())
+    )
+    # Half-open [start, end) range so consecutive windows never overlap.
+    if start is not None:
+        stmt = stmt.where(models.AuditLog.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(models.AuditLog.created_at < end)
+    if sector_id is not None:
+        stmt = stmt.where(models.AuditLog.sector_id == sector_id)
+    if cursor:
+        c_ts, c_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            models.AuditLog.created_at < c_ts,
+            and_(models.AuditLog.created_at == c_ts, models.AuditLog.id < c_id),
+        ))
+    return stmt
+
+
+def _to_item(row) -> dict:
+    return {
+        "timestamp": row.created_at,
+        "type": row.event_type,
+        "user_name": row.user_name or "",
+        "lider_name": row.lider_name or "",
+        "sector_name": row.sector_name or ("Geral" if row.is_general else ""),
+        "description": row.description or "",
+        "points": row.points,
+        "is_general": bool(row.is_general),
+    }
+
+
+def list_logs(db: Session, *, start=None, end=None, sector_id=None, cursor=None, limit: int = 100):
+    """Returns (items, next_cursor). next_cursor is None on the last page."""
+    rows = db.execute(_select(start, end, sector_id, cursor).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more and rows else None
+    return [_to_item(r) for r in rows], next_cursor
+
+
+def _iter_rows(db: Session, start=None, end=None, sector_id=None) -> Iterator:
+    # stream_results -> server-side cursor on Postgres; yield_per keeps
+    # at most one batch of rows in memory regardless of the total.
+    result = db.execute(
+        _select(start, end, sector_id).execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+    for partition in result.partitions():
+        for row in partition:
+            yield row
+
+
+def stream_csv(db: Session, *, start=None, end=None, sector_id=None) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for row in _iter_rows(db, start, end, sector_id):
+        item = _to_item(row)
+        item["timestamp"] = item["timestamp"].isoformat()
+        writer.writerow([item[f] for f in EXPORT_FIELDS])
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(db: Session, *, start=None, end=None, sector_id=None) -> Iterator[str]:
+    chunk = []
+    for row in _iter_rows(db, start, end, sector_id):
+        item = _to_item(row)
+        item["timestamp"] = item["timestamp"].isoformat()
+        chunk.append(json.dumps(item, ensure_ascii=False))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
@@ -0,0 +1,293 @@
+"""Insígnias automáticas.
+
+Uma insígnia com `rule` é concedida sozinha quando o usuário cumpre a regra:
+
+    checkins            `threshold` check-ins (todos, ou só do setor `sector_id`)
+    monthly_points      `threshold` pontos num mesmo mês (geral, ou do setor `sector_id`)
+    perfect_attendance  presença em todas as atividades do setor `sector_id`
+                        (a partir de `threshold` atividades, padrão 1)
+
+Cada check-in/resgate incrementa os contadores do usuário (badge_counters)
+na mesma transação e só as regras ligadas aos contadores que mudaram são
+avaliadas; as concessões entram num INSERT ... ON CONFLICT DO NOTHING.
+Nada de varrer o histórico periodicamente: `rebuild` (contadores a partir
+do histórico + avaliação de todas as regras) só é preciso uma vez, ao
+ativar o motor num banco que já tem pontos. Uma regra nova é avaliada
+só contra os contadores que ela observa, ao ser criada (crud.create_badge).
+
+Uso (na pasta `backend`):
+
+    python badges.py rebuild
+"""
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import cache_bus
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+CHECKINS = "checkins"
+MONTHLY_POINTS = "monthly_points"
+PERFECT_ATTENDANCE = "perfect_attendance"
+RULES = (CHECKINS, MONTHLY_POINTS, PERFECT_ATTENDANCE)
+
+BADGES = "badges"  # escopo do versioning/cache bus: regras mudaram
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# --- Contadores ------------------------------------------------------------------
+def checkins_counter(sector_id: Optional[int] = None) -> str:
+    return CHECKINS if sector_id is None else f"{CHECKINS}:s{sector_id}"
+
+
+def points_counter(when: datetime, sector_id: Optional[int] = None) -> str:
+    name = f"points:{when.year:04d}-{when.month:02d}"
+    return name if sector_id is None else f"{name}:s{sector_id}"
+
+
+def counter_deltas(*, points: int, when: Optional[datetime], is_general: bool, sector_id: Optional[int],
+                   checkin: bool) -> dict[str, int]:
+    """Contadores que um evento de pontos move (mesmo escopo de calculate_points)."""
+    when = when or _utcnow()
+    deltas = {}
+    if checkin:
+        deltas[checkins_counter()] = 1
+        if sector_id is not None:
+            deltas[checkins_counter(sector_id)] = 1
+    if points:
+        if is_general:
+            deltas[points_counter(when)] = points
+        if sector_id is not None:
+            deltas[points_counter(when, sector_id)] = points
+    return deltas
+
+
+def _increment(db: Session, user_id: int, deltas: dict[str, int]) -> dict[str, int]:
+    """Upsert de cada contador; devolve os valores novos."""
+    table = models.BadgeCounter.__table__
+    dialect = db.get_bind().dialect.name
+    values = {}
+    # Ordem fixa: duas transações do mesmo usuário não se travam.
+    for name in sorted(deltas):
+        delta = deltas[name]
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(table).values(user_id=user_id, name=name, value=delta).on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.name], set_={"value": table.c.value + delta},
+            ).returning(table.c.value)
+            values[name] = db.execute(stmt).scalar_one()
+            continue
+        result = db.execute(update(table).where(table.c.user_id == user_id, table.c.name == name)
+                            .values(value=table.c.value + delta))
+        if not result.rowcount:
+            db.execute(table.insert().values(user_id=user_id, name=name, value=delta))
+        values[name] = db.execute(select(table.c.value).where(table.c.user_id == user_id, table.c.name == name)).scalar_one()
+    return values
+
+
+# --- Regras ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class Rule:
+    badge_id: int
+    rule: str
+    threshold: int
+    sector_id: Optional[int]
+
+    @classmethod
+    def of(cls, badge) -> "Rule":
+        """From a Badge (or a row with the same columns) that has a rule."""
+        return cls(badge.badge_id, badge.rule, max(badge.threshold or 1, 1), badge.sector_id)
+
+    def watches(self, name: str) -> bool:
+        """True when the counter `name` feeds this rule."""
+        if self.rule == MONTHLY_POINTS:
+            scoped = name.endswith(f":s{self.sector_id}") if self.sector_id is not None else name.count(":") == 1
+            return name.startswith("points:") and scoped
+        return name == checkins_counter(self.sector_id)
+
+
+class RuleCache:
+    """Regras ativas em memória; recarregadas quando alguém bumpa BADGES."""
+
+    def __init__(self):
+        self._rules: Optional[list[Rule]] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> list[Rule]:
+        rules = self._rules
+        if rules is None:
+            with self._lock:
+                if self._rules is None:
+                    self._rules = load_rules(db)
+                rules = self._rules
+        return rules
+
+    def invalidate(self) -> None:
+        self._rules = None
+
+
+def load_rules(db: Session) -> list[Rule]:
+    rows = db.execute(
+        select(models.Badge.badge_id, models.Badge.rule, models.Badge.threshold, models.Badge.sector_id)
+        .where(models.Badge.rule.in_(RULES))
+    ).all()
+    rules = []
+    for row in rows:
+        if row.rule == PERFECT_ATTENDANCE and row.sector_id is None:
+            logger.warning("badge %s: perfect_attendance sem setor, ignorada", row.badge_id)
+            continue
+        rules.append(Rule.of(row))
+    return rules
+
+
+rules = RuleCache()
+
+
+@cache_bus.subscribe
+def _on_invalidate(keys: frozenset) -> None:
+    if BADGES in keys or cache_bus.ALL in keys:
+        rules.invalidate()
+
+
+def _sector_activity_count(db: Session, sector_id: int) -> int:
+    return db.execute(select(func.count()).select_from(models.Activity).where(models.Activity.sector_id == sector_id)).scalar()
+
+
+def _satisfied(db: Session, rule: Rule, previous: int, value: int) -> bool:
+    if rule.rule == PERFECT_ATTENDANCE:
+        if value < rule.threshold:
+            return False
+        return value >= _sector_activity_count(db, rule.sector_id)
+    # Só no evento que cruza o limite: depois disso não há mais nada a conceder.
+    return previous < rule.threshold <= value
+
+
+def grant(db: Session, awards: Iterable[tuple[int, int]]) -> int:
+    """Concede (user_id, badge_id) em lote, ignorando quem já tem. Devolve quantas entraram."""
+    now = _utcnow()
+    rows = [{"user_id": u, "badge_id": b, "awarded_at": now} for u, b in sorted(set(awards))]
+    return database.insert_ignore(db, models.UserBadge.__table__, rows, ["user_id", "badge_id"])
+
+
+def record(db: Session, user_id: int, *, points: int, when: Optional[datetime] = None, is_general: bool = False,
+           sector_id: Optional[int] = None, checkin: bool = False) -> list[int]:
+    """Chamado pelos caminhos de escrita (sem commit, na mesma transação):
+    move os contadores do usuário e concede o que o evento destravou.
+    Devolve os badge_ids avaliados como cumpridos."""
+    deltas = counter_deltas(points=points, when=when, is_general=is_general, sector_id=sector_id, checkin=checkin)
+    if not deltas:
+        return []
+    values = _increment(db, user_id, deltas)
+    earned = []
+    for rule in rules.get(db):
+        for name, value in values.items():
+            if rule.watches(name) and _satisfied(db, rule, value - deltas[name], value):
+                earned.append(rule.badge_id)
+                break
+    if earned:
+        grant(db, ((user_id, badge_id) for badge_id in earned))
+    return earned
+
+
+# --- Reconstrução (uma vez) ------------------------------------------------------
+def _history(db: Session):
+    """(user_id, points, when, is_general, sector_id, checkin) de todo o histórico."""
+    a = models.Activity
+    yield from db.execute(
+        select(models.CheckIn.user_id, a.points_value, a.activity_date, a.is_general, a.sector_id, True)
+        .join(a, a.activity_id == models.CheckIn.activity_id)
+    ).yield_per(5000)
+    c = models.RedeemCode
+    yield from db.execute(
+        select(models.GeneralCodeRedemption.user_id, c.points_value, c.created_at, c.is_general, c.sector_id, False)
+        .join(c, c.code_id == models.GeneralCodeRedemption.code_id)
+    ).yield_per(5000)
+    yield from db.execute(
+        select(c.assigned_user_id, c.points_value, c.created_at, c.is_general, c.sector_id, False)
+        .where(c.assigned_user_id.isnot(None), c.is_redeemed == True)  # noqa: E712
+    ).yield_per(5000)
+
+
+def rebuild_counters(db: Session) -> dict[tuple[int, str], int]:
+    """Recalcula badge_counters a partir do histórico (varredura completa)."""
+    counters: dict[tuple[int, str], int] = defaultdict(int)
+    for user_id, points, when, is_general, sector_id, checkin in _history(db):
+        for name, delta in counter_deltas(points=points or 0, when=when, is_general=is_general,
+                                          sector_id=sector_id, checkin=checkin).items():
+            counters[(user_id, name)] += delta
+    table = models.BadgeCounter.__table__
+    db.execute(table.delete())
+    rows = [{"user_id": u, "name": n, "value": v} for (u, n), v in counters.items()]
+    for i in range(0, len(rows), database.INSERT_IGNORE_BATCH):
+        db.execute(table.insert(), rows[i:i + database.INSERT_IGNORE_BATCH])
+    return counters
+
+
+def evaluate_all(db: Session, counters: Optional[dict[tuple[int, str], int]] = None) -> int:
+    """Avalia todas as regras para todos os usuários; devolve quantas concessões novas."""
+    if counters is None:
+        counters = {(u, n): v for u, n, v in db.execute(select(models.BadgeCounter.user_id, models.BadgeCounter.name,
+                                                                models.BadgeCounter.value))}
+    active = load_rules(db)
+    activity_counts = {r.sector_id: _sector_activity_count(db, r.sector_id) for r in active if r.rule == PERFECT_ATTENDANCE}
+    awards = set()
+    for (user_id, name), value in counters.items():
+        for rule in active:
+            if not rule.watches(name) or value < rule.threshold:
+                continue
+            if rule.rule == PERFECT_ATTENDANCE and value < activity_counts[rule.sector_id]:
+                continue
+            awards.add((user_id, rule.badge_id))
+    return grant(db, awards)
+
+
+def evaluate_rule(db: Session, rule: Rule) -> int:
+    """Avalia uma regra só (recém-criada) contra os contadores que ela observa;
+    devolve quantas concessões novas."""
+    c = models.BadgeCounter
+    watched = c.name.like("points:%") if rule.rule == MONTHLY_POINTS else c.name == checkins_counter(rule.sector_id)
+    minimum = rule.threshold
+    if rule.rule == PERFECT_ATTENDANCE:
+        minimum = max(minimum, _sector_activity_count(db, rule.sector_id))
+    rows = db.execute(select(c.user_id, c.name).where(watched, c.value >= minimum))
+    return grant(db, ((user_id, rule.badge_id) for user_id, name in rows if rule.watches(name)))
+
+
+def rebuild(db: Session) -> int:
+    counters = rebuild_counters(db)
+    granted = evaluate_all(db, counters)
+    db.commit()
+    return granted
+
+
+def main():
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="recalcula os contadores e concede o que faltar")
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"{rebuild(db)} insígnias concedidas")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
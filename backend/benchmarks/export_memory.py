@@ -0,0 +1,103 @@
+"""Exportação em planilha: memória com streaming x lista materializada.
+
+Semeia dois setores e exporta a presença do maior:
+
+    lista      carrega todas as linhas (.all()) e monta o CSV de uma vez,
+               como faria um endpoint JSON que materializa a lista
+    csv/xlsx   exports.stream(...) consumido pedaço a pedaço (o que o
+               StreamingResponse faz), descartando cada pedaço
+
+Mede o pico de memória Python (tracemalloc) e o tempo de cada modo.
+
+    python benchmarks/export_memory.py --database-url sqlite:///./bench_exports.db --seed-users 5000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+for path in (BENCH_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _measure(fn) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = fn()
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 2), "peak_mb": round(peak / 2**20, 1), "bytes": size}
+
+
+def run(database_url: str) -> dict:
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import sessionmaker
+
+    import exports
+    import models
+
+    engine = create_engine(database_url)
+    db = sessionmaker(bind=engine)()
+    try:
+        sector_id = db.execute(select(models.Activity.sector_id).where(models.Activity.sector_id.isnot(None))
+                               .group_by(models.Activity.sector_id).order_by(func.count().desc()).limit(1)).scalar()
+        export = exports.attendance(sector_id=sector_id)
+        report = {"rows": db.execute(select(func.count()).select_from(export.stmt.order_by(None).subquery())).scalar()}
+
+        def materialized():
+            rows = db.execute(export.stmt).all()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(export.columns)
+            writer.writerows(rows)
+            return len(buffer.getvalue().encode())
+
+        def streamed(fmt):
+            def consume():
+                size = 0
+                for chunk in exports.stream(db, export, fmt):
+                    size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+                return size
+            return consume
+
+        report["lista"] = _measure(materialized)
+        report["csv"] = _measure(streamed(exports.CSV))
+        report["xlsx"] = _measure(streamed(exports.XLSX))
+        return report
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_exports.db")
+    parser.add_argument("--seed-users", type=int, default=5000, help="semeia antes (0 = usar o banco como está)")
+    parser.add_argument("--checkins-per-user", type=int, default=40)
+    parser.add_argument("--json", help="grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    if args.seed_users:
+        import seed as seeder
+        seeder.seed(args.database_url, users=args.seed_users, sectors=2, activities=max(args.checkins_per_user * 2, 100),
+                    checkins_per_user=args.checkins_per_user, general_codes=10, redemptions_per_user=1, months=12)
+    report = run(args.database_url)
+    print(f"\n{args.database_url}  ({report['rows']} linhas)")
+    for mode in ("lista", "csv", "xlsx"):
+        r = report[mode]
+        print(f"{mode:5}: pico {r['peak_mb']} MB, {r['seconds']} s, {r['bytes'] / 2**20:.1f} MB gerados")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Mede o cold start de `import main` com `python -X importtime`.
+
+Cada rodada é um processo novo (sem cache de módulos em memória, mas com
+os .pyc já compilados). Mostra a mediana do tempo cumulativo de `main` e
+os módulos com maior tempo próprio.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --top 15 --budget-ms 1500
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def measure_once(module: str) -> tuple[int, dict[str, int]]:
+    """Returns (cumulative µs of `module`, {module: self µs})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    total = 0
+    self_times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        self_times[name] = self_us
+        if name == module and len(indent) <= 1:
+            total = cumulative_us
+    return total, self_times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Falha (exit 1) se a mediana passar disso")
+    args = parser.parse_args()
+
+    totals = []
+    per_module: dict[str, list[int]] = {}
+    measure_once(args.module)  # aquece o cache de .pyc
+    for _ in range(args.runs):
+        total, self_times = measure_once(args.module)
+        totals.append(total)
+        for name, us in self_times.items():
+            per_module.setdefault(name, []).append(us)
+
+    median_ms = statistics.median(totals) / 1000
+    print(f"import {args.module}: mediana {median_ms:.1f} ms "
+          f"(min {min(totals) / 1000:.1f} / max {max(totals) / 1000:.1f}, {args.runs} rodadas)")
+    print(f"\nTop {args.top} por tempo próprio (mediana):")
+    ranked = sorted(((statistics.median(v), k) for k, v in per_module.items()), reverse=True)
+    for us, name in ranked[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"\nAcima do orçamento de {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
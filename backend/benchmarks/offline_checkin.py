@@ -0,0 +1,124 @@
+"""Check-in offline: verificação de tokens assinados e ingestão em lote.
+
+Mede, em processo:
+
+    verify       checkin_tokens.verify por segundo (só CPU, sem banco)
+    online       crud.create_checkin, um por check-in (o caminho de hoje)
+    lote         crud.ingest_offline_checkins com filas de --batch leituras
+
+Online e lote gravam os mesmos pares (usuário, atividade) em bancos
+idênticos, semeados do zero.
+
+    python benchmarks/offline_checkin.py --users 200 --activities 40 --batch 40
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+for path in (BENCH_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def bench_verify(count: int) -> dict:
+    import checkin_tokens
+
+    start = datetime.utcnow()
+    tokens = [checkin_tokens.issue(i, start) for i in range(1, 1001)]
+    t0 = time.perf_counter()
+    for i in range(count):
+        checkin_tokens.verify(tokens[i % len(tokens)])
+    elapsed = time.perf_counter() - t0
+    return {"tokens": count, "per_s": round(count / elapsed), "us_per_token": round(elapsed / count * 1e6, 2)}
+
+
+def _database(path: str, users: int, activities: int):
+    """Um setor, todos os usuários nele, `activities` atividades de hoje."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    import models
+    from database import Base
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    lider = models.User(email="lider@bench.ritmistas.dev", username="lider", hashed_password="x",
+                        role=models.UserRole.lider, status=models.UserStatus.ACTIVE)
+    db.add(lider)
+    db.flush()
+    sector = models.Sector(name="Bateria", lider_id=lider.user_id)
+    db.add(sector)
+    members = [models.User(email=f"u{i}@bench.ritmistas.dev", username=f"u{i}", hashed_password="x",
+                           status=models.UserStatus.ACTIVE, sectors=[sector]) for i in range(users)]
+    db.add_all(members)
+    now = datetime.utcnow()
+    acts = [models.Activity(title=f"Ensaio {i}", type=models.ActivityType.presencial, points_value=10,
+                            activity_date=now - timedelta(minutes=i), sector=sector, created_by=lider.user_id,
+                            checkin_code=f"B{i:05d}") for i in range(activities)]
+    db.add_all(acts)
+    db.commit()
+    return engine, db, members, acts
+
+
+def bench_ingest(users: int, activities: int, batch: int) -> dict:
+    import checkin_tokens
+    import code_cache
+    import crud
+    import membership
+
+    report = {"checkins": users * activities, "batch": batch}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, db, members, acts = _database(os.path.join(tmp, "online.db"), users, activities)
+        codes = [a.checkin_code for a in acts]
+        t0 = time.perf_counter()
+        for user in members:
+            for code in codes:
+                crud.create_checkin(db, user, code)
+        report["online_s"] = round(time.perf_counter() - t0, 2)
+        db.close()
+        engine.dispose()
+
+        membership.cache.invalidate()
+        code_cache.activities.invalidate()
+        engine, db, members, acts = _database(os.path.join(tmp, "batch.db"), users, activities)
+        tokens = [checkin_tokens.issue(a.activity_id, a.activity_date) for a in acts]
+        t0 = time.perf_counter()
+        for user in members:
+            for i in range(0, len(tokens), batch):
+                crud.ingest_offline_checkins(db, user, [(t, None) for t in tokens[i:i + batch]])
+        report["batch_s"] = round(time.perf_counter() - t0, 2)
+        db.close()
+        engine.dispose()
+    for mode in ("online", "batch"):
+        report[f"{mode}_per_s"] = round(report["checkins"] / report[f"{mode}_s"]) if report[f"{mode}_s"] else 0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verify", type=int, default=200_000, help="tokens verificados")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--activities", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=40, help="leituras por envio da fila")
+    parser.add_argument("--json", help="grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    report = {"verify": bench_verify(args.verify), "ingest": bench_ingest(args.users, args.activities, args.batch)}
+    v, i = report["verify"], report["ingest"]
+    print(f"\nverify : {v['per_s']} tokens/s ({v['us_per_token']} µs cada, {v['tokens']} tokens)")
+    print(f"online : {i['checkins']} check-ins em {i['online_s']} s ({i['online_per_s']}/s)")
+    print(f"lote   : {i['checkins']} check-ins em {i['batch_s']} s ({i['batch_per_s']}/s, lotes de {i['batch']})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Popula um banco com volumes realistas para benchmarks.
+
+Cria setores (com líder), usuários ativos em 1-2 setores, atividades com
+check-ins, códigos gerais com resgates e códigos únicos (parte já
+resgatada). Tudo via INSERTs em lote, com semente fixa para ser
+reproduzível. Grava um manifesto JSON (e-mails, senha, códigos) que o
+gerador de carga usa.
+
+    python benchmarks/seed.py --database-url sqlite:///./bench.db --users 2000
+    python benchmarks/seed.py --database-url postgresql://... --users 20000 --manifest bench.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+
+BATCH_SIZE = 5000
+PASSWORD = "bench-pass-123"
+
+
+def _batched_insert(conn, table, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        conn.execute(insert(table), rows[i:i + BATCH_SIZE])
+
+
+def seed(database_url: str, users: int = 2000, sectors: int = 20, activities: int = 400,
+         checkins_per_user: int = 20, general_codes: int = 100, redemptions_per_user: int = 5,
+         unique_codes_per_user: float = 0.5, months: int = 6, rng_seed: int = 42) -> dict:
+    import migrations
+    import models
+    import security
+
+    rng = random.Random(rng_seed)
+    engine = create_engine(database_url)
+    migrations.upgrade(engine)
+    hashed = security.get_password_hash(PASSWORD)  # um hash só: bcrypt é caro
+    now = datetime.utcnow().replace(microsecond=0)
+
+    def some_date():
+        return now - timedelta(days=rng.randrange(months * 30), minutes=rng.randrange(24 * 60))
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        run = uuid.uuid4().hex[:6]  # permite semear o mesmo banco mais de uma vez
+        admin_email = f"admin-{run}@bench.ritmistas.dev"
+        _batched_insert(conn, models.User.__table__, [dict(
+            external_id=uuid.uuid4(), email=admin_email, username=f"admin-{run}", hashed_password=hashed,
+            role=models.UserRole.admin, status=models.UserStatus.ACTIVE, points_budget=0,
+        )])
+        user_rows = [dict(
+            external_id=uuid.uuid4(), email=f"u{i}-{run}@bench.ritmistas.dev", username=f"u{i}-{run}",
+            nickname=f"Ritmista {i}", hashed_password=hashed,
+            role=models.UserRole.lider if i < sectors else models.UserRole.user,
+            status=models.UserStatus.ACTIVE if rng.random() > 0.02 else models.UserStatus.PENDING,
+            points_budget=10_000 if i < sectors else 0,
+        ) for i in range(users)]
+        _batched_insert(conn, models.User.__table__, user_rows)
+        ids = dict(conn.execute(select(models.User.email, models.User.user_id).where(models.User.email.like(f"%-{run}@bench.ritmistas.dev"))).all())
+        admin_id = ids[admin_email]
+        user_ids = [ids[r["email"]] for r in user_rows]
+
+        sector_rows = [dict(name=f"Setor {s}-{run}", invite_code=uuid.uuid4(), lider_id=user_ids[s]) for s in range(sectors)]
+        _batched_insert(conn, models.Sector.__table__, sector_rows)
+        sector_ids = [sid for (sid,) in conn.execute(
+            select(models.Sector.sector_id).where(models.Sector.name.like(f"Setor %-{run}")).order_by(models.Sector.sector_id))]
+
+        membership: dict[int, list[int]] = {}
+        for i, uid in enumerate(user_ids):
+            own = [sector_ids[i]] if i < sectors else rng.sample(sector_ids, k=1 if rng.random() < 0.7 else 2)
+            membership[uid] = own
+        _batched_insert(conn, models.user_sectors, [
+            {"user_id": uid, "sector_id": sid} for uid, sids in membership.items() for sid in sids
+        ])
+
+        activity_rows = []
+        for a in range(activities):
+            general = rng.random() < 0.2
+            sid = None if general else rng.choice(sector_ids)
+            activity_rows.append(dict(
+                title=f"Ensaio {a}", type=rng.choice(list(models.ActivityType)), activity_date=some_date(),
+                points_value=rng.choice((5, 10, 10, 15, 20)), is_general=general, sector_id=sid,
+                created_by=admin_id if general else user_ids[sector_ids.index(sid)],
+                checkin_code=f"A{run}{a:05d}",
+            ))
+        _batched_insert(conn, models.Activity.__table__, activity_rows)
+        activities_db = conn.execute(
+            select(models.Activity.activity_id, models.Activity.sector_id, models.Activity.checkin_code)
+            .where(models.Activity.checkin_code.like(f"A{run}%"))
+        ).all()
+        general_acts = [a for a in activities_db if a.sector_id is None]
+        acts_by_sector: dict[int, list] = {}
+        for a in activities_db:
+            if a.sector_id is not None:
+                acts_by_sector.setdefault(a.sector_id, []).append(a)
+
+        checkin_rows = []
+        for uid, sids in membership.items():
+            pool = general_acts + [a for sid in sids for a in acts_by_sector.get(sid, [])]
+            for act in rng.sample(pool, k=min(len(pool), checkins_per_user)):
+                checkin_rows.append({"user_id": uid, "activity_id": act.activity_id})
+        _batched_insert(conn, models.CheckIn.__table__, checkin_rows)
+
+        code_rows = []
+        for c in range(general_codes):
+            general = rng.random() < 0.5
+            sid = None if general else rng.choice(sector_ids)
+            code_rows.append(dict(
+                code_string=f"G{run}{c:05d}", points_value=rng.choice((5, 10, 25)), type=models.CodeType.general,
+                is_redeemed=False, created_at=some_date(), is_general=general, sector_id=sid,
+                created_by=admin_id if general else user_ids[sector_ids.index(sid)], title=f"Código {c}",
+                assigned_user_id=None,
+            ))
+        unique_count = int(users * unique_codes_per_user)
+        unique_owner = {}
+        for c in range(unique_count):
+            uid = rng.choice(user_ids)
+            sid = rng.choice(membership[uid])
+            code = f"U{run}{c:06d}"
+            unique_owner[code] = uid
+            code_rows.append(dict(
+                code_string=code, points_value=rng.choice((10, 20, 50)), type=models.CodeType.unique,
+                is_redeemed=rng.random() < 0.5, created_at=some_date(), is_general=False, sector_id=sid,
+                created_by=user_ids[sector_ids.index(sid)], title=None, assigned_user_id=uid,
+            ))
+        _batched_insert(conn, models.RedeemCode.__table__, code_rows)
+        codes_db = conn.execute(
+            select(models.RedeemCode.code_id, models.RedeemCode.code_string, models.RedeemCode.sector_id,
+                   models.RedeemCode.type, models.RedeemCode.is_redeemed)
+            .where(models.RedeemCode.code_string.like(f"_{run}%"))
+        ).all()
+        general_db = [c for c in codes_db if c.type == models.CodeType.general]
+
+        redemption_rows = []
+        for uid, sids in membership.items():
+            pool = [c for c in general_db if c.sector_id is None or c.sector_id in sids]
+            for code in rng.sample(pool, k=min(len(pool), redemptions_per_user)):
+                redemption_rows.append({"user_id": uid, "code_id": code.code_id})
+        _batched_insert(conn, models.GeneralCodeRedemption.__table__, redemption_rows)
+
+    elapsed = time.perf_counter() - started
+    email_of = {uid: r["email"] for uid, r in zip(user_ids, user_rows)}
+    active = {r["email"] for r in user_rows if r["status"] == models.UserStatus.ACTIVE}
+    manifest = {
+        "database_url": engine.url.render_as_string(hide_password=True),
+        "password": PASSWORD,
+        "admin": admin_email,
+        "liders": [{"email": email_of[user_ids[i]], "sector_id": sector_ids[i]} for i in range(sectors)],
+        "users": [{"email": email_of[uid], "user_id": uid, "sectors": sids} for uid, sids in membership.items()
+                  if email_of[uid] in active],
+        "activity_codes": {"general": [a.checkin_code for a in general_acts],
+                           **{str(sid): [a.checkin_code for a in acts] for sid, acts in acts_by_sector.items()}},
+        "general_codes": {"general": [c.code_string for c in general_db if c.sector_id is None],
+                          **{str(sid): [c.code_string for c in general_db if c.sector_id == sid] for sid in sector_ids}},
+        "unique_codes": {email_of[uid]: [code for code, owner in unique_owner.items() if owner == uid]
+                         for uid in set(unique_owner.values())},
+        "counts": {"users": users + 1, "sectors": sectors, "memberships": sum(map(len, membership.values())),
+                   "activities": len(activity_rows), "checkins": len(checkin_rows), "codes": len(code_rows),
+                   "redemptions": len(redemption_rows)},
+        "seconds": round(elapsed, 2),
+    }
+    engine.dispose()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--sectors", type=int, default=20)
+    parser.add_argument("--activities", type=int, default=400)
+    parser.add_argument("--checkins-per-user", type=int, default=20)
+    parser.add_argument("--general-codes", type=int, default=100)
+    parser.add_argument("--redemptions-per-user", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    manifest = seed(args.database_url, users=args.users, sectors=args.sectors, activities=args.activities,
+                    checkins_per_user=args.checkins_per_user, general_codes=args.general_codes,
+                    redemptions_per_user=args.redemptions_per_user, rng_seed=args.seed)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+    print(f"seeded {manifest['database_url']} in {manifest['seconds']}s: {manifest['counts']}")
+    print(f"manifest: {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
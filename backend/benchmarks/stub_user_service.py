@@ -0,0 +1,80 @@
+"""User service falso para rodar benchmarks offline.
+
+Responde às duas rotas que o backend chama no ecossistema:
+  GET /api/v1/users/me                (perfil do token)
+  GET /api/v1/views/zoom-board        (organograma com membros)
+com latência artificial opcional, para que as chamadas de saída
+apareçam nas medições sem depender da rede.
+
+    python benchmarks/stub_user_service.py --port 8099 --latency-ms 20
+    USER_SERVICE_URL=http://127.0.0.1:8099 uvicorn main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # silencioso: roda sob carga
+        pass
+
+    def _json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?", 1)[0]
+        server.hits[path] = server.hits.get(path, 0) + 1
+        if server.latency:
+            time.sleep(server.latency)
+        if path == "/api/v1/users/me":
+            self._json(200, {"full_name": "Ritmista Benchmark", "photo_url": None, "username": None})
+        elif path == "/api/v1/views/zoom-board":
+            self._json(200, {"departments": server.departments})
+        else:
+            self._json(404, {"detail": "not found"})
+
+
+class StubUserService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_ms: float = 0, departments: Optional[list] = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency_ms / 1000
+        self.departments = departments or []
+        self.hits: dict[str, int] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start_background(self) -> "StubUserService":
+        threading.Thread(target=self.serve_forever, name="stub-user-service", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    server = StubUserService(args.port, args.latency_ms)
+    print(f"stub user service on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
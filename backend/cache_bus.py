@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+import versioning
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Cross-worker cache invalidation
+#
+# Every process keeps its own caches (envs snapshot, live leaderboard...).
+# Consumers call subscribe(callback); callback(keys) runs for:
+#   - commits in this process (versioning.on_commit, immediately), and
+#   - commits in any other worker, relayed by a transport:
+#       postgres: NOTIFY sent inside the writing transaction (so it is only
+#                 delivered if the COMMIT succeeds) + one LISTEN connection
+#                 per worker;
+#       file:     an append-only JSON-lines file next to the SQLite database,
+#                 tailed by each worker.
+#
+# Keys are the versioning scopes ("ranking:general", "users", ...) plus a few
+# cache-only keys such as ENVS. ALL means "drop everything": it is delivered
+# when a transport may have missed messages (reconnect, file rotation).
+# Callbacks run on the committing thread or on the transport thread, so they
+# must be cheap and thread-safe (mark stale, schedule work).
+# -----------------------------------------------------------------------------
+CACHE_BUS = os.getenv("CACHE_BUS", "auto").strip().lower()  # auto | postgres | file | off
+CACHE_BUS_CHANNEL = os.getenv("CACHE_BUS_CHANNEL", "ritmistas_cache")
+CACHE_BUS_POLL_SECONDS = float(os.getenv("CACHE_BUS_POLL_SECONDS", "0.5"))
+CACHE_BUS_FILE_MAX_BYTES = int(os.getenv("CACHE_BUS_FILE_MAX_BYTES", str(1024 * 1024)))
+
+ALL = "*"
+ENVS = "envs"
+
+_PG_PAYLOAD_LIMIT = 7900  # NOTIFY payloads must stay under 8000 bytes
+_ORIGIN = uuid.uuid4().hex[:12]
+
+_subscribers: list[Callable[[frozenset], None]] = []
+
+
+def subscribe(callback: Callable[[frozenset], None]) -> Callable[[frozenset], None]:
+    _subscribers.append(callback)
+    return callback
+
+
+def _deliver(keys: frozenset) -> None:
+    for callback in list(_subscribers):
+        try:
+            callback(keys)
+        except Exception:
+            logger.exception("cache bus subscriber failed")
+
+
+# Local commits reach local subscribers without a round trip.
+versioning.on_commit(_deliver)
+
+
+def _encode(keys: Iterable[str]) -> str:
+    payload = json.dumps({"o": _ORIGIN, "k": sorted(keys)}, separators=(",", ":"))
+    if len(payload) > _PG_PAYLOAD_LIMIT:
+        payload = json.dumps({"o": _ORIGIN, "k": [ALL]}, separators=(",", ":"))
+    return payload
+
+
+def _decode(raw: str) -> Optional[frozenset]:
+    """Keys of a message from another process; None for our own or garbage."""
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("o") == _ORIGIN:
+        return None
+    return frozenset(message.get("k") or ())
+
+
+# --- Transports ----------------------------------------------------------------
+class PostgresTransport:
+    def __init__(self, engine, channel: str = CACHE_BUS_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _notify_in_transaction(self, session) -> None:
+        keys = versioning.pending(session)
+        if keys:
+            session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": _encode(keys)})
+
+    def broadcast(self, keys: frozenset) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": _encode(keys)})
+
+    def start(self) -> None:
+        event.listen(Session, "before_commit", self._notify_in_transaction)
+        self._thread = threading.Thread(target=self._run, name="cache-bus-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        event.remove(Session, "before_commit", self._notify_in_transaction)
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        connected_before = False
+        backoff = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                raw.detach()  # dedicated connection, never returned to the pool
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                if connected_before:
+                    _deliver(frozenset({ALL}))  # may have missed notifications while down
+                connected_before, backoff = True, 1.0
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        keys = _decode(conn.notifies.pop(0).payload)
+                        if keys:
+                            _deliver(keys)
+            except Exception as e:
+                logger.warning("cache bus LISTEN connection lost: %s", e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+class FileTransport:
+    """Append-only JSON lines; each worker tails the file from where it started."""
+
+    def __init__(self, path: str, poll_seconds: float = CACHE_BUS_POLL_SECONDS,
+                 max_bytes: int = CACHE_BUS_FILE_MAX_BYTES):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.max_bytes = max_bytes
+        self._offset = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def broadcast(self, keys: frozenset) -> None:
+        line = (_encode(keys) + "\n").encode()
+        if self._size() > self.max_bytes:
+            # Readers notice the shrink and invalidate everything once.
+            with open(self.path, "wb"):
+                pass
+        # O_APPEND writes of one short line land whole, even with several writers.
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def start(self) -> None:
+        self._offset = self._size()
+        versioning.on_commit(self._after_commit)
+        self._thread = threading.Thread(target=self._run, name="cache-bus-tail", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._after_commit in versioning._callbacks:
+            versioning._callbacks.remove(self._after_commit)
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _after_commit(self, keys: frozenset) -> None:
+        try:
+            self.broadcast(keys)
+        except OSError as e:
+            logger.warning("cache bus write failed: %s", e)
+
+    def poll(self) -> None:
+        size = self._size()
+        if size < self._offset:
+            self._offset = 0
+            _deliver(frozenset({ALL}))
+        if size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        complete = data.rfind(b"\n") + 1  # leave a half-written line for the next poll
+        self._offset += complete
+        for line in data[:complete].splitlines():
+            keys = _decode(line.decode(errors="replace"))
+            if keys:
+                _deliver(keys)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning("cache bus read failed: %s", e)
+
+
+# --- Lifecycle -----------------------------------------------------------------
+_transport = None
+
+
+def _choose(engine):
+    mode = CACHE_BUS
+    if mode == "off":
+        return None
+    url = engine.url
+    if mode == "postgres" or (mode == "auto" and url.get_backend_name() == "postgresql"):
+        return PostgresTransport(engine)
+    if mode in ("file", "auto") and url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        return FileTransport(os.getenv("CACHE_BUS_PATH") or f"{url.database}.bus")
+    return None
+
+
+def start(engine) -> None:
+    global _transport
+    if _transport is not None:
+        return
+    _transport = _choose(engine)
+    if _transport is None:
+        logger.info("cache bus: in-process only")
+        return
+    _transport.start()
+    logger.info("cache bus: %s", type(_transport).__name__)
+
+
+def stop() -> None:
+    global _transport
+    transport, _transport = _transport, None
+    if transport is not None:
+        transport.stop()
+
+
+def broadcast(*keys: str) -> None:
+    """Invalidates `keys` in this process and in every other worker, right away
+    (outside any transaction; e.g. after editing the envs table by hand)."""
+    keys = frozenset(keys)
+    _deliver(keys)
+    if _transport is not None:
+        _transport.broadcast(keys)
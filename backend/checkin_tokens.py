@@ -0,0 +1,94 @@
+import base64
+import calendar
+import functools
+import hashlib
+import hmac
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import security
+
+# -----------------------------------------------------------------------------
+# Signed, time-boxed check-in tokens (offline mode)
+#
+# create_activity also issues a token for the QR code:
+#
+#     ck1.<activity_id>.<not_before>.<expires>.<signature>
+#
+# (unix seconds; signature = first 16 bytes of HMAC-SHA256, base64url). The
+# app can scan it with no connectivity and upload the queued scans later in
+# one batch (POST /users/checkin/offline). Verifying a token is pure CPU, no
+# database: the batch is checked first and only the valid claims reach the
+# bulk insert, which still relies on _user_activity_uc for duplicates.
+#
+# The key is CHECKIN_TOKEN_SECRET, or one derived from security.SECRET_KEY.
+# Setting a new CHECKIN_TOKEN_SECRET invalidates every printed QR code.
+# -----------------------------------------------------------------------------
+VERSION = "ck1"
+CHECKIN_TOKEN_EARLY_MINUTES = int(os.getenv("CHECKIN_TOKEN_EARLY_MINUTES", "60"))   # antes do início
+CHECKIN_TOKEN_VALID_HOURS = int(os.getenv("CHECKIN_TOKEN_VALID_HOURS", "12"))        # depois do início
+CHECKIN_OFFLINE_GRACE_HOURS = int(os.getenv("CHECKIN_OFFLINE_GRACE_HOURS", "72"))    # para enviar a fila
+CLOCK_SKEW_SECONDS = 300
+
+_SIGNATURE_BYTES = 16
+
+
+@functools.lru_cache(maxsize=1)
+def _key() -> bytes:
+    # Lazy: security imports crud, which imports this module.
+    secret = os.getenv("CHECKIN_TOKEN_SECRET")
+    if secret:
+        return secret.encode()
+    return hmac.new(security.SECRET_KEY.encode(), b"checkin-token-v1", hashlib.sha256).digest()
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def _timestamp(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return calendar.timegm(value.timetuple())
+
+
+def _sign(body: str) -> str:
+    digest = hmac.new(_key(), body.encode(), hashlib.sha256).digest()[:_SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue(activity_id: int, activity_date: datetime) -> str:
+    """Token valid from CHECKIN_TOKEN_EARLY_MINUTES before the activity until
+    CHECKIN_TOKEN_VALID_HOURS after it starts (deterministic for an activity)."""
+    start = _timestamp(activity_date)
+    not_before = start - CHECKIN_TOKEN_EARLY_MINUTES * 60
+    expires = start + CHECKIN_TOKEN_VALID_HOURS * 3600
+    body = f"{VERSION}.{activity_id}.{not_before}.{expires}"
+    return f"{body}.{_sign(body)}"
+
+
+def verify(token: str, scanned_at: Optional[datetime] = None, now: Optional[datetime] = None) -> int:
+    """Returns the activity_id, or raises InvalidToken. `scanned_at` is when the
+    app read the QR code (defaults to now); it must fall inside the token's
+    window, and the upload must arrive within CHECKIN_OFFLINE_GRACE_HOURS."""
+    try:
+        version, activity_id, not_before, expires, signature = token.strip().split(".")
+        activity_id, not_before, expires = int(activity_id), int(not_before), int(expires)
+    except (AttributeError, ValueError):
+        raise InvalidToken("QR code inválido.")
+    expected = _sign(f"{version}.{activity_id}.{not_before}.{expires}").encode()
+    # Bytes: compare_digest recusa str com caracteres fora do ASCII (TypeError).
+    if version != VERSION or not hmac.compare_digest(signature.encode("utf-8"), expected):
+        raise InvalidToken("QR code inválido.")
+
+    now_ts = _timestamp(now or datetime.now(timezone.utc))
+    scanned_ts = _timestamp(scanned_at) if scanned_at else now_ts
+    if scanned_ts > now_ts + CLOCK_SKEW_SECONDS:
+        raise InvalidToken("Horário da leitura no futuro.")
+    if not (not_before - CLOCK_SKEW_SECONDS <= scanned_ts <= expires + CLOCK_SKEW_SECONDS):
+        raise InvalidToken("Check-in fora do horário da atividade.")
+    if now_ts > expires + CHECKIN_OFFLINE_GRACE_HOURS * 3600:
+        raise InvalidToken("Check-in enviado tarde demais.")
+    return activity_id
+
@@ -0,0 +1,159 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import cache_bus
+import models
+import ttl_cache
+import versioning
+
+# -----------------------------------------------------------------------------
+# Activity / redeem code lookup cache
+#
+# Check-in and redeem codes are looked up by their string on every scan and
+# never change once created, so each worker keeps the immutable fields in a
+# bounded LRU with a TTL. Unknown codes are cached too (for a shorter
+# NEGATIVE_TTL): a burst of guesses costs one query per distinct guess, not
+# one per request. The only mutable part of a code (is_redeemed, for unique
+# codes) is never cached: redeem_code claims it with a conditional UPDATE.
+#
+# Creating or deleting a code calls changed(db, ...), which drops that key in
+# every worker on commit (versioning.notify -> cache bus); this also clears a
+# negative entry left by someone who typed the code before it existed.
+# -----------------------------------------------------------------------------
+CODE_CACHE_TTL_SECONDS = float(os.getenv("CODE_CACHE_TTL_SECONDS", "600"))
+CODE_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("CODE_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+CODE_CACHE_MAX_ENTRIES = int(os.getenv("CODE_CACHE_MAX_ENTRIES", "20000"))
+
+CODES = "codes"                    # cache bus key: everything
+ACTIVITY_PREFIX = "codes:activity:"
+REDEEM_PREFIX = "codes:redeem:"
+
+_MISSING = object()  # cached "no such code"
+
+
+@dataclass(frozen=True)
+class ActivityCode:
+    activity_id: int
+    checkin_code: str
+    points_value: int
+    sector_id: Optional[int]
+    is_general: bool
+    created_by: Optional[int]
+    title: str
+    activity_date: datetime
+
+
+@dataclass(frozen=True)
+class RedeemCodeInfo:
+    code_id: int
+    code_string: str
+    points_value: int
+    sector_id: Optional[int]
+    is_general: bool
+    type: models.CodeType
+    assigned_user_id: Optional[int]
+    created_by: Optional[int]
+    title: Optional[str]
+    created_at: Optional[datetime]
+
+
+class LookupCache(ttl_cache.TTLCache):
+    """TTLCache keyed by code string; misses are stored as _MISSING for negative_ttl."""
+
+    def __init__(self, prefix: str, ttl: float = CODE_CACHE_TTL_SECONDS, negative_ttl: float = CODE_CACHE_NEGATIVE_TTL_SECONDS,
+                 max_entries: int = CODE_CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.prefix = prefix  # cache bus keys are prefix + code
+        self.negative_ttl = negative_ttl
+
+    def put(self, key: str, value, generation: int, ttl: Optional[float] = None) -> None:
+        if ttl is None and value is _MISSING:
+            ttl = self.negative_ttl
+        super().put(key, value, generation, ttl)
+
+
+activities = LookupCache(ACTIVITY_PREFIX)
+redeem_codes = LookupCache(REDEEM_PREFIX)
+
+
+def _activity_stmt(checkin_code: str):
+    a = models.Activity
+    return select(a.activity_id, a.checkin_code, a.points_value, a.sector_id, a.is_general, a.created_by, a.title,
+                  a.activity_date).where(a.checkin_code == checkin_code).limit(1)
+
+
+def _redeem_stmt(code_string: str):
+    c = models.RedeemCode
+    return select(c.code_id, c.code_string, c.points_value, c.sector_id, c.is_general, c.type, c.assigned_user_id,
+                  c.created_by, c.title, c.created_at).where(c.code_string == code_string).limit(1)
+
+
+def _lookup(cache: LookupCache, db: Session, key: str, stmt, factory):
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached is _MISSING else cached
+    generation = cache.generation()
+    row = db.execute(stmt).first()
+    value = factory(*row) if row else None
+    if not _uncommitted(db, cache, key):
+        cache.put(key, _MISSING if value is None else value, generation)
+    return value
+
+
+async def _lookup_async(cache: LookupCache, db: AsyncSession, key: str, stmt, factory):
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached is _MISSING else cached
+    generation = cache.generation()
+    row = (await db.execute(stmt)).first()
+    value = factory(*row) if row else None
+    if not _uncommitted(db.sync_session, cache, key):
+        cache.put(key, _MISSING if value is None else value, generation)
+    return value
+
+
+def _uncommitted(db: Session, cache: LookupCache, key: str) -> bool:
+    # Created/deleted in this transaction: not visible to others yet.
+    pending = versioning.pending(db)
+    return CODES in pending or f"{cache.prefix}{key}" in pending
+
+
+def activity(db: Session, checkin_code: str) -> Optional[ActivityCode]:
+    return _lookup(activities, db, checkin_code, _activity_stmt(checkin_code), ActivityCode)
+
+
+def redeem_code(db: Session, code_string: str) -> Optional[RedeemCodeInfo]:
+    return _lookup(redeem_codes, db, code_string, _redeem_stmt(code_string), RedeemCodeInfo)
+
+
+async def redeem_code_async(db: AsyncSession, code_string: str) -> Optional[RedeemCodeInfo]:
+    return await _lookup_async(redeem_codes, db, code_string, _redeem_stmt(code_string), RedeemCodeInfo)
+
+
+def changed(db: Session, obj: Union[models.Activity, models.RedeemCode, None] = None) -> None:
+    """Call when creating or deleting a code (None = everything); every
+    worker drops it on commit."""
+    if isinstance(obj, models.Activity):
+        versioning.notify(db, f"{ACTIVITY_PREFIX}{obj.checkin_code}")
+    elif isinstance(obj, models.RedeemCode):
+        versioning.notify(db, f"{REDEEM_PREFIX}{obj.code_string}")
+    else:
+        versioning.notify(db, CODES)
+
+
+@cache_bus.subscribe
+def _on_invalidate(keys: frozenset) -> None:
+    if cache_bus.ALL in keys or CODES in keys:
+        activities.invalidate()
+        redeem_codes.invalidate()
+        return
+    for cache in (activities, redeem_codes):
+        dropped = [k[len(cache.prefix):] for k in keys if k.startswith(cache.prefix)]
+        if dropped:
+            cache.invalidate(*dropped)
@@ -0,0 +1,100 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+import cache_bus
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Snapshot of the `envs` table (name -> value of every active row)
+#
+# - one query loads everything; lookups afterwards are dict reads
+# - refreshed every ENV_CACHE_TTL_SECONDS or on demand (refresh/invalidate)
+# - single-flight: only one thread refreshes, the others keep reading the
+#   previous snapshot (or wait, if nothing was loaded yet)
+# - size is bounded by the table itself: misses are not cached per name
+# -----------------------------------------------------------------------------
+ENV_CACHE_TTL_SECONDS = int(os.getenv("ENV_CACHE_TTL_SECONDS", "60"))
+# Backoff when the table is missing/unreachable, so we don't retry per lookup.
+_FAILURE_RETRY_SECONDS = 15
+
+_ENVS_QUERY = text("SELECT name, value FROM envs WHERE active = true")
+
+
+def _load_from_engine() -> dict[str, Optional[str]]:
+    from database import engine
+
+    with engine.connect() as conn:
+        return {name: value for name, value in conn.execute(_ENVS_QUERY)}
+
+
+class EnvStore:
+    def __init__(self, loader: Callable[[], dict] = _load_from_engine, ttl_seconds: int = ENV_CACHE_TTL_SECONDS):
+        self._loader = loader
+        self.ttl_seconds = ttl_seconds
+        self._values: Optional[dict[str, Optional[str]]] = None
+        self._expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.loads = 0  # number of queries issued (handy for tests/metrics)
+
+    def _refresh_locked(self) -> None:
+        self.loads += 1
+        try:
+            values = self._loader()
+            ttl = self.ttl_seconds
+        except Exception as e:
+            # Don't fail if DB is unreachable; callers fall back to os.environ
+            logger.debug("envs snapshot load failed: %s", e)
+            values = self._values if self._values is not None else {}
+            ttl = min(self.ttl_seconds, _FAILURE_RETRY_SECONDS)
+        self._values = values
+        self._expires_at = time.monotonic() + ttl
+
+    def _snapshot(self) -> dict[str, Optional[str]]:
+        values = self._values
+        if values is not None and time.monotonic() < self._expires_at:
+            return values
+
+        if values is None:
+            # Nothing to serve yet: everyone waits for the first load.
+            with self._refresh_lock:
+                if self._values is None or time.monotonic() >= self._expires_at:
+                    self._refresh_locked()
+                return self._values
+
+        # Stale: one thread refreshes, the rest keep using the old snapshot.
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                if time.monotonic() >= self._expires_at:
+                    self._refresh_locked()
+            finally:
+                self._refresh_lock.release()
+        return self._values
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._snapshot().get(name)
+        return value if value is not None else default
+
+    def refresh(self) -> None:
+        """Reloads now (blocking)."""
+        with self._refresh_lock:
+            self._refresh_locked()
+
+    def invalidate(self) -> None:
+        """Marks the snapshot stale; the next lookup reloads it."""
+        self._expires_at = 0.0
+
+
+envs = EnvStore()
+
+
+@cache_bus.subscribe
+def _on_invalidate(keys: frozenset) -> None:
+    # Another worker (or an admin script) changed the envs table.
+    if cache_bus.ENVS in keys or cache_bus.ALL in keys:
+        envs.invalidate()
@@ -0,0 +1,171 @@
+import sys
+import os
+import socketserver
+import threading
+
+import pytest
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Fresh SQLite database per test (never touches dev.db)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    import badges, code_cache, membership
+    # Caches do processo são de outro banco (os ids se repetem entre testes).
+    badges.rules.invalidate()
+    membership.cache.invalidate()
+    code_cache.activities.invalidate()
+    code_cache.redeem_codes.invalidate()
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def staff(db):
+    """Admin e líder ativos, o líder à frente de "Caixa"; "Surdo" sem líder."""
+    admin = models.User(email="adm@b10.local", username="adm", hashed_password="x", role=models.UserRole.admin,
+                        status=models.UserStatus.ACTIVE)
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x", role=models.UserRole.lider,
+                        status=models.UserStatus.ACTIVE)
+    db.add_all([admin, lider])
+    db.flush()
+    caixa = models.Sector(name="Caixa", lider_id=lider.user_id)
+    surdo = models.Sector(name="Surdo")
+    db.add_all([caixa, surdo])
+    db.commit()
+    return admin, lider, caixa, surdo
+
+
+# -----------------------------------------------------------------------------
+# Local debugging SMTP server
+# -----------------------------------------------------------------------------
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP (EHLO/AUTH/MAIL/RCPT/DATA/NOOP/RSET/QUIT) for smtplib."""
+
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self._reply("220 localhost debug SMTP")
+        mail_from, rcpts = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            cmd = line.split(" ", 1)[0].upper()
+            if cmd in ("EHLO", "HELO"):
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 OK\r\n")
+            elif cmd == "AUTH":
+                server.logins += 1
+                self._reply("235 Authentication successful")
+            elif cmd == "MAIL":
+                mail_from, rcpts = line[10:].strip("<>"), []
+                self._reply("250 OK")
+            elif cmd == "RCPT":
+                if server.fail_next:
+                    server.fail_next -= 1
+                    self._reply("550 Mailbox unavailable")
+                    continue
+                rcpts.append(line[8:].strip("<>"))
+                self._reply("250 OK")
+            elif cmd == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline().decode(errors="replace")
+                    if chunk in (".\r\n", ".\n", ""):
+                        break
+                    data.append(chunk)
+                server.messages.append({"from": mail_from, "to": rcpts, "data": "".join(data)})
+                self._reply("250 OK queued")
+            elif cmd in ("NOOP", "RSET"):
+                self._reply("250 OK")
+            elif cmd == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.messages: list[dict] = []
+        self.connections = 0
+        self.logins = 0
+        self.fail_next = 0  # reject the next N recipients with 550
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+
+@pytest.fixture
+def smtp_server():
+    server = DebugSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(session_factory):
+    """TestClient bound to the per-test database (lifespan not started)."""
+    from fastapi.testclient import TestClient
+    import database
+    import main
+
+    def _override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    # Without the lifespan each request runs on its own event loop: don't pool async connections.
+    async_engine = create_async_engine(database.async_url(str(session_factory.kw["bind"].url)), poolclass=NullPool)
+    async_factory = database.async_session_factory(async_engine)
+
+    async def _override_get_async_db():
+        async with async_factory() as session:
+            yield session
+
+    main.app.dependency_overrides[database.get_db] = _override_get_db
+    main.app.dependency_overrides[database.get_async_db] = _override_get_async_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    async_engine.sync_engine.dispose()
+
+
+def auth_headers(user) -> dict:
+    import security
+    token = security.create_access_token(data={"user_uuid": user.external_id, "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
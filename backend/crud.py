@@ -1,11 +1,25 @@
 import models, schemas, security
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, and_, desc, func, extract, select, union_all, update
+from datetime import datetime, timezone
+from typing import Optional
 import secrets
+import random
+import string
 import uuid
 import json
 import urllib.request
 import os
+import metrics
+import audit
+import versioning
+import snapshots
+import badges
+import membership
+import code_cache
+import checkin_tokens
+import database
 
 
 def login_with_google(db: Session, google_data: schemas.GoogleLoginRequest):
@@ -50,10 +64,11 @@ def get_user_by_id(db: Session, user_id: int):
 def get_sector_by_id(db: Session, sector_id: int):
     return db.query(models.Sector).filter(models.Sector.sector_id == sector_id).first()
 def get_sector_by_invite_code(db: Session, invite_code: str):
-    try: return db.query(models.Sector).filter(models.Sector.invite_code == invite_code).first()
+    try: return db.query(models.Sector).filter(models.Sector.invite_code == uuid.UUID(str(invite_code))).first()
     except: return None
 def get_code_by_string(db: Session, code_string: str):
-    return db.query(models.RedeemCode).filter(models.RedeemCode.code_string == code_string).first()
+    """Campos imutáveis do código (code_cache.RedeemCodeInfo), do cache quando possível."""
+    return code_cache.redeem_code(db, code_string)
 
 def generate_system_invite(db: Session):
     chars = string.ascii_uppercase + string.digits
@@ -103,7 +118,9 @@ def get_pending_global_users(db: Session):
 
 def create_sector(db: Session, sector_name: str):
     db_sector = models.Sector(name=sector_name)
-    db.add(db_sector); db.commit(); db.refresh(db_sector)
+    db.add(db_sector)
+    versioning.bump(db, versioning.SECTORS)
+    db.commit(); db.refresh(db_sector)
     return db_sector
 def get_all_sectors(db: Session):
     return db.query(models.Sector).all()
@@ -113,12 +130,7 @@ def join_sector(db: Session, user: models.User, invite_code: str):
     if not sector: return "Código inválido."
     
     # 2. Verifica se já existe o vínculo DIRETO na tabela de associação
-    exists = db.query(models.user_sectors).filter_by(
-        user_id=user.user_id, 
-        sector_id=sector.sector_id
-    ).first()
-    
-    if exists: 
+    if membership.is_member(db, user.user_id, sector.sector_id):
         return "Você já está neste setor."
     
     # 3. INSERÇÃO EXPLÍCITA (Blindada contra falhas de ORM)
@@ -127,16 +139,20 @@ def join_sector(db: Session, user: models.User, invite_code: str):
         sector_id=sector.sector_id
     )
     db.execute(stmt)
+    versioning.bump(db, versioning.ranking_sector(sector.sector_id))
+    membership.changed(db, user.user_id)
     db.commit()
     
     return f"Bem-vindo ao setor {sector.name}!"
 
 def update_user_role(db: Session, user_to_update: models.User, new_role: models.UserRole):
     if new_role == models.UserRole.user and user_to_update.led_sector:
+        versioning.bump(db, versioning.SECTORS, versioning.activities_sector(user_to_update.led_sector.sector_id))
         user_to_update.led_sector.lider_id = None
     user_to_update.role = new_role
     if new_role in [models.UserRole.lider, models.UserRole.admin]:
         user_to_update.status = models.UserStatus.ACTIVE
+    versioning.bump(db, versioning.USERS)
     db.commit(); db.refresh(user_to_update)
     return user_to_update
 
@@ -144,12 +160,170 @@ def assign_lider_to_sector(db: Session, lider_id: int, sector_id: int):
     sector = get_sector_by_id(db, sector_id)
     lider = get_user_by_id(db, lider_id)
     if sector and lider:
-        if sector not in lider.sectors: lider.sectors.append(sector)
+        database.insert_ignore(db, models.user_sectors, [{"user_id": lider.user_id, "sector_id": sector_id}], ["user_id", "sector_id"])
         sector.lider_id = lider.user_id
+        membership.changed(db, lider.user_id)
+        versioning.bump(db, versioning.SECTORS, versioning.ranking_sector(sector_id), versioning.activities_sector(sector_id))
         db.commit()
         return sector
     return None
 
+# --- AÇÕES EM LOTE SOBRE USUÁRIOS (ADMIN) ---
+# Cada ação é um UPDATE/INSERT só para todos os alvos e um commit. Resultado
+# por usuário: ok | unchanged | skipped (não existe ou fora do filtro) | forbidden.
+BULK_USERS_MAX = 1000
+
+def _bulk_targets(db: Session, user_ids: Optional[list[int]] = None, status: Optional[models.UserStatus] = None,
+                  sector_id: Optional[int] = None, role: Optional[models.UserRole] = None):
+    """(user_id, status, role) de quem está em user_ids E no filtro (o que vier)."""
+    u = models.User
+    stmt = select(u.user_id, u.status, u.role)
+    if user_ids is not None:
+        stmt = stmt.where(u.user_id.in_(user_ids))
+    if status is not None:
+        stmt = stmt.where(u.status == status)
+    if role is not None:
+        stmt = stmt.where(u.role == role)
+    if sector_id is not None:
+        members = select(models.user_sectors.c.user_id).where(models.user_sectors.c.sector_id == sector_id)
+        stmt = stmt.where(u.user_id.in_(members))
+    rows = db.execute(stmt.order_by(u.user_id).limit(BULK_USERS_MAX + 1)).all()
+    if len(rows) > BULK_USERS_MAX:
+        raise ValueError(f"Seleção com mais de {BULK_USERS_MAX} usuários; refine o filtro.")
+    return rows
+
+def _bulk_results(user_ids: Optional[list[int]], rows, outcome: dict) -> list[dict]:
+    order = list(dict.fromkeys(user_ids)) if user_ids is not None else [r.user_id for r in rows]
+    return [{"user_id": i, "status": outcome.get(i, "skipped")} for i in order]
+
+def bulk_update_user_status(db: Session, actor: models.User, new_status: models.UserStatus, user_ids=None, **criteria) -> list[dict]:
+    """Aprova/recusa em lote. Só cadastros de usuário comum podem ser recusados."""
+    rows = _bulk_targets(db, user_ids, **criteria)
+    outcome, changing = {}, []
+    for row in rows:
+        if new_status == models.UserStatus.REJECTED and (row.user_id == actor.user_id or row.role != models.UserRole.user):
+            outcome[row.user_id] = "forbidden"
+        elif row.status == new_status:
+            outcome[row.user_id] = "unchanged"
+        else:
+            outcome[row.user_id] = "ok"
+            changing.append(row.user_id)
+    if changing:
+        db.execute(update(models.User).where(models.User.user_id.in_(changing)).values(status=new_status))
+        versioning.bump(db, versioning.USERS)
+        db.commit()
+    return _bulk_results(user_ids, rows, outcome)
+
+def bulk_update_user_role(db: Session, actor: models.User, new_role: models.UserRole, user_ids=None, **criteria) -> list[dict]:
+    """Mesmas regras do update_user_role: líder/admin ficam ACTIVE; quem vira
+    usuário comum deixa de liderar o setor. O admin não muda o próprio papel."""
+    rows = _bulk_targets(db, user_ids, **criteria)
+    promote = new_role in (models.UserRole.lider, models.UserRole.admin)
+    outcome, changing = {}, []
+    for row in rows:
+        if row.user_id == actor.user_id:
+            outcome[row.user_id] = "forbidden"
+        elif row.role == new_role and (not promote or row.status == models.UserStatus.ACTIVE):
+            outcome[row.user_id] = "unchanged"
+        else:
+            outcome[row.user_id] = "ok"
+            changing.append(row.user_id)
+    if changing:
+        values = {"role": new_role}
+        if promote:
+            values["status"] = models.UserStatus.ACTIVE
+        db.execute(update(models.User).where(models.User.user_id.in_(changing)).values(**values))
+        if new_role == models.UserRole.user:
+            led = db.execute(select(models.Sector.sector_id).where(models.Sector.lider_id.in_(changing))).scalars().all()
+            if led:
+                db.execute(update(models.Sector).where(models.Sector.sector_id.in_(led)).values(lider_id=None))
+                versioning.bump(db, versioning.SECTORS, *(versioning.activities_sector(s) for s in led))
+        versioning.bump(db, versioning.USERS)
+        db.commit()
+    return _bulk_results(user_ids, rows, outcome)
+
+def bulk_add_users_to_sector(db: Session, target_sector_id: int, user_ids=None, **criteria) -> list[dict]:
+    rows = _bulk_targets(db, user_ids, **criteria)
+    added = {row.user_id for row in database.insert_ignore(
+        db, models.user_sectors, [{"user_id": r.user_id, "sector_id": target_sector_id} for r in rows],
+        ["user_id", "sector_id"], returning=[models.user_sectors.c.user_id],
+    )}
+    if added:
+        versioning.bump(db, versioning.ranking_sector(target_sector_id))
+        membership.changed(db, *added)
+        db.commit()
+    return _bulk_results(user_ids, rows, {r.user_id: "ok" if r.user_id in added else "unchanged" for r in rows})
+
+# --- IMPORTAÇÃO DE VÍNCULOS (PLANILHA) ---
+MEMBERSHIP_IMPORT_MAX_ROWS = 5000
+
+def import_sector_memberships(db: Session, rows: list[dict]) -> dict:
+    """
+    Vincula usuários a setores em lote. Cada linha traz `email` ou
+    `external_id` e `sector_id` ou `sector` (nome). Usuários e setores são
+    resolvidos em poucas queries (não uma por linha) e os vínculos entram com
+    INSERT ... ON CONFLICT DO NOTHING na chave (user_id, sector_id).
+    Linhas com problema voltam em `errors` (row = posição, a partir de 1).
+    """
+    errors, parsed = [], []
+    emails, external_ids, sector_ids, sector_names = set(), set(), set(), set()
+    for i, row in enumerate(rows, start=1):
+        email = (row.get("email") or "").strip().lower()
+        external_id = str(row.get("external_id") or "").strip()
+        sector_id = str(row.get("sector_id") or "").strip()
+        sector_name = (row.get("sector") or "").strip().lower()
+        if not (email or external_id) or not (sector_id or sector_name):
+            errors.append({"row": i, "detail": "Informe email ou external_id e o setor."})
+            continue
+        try:
+            user_key = ("email", email) if email else ("external_id", uuid.UUID(external_id))
+            sector_key = ("id", int(sector_id)) if sector_id else ("name", sector_name)
+        except ValueError:
+            errors.append({"row": i, "detail": "external_id ou sector_id inválido."})
+            continue
+        (emails if user_key[0] == "email" else external_ids).add(user_key[1])
+        (sector_ids if sector_key[0] == "id" else sector_names).add(sector_key[1])
+        parsed.append((i, user_key, sector_key))
+
+    users, sectors = {}, {}
+    if emails:
+        for user_id, email in db.execute(select(models.User.user_id, func.lower(models.User.email))
+                                         .where(func.lower(models.User.email).in_(emails))):
+            users[("email", email)] = user_id
+    if external_ids:
+        for user_id, external_id in db.execute(select(models.User.user_id, models.User.external_id)
+                                               .where(models.User.external_id.in_(external_ids))):
+            users[("external_id", external_id)] = user_id
+    if sector_ids:
+        for (sector_id,) in db.execute(select(models.Sector.sector_id).where(models.Sector.sector_id.in_(sector_ids))):
+            sectors[("id", sector_id)] = sector_id
+    if sector_names:
+        for sector_id, name in db.execute(select(models.Sector.sector_id, func.lower(models.Sector.name))
+                                          .where(func.lower(models.Sector.name).in_(sector_names))):
+            # Dois setores com o mesmo nome: a linha precisa do sector_id.
+            sectors[("name", name)] = None if ("name", name) in sectors else sector_id
+
+    pairs = {}
+    for i, user_key, sector_key in parsed:
+        if user_key not in users:
+            errors.append({"row": i, "detail": "Usuário não encontrado."})
+        elif sectors.get(sector_key) is None:
+            detail = "Nome de setor repetido; use sector_id." if sector_key in sectors else "Setor não encontrado."
+            errors.append({"row": i, "detail": detail})
+        else:
+            pairs.setdefault((users[user_key], sectors[sector_key]), i)
+
+    inserted = database.insert_ignore(
+        db, models.user_sectors, [{"user_id": u, "sector_id": s} for u, s in pairs],
+        ["user_id", "sector_id"], returning=[models.user_sectors.c.user_id, models.user_sectors.c.sector_id],
+    )
+    if inserted:
+        membership.changed(db, *{u for u, _ in inserted})
+        versioning.bump(db, *{versioning.ranking_sector(s) for _, s in inserted})
+        db.commit()
+    errors.sort(key=lambda e: e["row"])
+    return {"added": len(inserted), "existing": len(pairs) - len(inserted), "errors": errors}
+
 # --- ATIVIDADES COM CÓDIGO ALEATÓRIO ---
 def generate_short_code(length=6):
     chars = string.ascii_uppercase + string.digits
@@ -165,21 +339,90 @@ def create_activity(db: Session, activity_data: schemas.ActivityCreate, creator:
         points_value=activity_data.points_value, sector_id=sector_id, created_by=creator.user_id,
         is_general=is_general, checkin_code=code
     )
-    db.add(new_activity); db.commit(); db.refresh(new_activity)
+    db.add(new_activity)
+    code_cache.changed(db, new_activity)
+    if sector_id is not None:
+        versioning.bump(db, versioning.activities_sector(sector_id))
+    db.commit(); db.refresh(new_activity)
+    new_activity.checkin_token = checkin_tokens.issue(new_activity.activity_id, new_activity.activity_date)
     return new_activity
 
-def create_checkin(db: Session, user: models.User, activity_code: str):
-    # ... (lógica de busca igual à anterior) ...
-    activity = db.query(models.Activity).filter(models.Activity.checkin_code == activity_code).first()
+def create_checkin(db: Session, user: models.User, activity_code: str, commit: bool = True):
+    activity = code_cache.activity(db, activity_code)
     if not activity: return "Código de atividade inválido."
-    if not activity.is_general and activity.sector not in user.sectors:
+    if not activity.is_general and not membership.is_member(db, user.user_id, activity.sector_id):
         return "Você não pertence ao setor desta atividade."
     existing = db.query(models.CheckIn).filter(models.CheckIn.user_id==user.user_id, models.CheckIn.activity_id==activity.activity_id).first()
     if existing: return "Check-in já realizado."
     new_checkin = models.CheckIn(user_id=user.user_id, activity_id=activity.activity_id)
-    db.add(new_checkin); db.commit()
+    db.add(new_checkin)
+    audit.record(db, audit.CHECKIN, points=activity.points_value, user_id=user.user_id, actor_id=activity.created_by,
+                 sector_id=activity.sector_id, is_general=activity.is_general, description=activity.title, ref_id=activity.activity_id)
+    versioning.bump(db, *versioning.ranking_scopes(activity.is_general, activity.sector_id))
+    snapshots.touch(db, activity.activity_date)
+    badges.record(db, user.user_id, points=activity.points_value, when=activity.activity_date,
+                  is_general=activity.is_general, sector_id=activity.sector_id, checkin=True)
+    if commit: db.commit()
+    else: db.flush()
     return f"Check-in realizado! +{activity.points_value} pts"
 
+def ingest_offline_checkins(db: Session, user: models.User, claims: list[tuple[str, Optional[datetime]]]) -> list[dict]:
+    """
+    Check-ins feitos offline (token assinado do QR code + horário da leitura),
+    gravados em lote. Os tokens são conferidos sem banco; as atividades vêm
+    numa query só e os check-ins entram num INSERT ... ON CONFLICT DO NOTHING
+    (o _user_activity_uc descarta repetidos). Um resultado por item, na ordem.
+    """
+    results, valid = [], {}
+    for token, scanned_at in claims:
+        try:
+            activity_id = checkin_tokens.verify(token, scanned_at)
+        except checkin_tokens.InvalidToken as e:
+            results.append({"token": token, "status": "invalid", "detail": str(e)})
+            continue
+        results.append({"token": token, "status": "pending", "activity_id": activity_id})
+        valid.setdefault(activity_id, scanned_at)
+    if not valid:
+        return results
+
+    activities = {a.activity_id: a for a in db.execute(select(models.Activity).where(models.Activity.activity_id.in_(valid))).scalars()}
+    allowed = {i for i, a in activities.items() if a.is_general or membership.is_member(db, user.user_id, a.sector_id)}
+    rows = [{"user_id": user.user_id, "activity_id": i, "timestamp": _naive_utc(valid[i])} for i in sorted(allowed)]
+    inserted = {r.activity_id for r in database.insert_ignore(db, models.CheckIn.__table__, rows, ["user_id", "activity_id"],
+                                                              returning=[models.CheckIn.activity_id])}
+    for activity_id in sorted(inserted):
+        activity = activities[activity_id]
+        audit.record(db, audit.CHECKIN, points=activity.points_value, user_id=user.user_id, actor_id=activity.created_by,
+                     sector_id=activity.sector_id, is_general=activity.is_general, description=activity.title, ref_id=activity_id)
+        versioning.bump(db, *versioning.ranking_scopes(activity.is_general, activity.sector_id))
+        snapshots.touch(db, activity.activity_date)
+        badges.record(db, user.user_id, points=activity.points_value, when=activity.activity_date,
+                      is_general=activity.is_general, sector_id=activity.sector_id, checkin=True)
+    db.commit()
+
+    seen = set()
+    for result in results:
+        activity_id = result.pop("activity_id", None)
+        if activity_id is None:
+            continue
+        if activity_id not in activities:
+            result.update(status="invalid", detail="Código de atividade inválido.")
+        elif activity_id not in allowed:
+            result.update(status="forbidden", detail="Você não pertence ao setor desta atividade.")
+        elif activity_id in inserted and activity_id not in seen:
+            result.update(status="ok", detail=f"Check-in realizado! +{activities[activity_id].points_value} pts")
+        else:
+            result.update(status="duplicate", detail="Check-in já realizado.")
+        seen.add(activity_id)
+    return results
+
+def _naive_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 def create_general_code(db: Session, code_data: schemas.CodeCreateGeneral, creator: models.User):
     is_general = (creator.role == models.UserRole.admin) or code_data.is_general
     sector_id = creator.led_sector.sector_id if creator.led_sector else None
@@ -201,6 +444,9 @@ def create_general_code(db: Session, code_data: schemas.CodeCreateGeneral, creat
         event_date=code_data.event_date
     )
     db.add(new_code)
+    code_cache.changed(db, new_code)
+    if is_general:
+        versioning.bump(db, versioning.CODES_GENERAL)
     db.commit()
     db.refresh(new_code)
     return new_code
@@ -221,27 +467,51 @@ def create_general_code(db: Session, code_data: schemas.CodeCreateGeneral, creat
     db.refresh(new_code)
     return new_code
 
-def redeem_code(db: Session, user: models.User, code: models.RedeemCode):
-    if not code.is_general and code.sector not in user.sectors:
+def redeem_code(db: Session, user: models.User, code: code_cache.RedeemCodeInfo, commit: bool = True):
+    if not code.is_general and not membership.is_member(db, user.user_id, code.sector_id):
         return "Este código é exclusivo de um setor que você não participa."
     if code.type == models.CodeType.unique:
         if code.assigned_user_id != user.user_id: return "Este código não é para você."
-        if code.is_redeemed: return "Código já utilizado."
-        code.is_redeemed = True; db.commit()
+        # is_redeemed não vem do cache: o UPDATE condicional resgata uma vez só, mesmo com requisições simultâneas.
+        claimed = db.execute(
+            update(models.RedeemCode)
+            .where(models.RedeemCode.code_id == code.code_id, models.RedeemCode.is_redeemed == False)  # noqa: E712
+            .values(is_redeemed=True)
+        ).rowcount
+        if not claimed: return "Código já utilizado."
+        _audit_redeem(db, user, code)
+        if commit: db.commit()
+        else: db.flush()
         return f"Resgatado! +{code.points_value} pts"
     if code.type == models.CodeType.general:
         existing = db.query(models.GeneralCodeRedemption).filter(models.GeneralCodeRedemption.user_id == user.user_id, models.GeneralCodeRedemption.code_id == code.code_id).first()
         if existing: return "Você já usou este código."
         new_redemption = models.GeneralCodeRedemption(user_id=user.user_id, code_id=code.code_id)
-        db.add(new_redemption); db.commit()
+        db.add(new_redemption)
+        _audit_redeem(db, user, code)
+        if commit: db.commit()
+        else: db.flush()
         return f"Resgatado! +{code.points_value} pts"
 
-def add_budget_to_lider(db: Session, lider_id: int, points: int):
+def _audit_redeem(db: Session, user: models.User, code: code_cache.RedeemCodeInfo):
+    audit.record(db, audit.CODE_REDEEM, points=code.points_value, user_id=user.user_id, actor_id=code.created_by,
+                 sector_id=code.sector_id, is_general=code.is_general, description=code.title or code.code_string, ref_id=code.code_id)
+    versioning.bump(db, *versioning.ranking_scopes(code.is_general, code.sector_id))
+    snapshots.touch(db, code.created_at)
+    badges.record(db, user.user_id, points=code.points_value, when=code.created_at, is_general=code.is_general,
+                  sector_id=code.sector_id)
+
+def add_budget_to_lider(db: Session, lider_id: int, points: int, actor: models.User = None):
     lider = get_user_by_id(db, lider_id)
-    if lider: lider.points_budget += points; db.commit()
+    if lider:
+        lider.points_budget += points
+        sector_id = lider.led_sector.sector_id if lider.led_sector else None
+        audit.record(db, audit.BUDGET_GRANT, points=points, user_id=lider.user_id, actor_id=actor.user_id if actor else None,
+                     sector_id=sector_id, description="Orçamento adicionado")
+        db.commit()
     return lider
 
-def distribute_points_from_budget(db: Session, lider: models.User, target_user_id: int, points: int, description: str):
+def distribute_points_from_budget(db: Session, lider: models.User, target_user_id: int, points: int, description: str, commit: bool = True):
     if lider.points_budget < points: return False, "Orçamento insuficiente."
     target_user = get_user_by_id(db, target_user_id)
     if not target_user: return False, "Usuário não encontrado."
@@ -260,7 +530,14 @@ def distribute_points_from_budget(db: Session, lider: models.User, target_user_i
         created_by=lider.user_id, 
         assigned_user_id=target_user.user_id
     )
-    db.add(transaction_record); db.commit()
+    db.add(transaction_record); db.flush()
+    code_cache.changed(db, transaction_record)
+    audit.record(db, audit.POINTS_DISTRIBUTION, points=points, user_id=target_user.user_id, actor_id=lider.user_id,
+                 is_general=True, description=description, ref_id=transaction_record.code_id)
+    versioning.bump(db, versioning.RANKING_GENERAL, versioning.CODES_GENERAL)
+    badges.record(db, target_user.user_id, points=points, when=transaction_record.created_at, is_general=True)
+    if commit: db.commit()
+    else: db.flush()
     return True, "Pontos enviados com sucesso!"
 
 def add_last_recovery_code(db: Session, user: models.User, code: str):
@@ -290,26 +567,63 @@ def update_user_password(db: Session, user: models.User, new_password: str):
 
 
 # --- CÁLCULOS ---
-def apply_date_filter(query, model_date_column, month: int = None, year: int = None):
-    if year: query = query.filter(extract('year', model_date_column) == year)
-    if month: query = query.filter(extract('month', model_date_column) == month)
+# Janelas de data semiabertas [início, fim): `coluna >= início AND coluna < fim`
+# usa os índices de activity_date/created_at (extract('month', ...) não usa).
+RANKING_SEASON_START_MONTH = int(os.getenv("RANKING_SEASON_START_MONTH", "1"))
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
+
+def date_window(month: int = None, year: int = None, start=None, end=None):
+    """(início, fim) para mês/ano e/ou um intervalo explícito (fim exclusivo);
+    os dois juntos dão a interseção. None = sem limite daquele lado."""
+    lo = hi = None
+    if year:
+        if month:
+            lo, hi = datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+        else:
+            lo, hi = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    start, end = _as_datetime(start), _as_datetime(end)
+    if start is not None:
+        lo = start if lo is None else max(lo, start)
+    if end is not None:
+        hi = end if hi is None else min(hi, end)
+    return lo, hi
+
+def season_window(season: int, start=None, end=None):
+    """Temporada `season`: de RANKING_SEASON_START_MONTH/season até o mesmo mês do ano
+    seguinte (com o padrão 1, o ano civil), recortada por start/end se vierem."""
+    lo = datetime(season, RANKING_SEASON_START_MONTH, 1)
+    hi = datetime(season + 1, RANKING_SEASON_START_MONTH, 1)
+    start, end = _as_datetime(start), _as_datetime(end)
+    return (lo if start is None else max(lo, start)), (hi if end is None else min(hi, end))
+
+def apply_date_filter(query, model_date_column, month: int = None, year: int = None, start=None, end=None):
+    lo, hi = date_window(month, year, start, end)
+    if lo is not None: query = query.filter(model_date_column >= lo)
+    if hi is not None: query = query.filter(model_date_column < hi)
+    if month and not year:
+        # Mês sem ano = aquele mês de qualquer ano (comportamento antigo, sem índice).
+        query = query.filter(extract('month', model_date_column) == month)
     return query
 
-def calculate_points(db: Session, user_id: int, sector_id: int = None, is_general: bool = False, month: int = None, year: int = None):
+def calculate_points(db: Session, user_id: int, sector_id: int = None, is_general: bool = False, month: int = None, year: int = None, start=None, end=None):
     q_checkin = db.query(func.sum(models.Activity.points_value)).join(models.CheckIn).filter(models.CheckIn.user_id == user_id)
     if is_general: q_checkin = q_checkin.filter(models.Activity.is_general == True)
     elif sector_id: q_checkin = q_checkin.filter(models.Activity.sector_id == sector_id)
-    points_checkin = apply_date_filter(q_checkin, models.Activity.activity_date, month, year).scalar() or 0
+    points_checkin = apply_date_filter(q_checkin, models.Activity.activity_date, month, year, start, end).scalar() or 0
 
     q_general = db.query(func.sum(models.RedeemCode.points_value)).join(models.GeneralCodeRedemption).filter(models.GeneralCodeRedemption.user_id == user_id)
     if is_general: q_general = q_general.filter(models.RedeemCode.is_general == True)
     elif sector_id: q_general = q_general.filter(models.RedeemCode.sector_id == sector_id)
-    points_general = apply_date_filter(q_general, models.RedeemCode.created_at, month, year).scalar() or 0
+    points_general = apply_date_filter(q_general, models.RedeemCode.created_at, month, year, start, end).scalar() or 0
 
     q_unique = db.query(func.sum(models.RedeemCode.points_value)).filter(models.RedeemCode.assigned_user_id == user_id, models.RedeemCode.is_redeemed == True)
     if is_general: q_unique = q_unique.filter(models.RedeemCode.is_general == True)
     elif sector_id: q_unique = q_unique.filter(models.RedeemCode.sector_id == sector_id)
-    points_unique = apply_date_filter(q_unique, models.RedeemCode.created_at, month, year).scalar() or 0
+    points_unique = apply_date_filter(q_unique, models.RedeemCode.created_at, month, year, start, end).scalar() or 0
     return points_checkin + points_general + points_unique
 
 def get_user_points_breakdown(db: Session, user: models.User):
@@ -327,42 +641,169 @@ def get_user_points_breakdown(db: Session, user: models.User):
 def user_to_ranking_entry(user, total):
     return schemas.RankingEntry(user_id=user.user_id, username=user.username, nickname=user.nickname, profile_pic=user.profile_pic, total_points=total)
 
-def get_geral_ranking(db: Session, month: int = None, year: int = None):
-    users = db.query(models.User).filter(models.User.status == models.UserStatus.ACTIVE, models.User.role != models.UserRole.admin).all()
-    ranking = []
-    for user in users:
-        total = calculate_points(db, user.user_id, is_general=True, month=month, year=year)
-        ranking.append(user_to_ranking_entry(user, total))
-    ranking.sort(key=lambda x: x.total_points, reverse=True)
-    return ranking
+# --- Ranking (uma query só, com window functions) ---------------------------
+# Mesma semântica de calculate_points: check-ins + códigos gerais resgatados +
+# códigos únicos resgatados, filtrados por escopo (geral/setor) e mês/ano.
+def _points_events(sector_id: int = None, month: int = None, year: int = None, start=None, end=None):
+    is_general = sector_id is None
+    q_checkin = select(models.CheckIn.user_id.label("user_id"), models.Activity.points_value.label("points")).join(models.Activity, models.Activity.activity_id == models.CheckIn.activity_id)
+    q_checkin = q_checkin.where(models.Activity.is_general == True) if is_general else q_checkin.where(models.Activity.sector_id == sector_id)
+    q_checkin = apply_date_filter(q_checkin, models.Activity.activity_date, month, year, start, end)
 
-def get_sector_ranking(db: Session, sector_id: int, month: int = None, year: int = None):
-    sector = get_sector_by_id(db, sector_id)
-    if not sector: return []
-    ranking = []
-    for user in sector.members:
-        if user.status == models.UserStatus.ACTIVE:
-            total = calculate_points(db, user.user_id, sector_id=sector_id, month=month, year=year)
-            ranking.append(user_to_ranking_entry(user, total))
-    ranking.sort(key=lambda x: x.total_points, reverse=True)
-    return ranking
+    q_general = select(models.GeneralCodeRedemption.user_id.label("user_id"), models.RedeemCode.points_value.label("points")).join(models.RedeemCode, models.RedeemCode.code_id == models.GeneralCodeRedemption.code_id)
+    q_general = q_general.where(models.RedeemCode.is_general == True) if is_general else q_general.where(models.RedeemCode.sector_id == sector_id)
+    q_general = apply_date_filter(q_general, models.RedeemCode.created_at, month, year, start, end)
+
+    q_unique = select(models.RedeemCode.assigned_user_id.label("user_id"), models.RedeemCode.points_value.label("points")).where(models.RedeemCode.assigned_user_id.isnot(None), models.RedeemCode.is_redeemed == True)
+    q_unique = q_unique.where(models.RedeemCode.is_general == True) if is_general else q_unique.where(models.RedeemCode.sector_id == sector_id)
+    q_unique = apply_date_filter(q_unique, models.RedeemCode.created_at, month, year, start, end)
+
+    return union_all(q_checkin, q_general, q_unique).subquery("point_events")
+
+def ranking_query(sector_id: int = None, month: int = None, year: int = None, start=None, end=None):
+    """CTE com uma linha por participante: total_points, rank (RANK, empates
+    dividem a posição), position (ROW_NUMBER, ordem estável) e participants.
+    Escopo geral = usuários ativos não-admin; setor = membros ativos."""
+    events = _points_events(sector_id, month, year, start, end)
+    totals = select(events.c.user_id, func.sum(events.c.points).label("points")).group_by(events.c.user_id).subquery("totals")
+    total = func.coalesce(totals.c.points, 0)
+
+    stmt = select(
+        models.User.user_id, models.User.username, models.User.nickname, models.User.profile_pic,
+        total.label("total_points"),
+        func.rank().over(order_by=total.desc()).label("rank"),
+        func.row_number().over(order_by=(total.desc(), models.User.user_id)).label("position"),
+        func.count().over().label("participants"),
+    ).outerjoin(totals, totals.c.user_id == models.User.user_id).where(models.User.status == models.UserStatus.ACTIVE)
+    if sector_id is None:
+        stmt = stmt.where(models.User.role != models.UserRole.admin)
+    else:
+        stmt = stmt.join(models.user_sectors, models.user_sectors.c.user_id == models.User.user_id).where(models.user_sectors.c.sector_id == sector_id)
+    return stmt.cte("ranking")
+
+def _ranked_entry(row):
+    return schemas.RankedEntry(user_id=row.user_id, username=row.username, nickname=row.nickname, profile_pic=row.profile_pic,
+                               total_points=row.total_points, rank=row.rank, position=row.position)
+
+def _ranking_source(db: Session, sector_id: int = None, month: int = None, year: int = None, start=None, end=None):
+    """Meses fechados saem do snapshot (busca pela PK); o resto é calculado ao vivo."""
+    if month and year and start is None and end is None and snapshots.is_frozen(db, year, month, sector_id):
+        return snapshots.snapshot_query(sector_id, month, year)
+    return ranking_query(sector_id, month, year, start, end)
+
+def _get_ranking(db: Session, sector_id: int = None, month: int = None, year: int = None, start=None, end=None):
+    ranking = _ranking_source(db, sector_id, month, year, start, end)
+    rows = db.execute(select(ranking).order_by(ranking.c.position)).all()
+    return [user_to_ranking_entry(r, r.total_points) for r in rows]
+
+def get_geral_ranking(db: Session, month: int = None, year: int = None, start=None, end=None):
+    return _get_ranking(db, None, month, year, start, end)
+
+def get_sector_ranking(db: Session, sector_id: int, month: int = None, year: int = None, start=None, end=None):
+    return _get_ranking(db, sector_id, month, year, start, end)
+
+def _my_rank_select(ranking, user_id: int, k: int, top_n: int):
+    my_position = select(ranking.c.position).where(ranking.c.user_id == user_id).scalar_subquery()
+    return select(ranking).where(or_(
+        ranking.c.position <= top_n,
+        ranking.c.position.between(my_position - k, my_position + k),
+    )).order_by(ranking.c.position)
+
+def _my_rank_response(rows, user_id: int, k: int, top_n: int, participants: int):
+    me = next((r for r in rows if r.user_id == user_id), None)
+    if me:
+        lo, hi = me.position - k, me.position + k
+        neighbors = [_ranked_entry(r) for r in rows if lo <= r.position <= hi]
+    else:
+        neighbors = []
+    return schemas.MyRankResponse(
+        my_user_id=user_id,
+        my_rank=me.rank if me else None,
+        my_position=me.position if me else None,
+        my_points=me.total_points if me else 0,
+        participants=participants,
+        top=[_ranked_entry(r) for r in rows if r.position <= top_n],
+        neighbors=neighbors,
+    )
+
+def get_my_rank(db: Session, user_id: int, sector_id: int = None, month: int = None, year: int = None, k: int = 5, top_n: int = 10,
+                start=None, end=None):
+    """Posição do usuário, os K vizinhos de cada lado e o top N, numa única
+    ida ao banco (só as linhas pedidas saem do servidor)."""
+    ranking = _ranking_source(db, sector_id, month, year, start, end)
+    rows = db.execute(_my_rank_select(ranking, user_id, k, top_n)).all()
+    if rows:
+        participants = rows[0].participants
+    else:
+        participants = db.execute(select(func.count()).select_from(ranking)).scalar() or 0
+    return _my_rank_response(rows, user_id, k, top_n, participants)
+
+def get_rank_history(db: Session, user_id: int, sector_id: int = None, limit: int = 12):
+    return schemas.RankHistoryResponse(
+        user_id=user_id, sector_id=sector_id,
+        history=[schemas.RankHistoryEntry(**row) for row in snapshots.rank_history(db, user_id, sector_id, limit)],
+    )
+
+# --- Async (AsyncSession) versions of the hot paths -----------------------------
+# Rankings are single SELECTs and run natively. The writes reuse the sync
+# functions through AsyncSession.run_sync: same rules and same audit/versioning
+# hooks, with every statement still awaited on the async driver (the greenlet
+# runs on the event loop, no thread is held while the database answers).
+
+async def get_geral_ranking_async(db: AsyncSession, month: int = None, year: int = None, start=None, end=None):
+    return await _get_ranking_async(db, None, month, year, start, end)
+
+async def get_sector_ranking_async(db: AsyncSession, sector_id: int, month: int = None, year: int = None, start=None, end=None):
+    return await _get_ranking_async(db, sector_id, month, year, start, end)
+
+async def _ranking_source_async(db: AsyncSession, sector_id: int = None, month: int = None, year: int = None, start=None, end=None):
+    if month and year and start is None and end is None and await db.run_sync(snapshots.is_frozen, year, month, sector_id):
+        return snapshots.snapshot_query(sector_id, month, year)
+    return ranking_query(sector_id, month, year, start, end)
+
+async def _get_ranking_async(db: AsyncSession, sector_id: int = None, month: int = None, year: int = None, start=None, end=None):
+    ranking = await _ranking_source_async(db, sector_id, month, year, start, end)
+    rows = (await db.execute(select(ranking).order_by(ranking.c.position))).all()
+    return [user_to_ranking_entry(r, r.total_points) for r in rows]
+
+async def get_my_rank_async(db: AsyncSession, user_id: int, sector_id: int = None, month: int = None, year: int = None, k: int = 5, top_n: int = 10,
+                            start=None, end=None):
+    ranking = await _ranking_source_async(db, sector_id, month, year, start, end)
+    rows = (await db.execute(_my_rank_select(ranking, user_id, k, top_n))).all()
+    if rows:
+        participants = rows[0].participants
+    else:
+        participants = (await db.execute(select(func.count()).select_from(ranking))).scalar() or 0
+    return _my_rank_response(rows, user_id, k, top_n, participants)
+
+async def create_checkin_async(db: AsyncSession, user: models.User, activity_code: str, commit: bool = True):
+    return await db.run_sync(create_checkin, user, activity_code, commit)
+
+async def get_code_by_string_async(db: AsyncSession, code_string: str):
+    return await code_cache.redeem_code_async(db, code_string)
+
+async def redeem_code_async(db: AsyncSession, user: models.User, code: code_cache.RedeemCodeInfo, commit: bool = True):
+    return await db.run_sync(redeem_code, user, code, commit)
 
 def create_badge(db: Session, badge: schemas.BadgeCreate):
     db_badge = models.Badge(**badge.dict())
-    db.add(db_badge); db.commit(); db.refresh(db_badge)
+    db.add(db_badge)
+    if db_badge.rule:
+        db.flush()
+        versioning.bump(db, badges.BADGES)  # recarrega as regras em todos os workers
+        badges.evaluate_rule(db, badges.Rule.of(db_badge))  # quem já cumpre a regra nova recebe agora
+    db.commit(); db.refresh(db_badge)
     return db_badge
 def award_badge(db: Session, user_id: int, badge_id: int):
-    existing = db.query(models.UserBadge).filter_by(user_id=user_id, badge_id=badge_id).first()
-    if existing: return "Usuário já possui."
-    award = models.UserBadge(user_id=user_id, badge_id=badge_id)
-    db.add(award); db.commit()
+    if not badges.grant(db, [(user_id, badge_id)]): return "Usuário já possui."
+    db.commit()
     return "Insígnia concedida!"
 def get_all_badges(db: Session): return db.query(models.Badge).all()
 def get_user_badges(db: Session, user_id: int): return get_user_by_id(db, user_id).badges
 
 def get_pending_users_by_sector(db: Session, sector_id: int): return [] 
 def update_user_status(db: Session, user: models.User, status: models.UserStatus):
-    user.status = status; db.commit(); db.refresh(user); return user
+    user.status = status; versioning.bump(db, versioning.USERS); db.commit(); db.refresh(user); return user
 def update_user_profile(db: Session, user: models.User, data: schemas.UserUpdateProfile):
     if data.username: user.username = data.username
     if data.first_name: user.first_name = data.first_name
@@ -370,6 +811,7 @@ def update_user_profile(db: Session, user: models.User, data: schemas.UserUpdate
     if data.nickname: user.nickname = data.nickname
     if data.birth_date: user.birth_date = data.birth_date
     if data.profile_pic: user.profile_pic = data.profile_pic
+    versioning.bump(db, versioning.USERS)
     db.commit(); db.refresh(user); return user
 
 def sync_user_with_ecosystem(db: Session, payload: dict, token: str = None):
@@ -420,6 +862,7 @@ def sync_user_with_ecosystem(db: Session, payload: dict, token: str = None):
         user.role = models.UserRole.lider
 
     # 2. Extract detailed profile enrichment to be handled by /me
+    versioning.bump(db, versioning.USERS)
     db.commit()
     db.refresh(user)
     return user
@@ -434,7 +877,7 @@ def sync_current_user_profile(db: Session, user: models.User, token: str):
     # Enrich simple profile data
     try:
         req = urllib.request.Request(f"{user_service_url}/api/v1/users/me", headers={"Authorization": f"Bearer {token}"})
-        with urllib.request.urlopen(req, timeout=5) as response:
+        with metrics.track_outbound("user_service", "users_me"), urllib.request.urlopen(req, timeout=5) as response:
             if response.getcode() == 200:
                 data = json.loads(response.read().decode())
                 if data.get("full_name") and not (user.first_name or user.last_name):
@@ -449,10 +892,10 @@ def sync_current_user_profile(db: Session, user: models.User, token: str):
         print(f"Failed to enrich user data: {e}")
 
     # Ensure user has a sector assigned
-    if not user.sector_id:
+    if not user.sectors:
         zoom_url = f"{user_service_url}/api/v1/views/zoom-board?include=members&depth=5"
         try:
-            with urllib.request.urlopen(zoom_url, timeout=5) as response:
+            with metrics.track_outbound("user_service", "zoom_board"), urllib.request.urlopen(zoom_url, timeout=5) as response:
                 if response.getcode() == 200:
                     data = json.loads(response.read().decode())
                     departments = data.get("departments", [])
@@ -471,13 +914,18 @@ def sync_current_user_profile(db: Session, user: models.User, token: str):
                     if sector_name:
                         sector = db.query(models.Sector).filter(models.Sector.name == sector_name).first()
                         if not sector:
-                            sector = models.Sector(name=sector_name, invite_code=secrets.token_hex(4).upper())
+                            sector = models.Sector(name=sector_name)
                             db.add(sector)
                             db.flush()
-                        user.sector_id = sector.sector_id
+                            versioning.bump(db, versioning.SECTORS)
+                        user.sectors.append(sector)
+                        versioning.bump(db, versioning.ranking_sector(sector.sector_id))
+                        membership.changed(db, user.user_id)
         except Exception as e:
             print(f"Failed to find user in zoom-board: {e}")
 
+    if db.is_modified(user):
+        versioning.bump(db, versioning.USERS)
     db.commit()
     db.refresh(user)
     return user
@@ -489,7 +937,7 @@ def sync_departments_and_members(db: Session):
     zoom_url = f"{user_service_url}/api/v1/views/zoom-board?include=members&depth=5"
     
     try:
-        with urllib.request.urlopen(zoom_url, timeout=10) as response:
+        with metrics.track_outbound("user_service", "zoom_board_sync"), urllib.request.urlopen(zoom_url, timeout=10) as response:
             if response.getcode() != 200:
                 return {"error": f"User service returned {response.getcode()}"}
             data = json.loads(response.read().decode())
@@ -506,7 +954,7 @@ def sync_departments_and_members(db: Session):
         # 1. Sync Sector
         sector = db.query(models.Sector).filter(models.Sector.name == name).first()
         if not sector:
-            sector = models.Sector(name=name, invite_code=secrets.token_hex(4).upper())
+            sector = models.Sector(name=name)
             db.add(sector)
             db.flush()
             stats["sectors_created"] += 1
@@ -534,10 +982,10 @@ def sync_departments_and_members(db: Session):
                     db.add(user)
                     db.flush()
                 
-                # Assign to sector (if not already assigned or needs update)
-                # In Ritmistas, Sector is currently 1 per user or a relationship
-                # Let's check models.py for User relationship to Sector
-                user.sector_id = sector.sector_id
+                # Assign to sector (N:N via user_sectors)
+                if sector not in user.sectors:
+                    user.sectors.append(sector)
+                    versioning.bump(db, versioning.ranking_sector(sector.sector_id))
                 stats["members_synced"] += 1
             except Exception as e:
                 print(f"Error syncing member {ext_id}: {e}")
@@ -549,6 +997,8 @@ def sync_departments_and_members(db: Session):
     for d in departments:
         process_dept(d)
 
+    versioning.bump(db, versioning.USERS, versioning.SECTORS)
+    membership.changed(db)
     db.commit()
     return stats
 
@@ -563,19 +1013,18 @@ def get_users_by_sector(db: Session, sector_id: int):
 def delete_user(db: Session, user_to_delete: models.User):
     db.query(models.GeneralCodeRedemption).filter(models.GeneralCodeRedemption.user_id == user_to_delete.user_id).delete()
     db.query(models.CheckIn).filter(models.CheckIn.user_id == user_to_delete.user_id).delete()
-    db.delete(user_to_delete); db.commit(); return True
+    db.delete(user_to_delete); versioning.bump(db, versioning.USERS, versioning.SECTORS); membership.changed(db, user_to_delete.user_id)
+    db.commit(); return True
 
 def get_user_dashboard_details(db: Session, user_id: int, sector_id: int):
     user = get_user_by_id(db, user_id)
     points, total = get_user_points_breakdown(db, user)
     return {"user_id": user.user_id, "username": user.username, "total_points": total, "checkins": [], "redeemed_codes": []}
 
-def get_audit_logs_json(db: Session, limit=100):
-    logs = []
-    # (Mesma lógica de logs anterior...)
-    return logs 
-def generate_audit_csv(db: Session):
-    return "" # Placeholder
+def get_audit_logs_json(db: Session, limit=100, start=None, end=None, sector_id=None, cursor=None):
+    return audit.list_logs(db, start=start, end=end, sector_id=sector_id, cursor=cursor, limit=limit)
+def generate_audit_csv(db: Session, start=None, end=None, sector_id=None):
+    return audit.stream_csv(db, start=start, end=end, sector_id=sector_id)
 def get_general_codes(db: Session):
     return db.query(models.RedeemCode).filter(models.RedeemCode.is_general == True).order_by(models.RedeemCode.created_at.desc()).all()
 def get_all_users(db: Session): return db.query(models.User).filter(models.User.role == models.UserRole.user).all()
@@ -1,6 +1,13 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from fastapi import Depends, Request
+from dataclasses import dataclass
+from typing import Optional
+import threading
+import time
 import os
 import logging
 
@@ -9,30 +16,404 @@ logger = logging.getLogger(__name__)
 # --- CONFIGURATION FROM ENVIRONMENT ---
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dev.db")
 
+# Optional read replica for heavy read-only endpoints (ranking, listings)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+
 # Automatically fix "postgres://" -> "postgresql://" for SQLAlchemy
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+if DATABASE_READ_URL.startswith("postgres://"):
+    DATABASE_READ_URL = DATABASE_READ_URL.replace("postgres://", "postgresql://", 1)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning("Invalid integer for %s, using %s", name, default)
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    url: str
+    pool_size: int = 20
+    max_overflow: int = 10
+    pool_recycle: int = 1800          # seconds; -1 disables
+    pool_pre_ping: bool = True
+    pool_timeout: int = 30            # seconds waiting for a free connection
+    statement_timeout_ms: int = 15000 # 0 disables (Postgres only)
+    idle_in_transaction_timeout_ms: int = 60000  # 0 disables (Postgres only)
+    sqlite_wal: bool = True
+    sqlite_busy_timeout_ms: int = 5000
+
+    @staticmethod
+    def load(url: str = None) -> "DatabaseSettings":
+        return DatabaseSettings(
+            url=url or DATABASE_URL,
+            pool_size=_env_int("DB_POOL_SIZE", 20),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+            statement_timeout_ms=_env_int("DB_STATEMENT_TIMEOUT_MS", 15000),
+            idle_in_transaction_timeout_ms=_env_int("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", 60000),
+            sqlite_wal=_env_bool("SQLITE_WAL", True),
+            sqlite_busy_timeout_ms=_env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        )
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.url.startswith("sqlite")
+
+    @property
+    def is_sqlite_memory(self) -> bool:
+        return self.is_sqlite and make_url(self.url).database in (None, "", ":memory:")
+
+    def engine_kwargs(self) -> dict:
+        if self.is_sqlite:
+            return {"connect_args": {"check_same_thread": False}}
+
+        # Production-ready PostgreSQL settings
+        options = []
+        if self.statement_timeout_ms > 0:
+            options.append(f"-c statement_timeout={self.statement_timeout_ms}")
+        if self.idle_in_transaction_timeout_ms > 0:
+            options.append(f"-c idle_in_transaction_session_timeout={self.idle_in_transaction_timeout_ms}")
+        kwargs = {
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_recycle": self.pool_recycle,
+            "pool_timeout": self.pool_timeout,
+        }
+        if options:
+            # Applied once per physical connection, so every session inherits them.
+            kwargs["connect_args"] = {"options": " ".join(options)}
+        return kwargs
+
+    def describe(self) -> dict:
+        safe_url = make_url(self.url).render_as_string(hide_password=True)
+        if self.is_sqlite:
+            return {
+                "url": safe_url,
+                "journal_mode": "WAL" if self.sqlite_wal and not self.is_sqlite_memory else "default",
+                "synchronous": "NORMAL" if self.sqlite_wal else "default",
+                "busy_timeout_ms": self.sqlite_busy_timeout_ms,
+            }
+        return {
+            "url": safe_url,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_timeout": self.pool_timeout,
+            "statement_timeout_ms": self.statement_timeout_ms,
+            "idle_in_transaction_timeout_ms": self.idle_in_transaction_timeout_ms,
+        }
+
+
+def _install_sqlite_pragmas(engine, settings: DatabaseSettings):
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+            if settings.sqlite_wal:
+                # WAL lets readers proceed while a writer commits; NORMAL is
+                # durable across app crashes (only an OS crash can lose the tail).
+                if not settings.is_sqlite_memory:
+                    cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+        finally:
+            cursor.close()
+
+
+def async_url(url: str) -> str:
+    """Same database through the async drivers: asyncpg (Postgres) / aiosqlite (SQLite)."""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend == "postgresql":
+        u = u.set(drivername="postgresql+asyncpg")
+    elif backend == "sqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    return u.render_as_string(hide_password=False)
+
+
+def create_configured_async_engine(settings: DatabaseSettings):
+    from sqlalchemy.ext.asyncio import create_async_engine
 
-# Configuration for Engine
-engine_args = {}
+    kwargs = settings.engine_kwargs()
+    if settings.is_sqlite:
+        kwargs = {}  # aiosqlite runs each connection in its own thread already
+    elif "connect_args" in kwargs:
+        # asyncpg has no libpq "options"; the same GUCs go in server_settings.
+        server_settings = {}
+        if settings.statement_timeout_ms > 0:
+            server_settings["statement_timeout"] = str(settings.statement_timeout_ms)
+        if settings.idle_in_transaction_timeout_ms > 0:
+            server_settings["idle_in_transaction_session_timeout"] = str(settings.idle_in_transaction_timeout_ms)
+        kwargs["connect_args"] = {"server_settings": server_settings}
+    engine = create_async_engine(async_url(settings.url), **kwargs)
+    if settings.is_sqlite:
+        _install_sqlite_pragmas(engine.sync_engine, settings)
+    return engine
 
-if DATABASE_URL.startswith("sqlite"):
-    engine_args["connect_args"] = {"check_same_thread": False}
-else:
-    # Production-ready PostgreSQL settings
-    engine_args.update({
-        "pool_pre_ping": True,
-        "pool_size": 20,
-        "max_overflow": 10,
-    })
 
-engine = create_engine(DATABASE_URL, **engine_args)
+def create_configured_engine(settings: DatabaseSettings):
+    engine = create_engine(settings.url, **settings.engine_kwargs())
+    if settings.is_sqlite:
+        _install_sqlite_pragmas(engine, settings)
+    return engine
+
+
+def log_settings():
+    """Logs the effective database settings (password masked). Called at startup."""
+    for key, value in settings.describe().items():
+        logger.info("database.%s = %s", key, value)
+    if read_settings is not None:
+        for key, value in read_settings.describe().items():
+            logger.info("database.read.%s = %s", key, value)
+        logger.info("database.read.read_after_write_seconds = %s", READ_AFTER_WRITE_SECONDS)
+
+
+settings = DatabaseSettings.load()
+engine = create_configured_engine(settings)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+read_settings = DatabaseSettings.load(DATABASE_READ_URL) if DATABASE_READ_URL else None
+read_engine = create_configured_engine(read_settings) if read_settings else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Depois de escrever, o próprio usuário lê do primário por esta janela para
+# não "perder" o check-in recém-feito por causa do atraso de replicação.
+READ_AFTER_WRITE_SECONDS = _env_int("DB_READ_AFTER_WRITE_SECONDS", 10)
+# Se a réplica falhar, as leituras vão para o primário por este período.
+REPLICA_RETRY_SECONDS = _env_int("DB_REPLICA_RETRY_SECONDS", 30)
+
+
+class RecentWriters:
+    """In-process map actor -> last commit time, pruned lazily."""
+
+    def __init__(self, window_seconds: int, max_entries: int = 50000):
+        self.window = window_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._last_write: dict[str, float] = {}
+
+    def mark(self, actor: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[actor] = now
+            if len(self._last_write) > self.max_entries:
+                cutoff = now - self.window
+                self._last_write = {k: v for k, v in self._last_write.items() if v >= cutoff}
+
+    def is_recent(self, actor: Optional[str]) -> bool:
+        if not actor:
+            return False
+        ts = self._last_write.get(actor)
+        return ts is not None and time.monotonic() - ts < self.window
+
+
+recent_writers = RecentWriters(READ_AFTER_WRITE_SECONDS)
+_replica_down_until = 0.0
+
+
+def set_actor(db: Session, actor: Optional[str]) -> None:
+    """Associates the authenticated user (JWT sub) with the session for read-after-write routing."""
+    if actor:
+        db.info["actor"] = str(actor)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _flag_orm_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _flag_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_writer(session):
+    if session.info.pop("wrote", False):
+        actor = session.info.get("actor")
+        if actor:
+            recent_writers.mark(actor)
+
+
+INSERT_IGNORE_BATCH = 500  # linhas por INSERT multi-VALUES (limite de parâmetros do SQLite)
+
+
+def insert_ignore(db: Session, table, rows: list[dict], index_elements: list[str], returning=None):
+    """
+    Bulk INSERT that skips rows hitting the unique key `index_elements`
+    (ON CONFLICT DO NOTHING on PostgreSQL/SQLite; row by row with a savepoint
+    elsewhere). Returns how many rows were actually inserted or, with
+    `returning` (a list of columns), those columns of the inserted rows.
+    """
+    inserted = []
+    if not rows:
+        return inserted if returning is not None else 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        count = 0
+        for i in range(0, len(rows), INSERT_IGNORE_BATCH):
+            stmt = insert(table).values(rows[i:i + INSERT_IGNORE_BATCH]).on_conflict_do_nothing(index_elements=index_elements)
+            if returning is not None:
+                inserted.extend(db.execute(stmt.returning(*returning)).all())
+            else:
+                count += db.execute(stmt).rowcount
+        return inserted if returning is not None else count
+    from sqlalchemy.exc import IntegrityError
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(table.insert().values(**row))
+            inserted.append(tuple(row[c.name] for c in returning) if returning is not None else row)
+        except IntegrityError:
+            pass
+    return inserted if returning is not None else len(inserted)
+
+
+def _request_actor(request: Request) -> Optional[str]:
+    auth = request.headers.get("authorization", "")
+    if not auth.lower().startswith("bearer "):
+        return None
+    try:
+        from jose import jwt
+        # Sem verificar assinatura: só decide de qual banco ler; a autenticação
+        # continua sendo feita por security.get_current_user.
+        claims = jwt.get_unverified_claims(auth[7:].strip())
+    except Exception:
+        return None
+    return claims.get("sub") or claims.get("email")
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)):
+    """
+    Session for read-only endpoints. Uses the replica when DATABASE_READ_URL is
+    set; falls back to the primary (reusing the request's primary session) when
+    there is no replica, the replica is unreachable, or the caller committed a
+    write within READ_AFTER_WRITE_SECONDS.
+    """
+    global _replica_down_until
+    if (
+        read_engine is engine
+        or time.monotonic() < _replica_down_until
+        or recent_writers.is_recent(_request_actor(request))
+    ):
+        yield primary
+        return
+
+    db = ReadSessionLocal()
+    try:
+        # Checkout now so a dead replica falls back before the handler runs.
+        db.connection()
+    except OperationalError as e:
+        db.close()
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        logger.warning("Read replica unavailable, using primary for %ss: %s", REPLICA_RETRY_SECONDS, e)
+        yield primary
+        return
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# --- Async path (asyncpg / aiosqlite) -------------------------------------------
+# Used by the hottest routes (check-in, resgate, rankings): an `async def`
+# route waits on the database without holding one of the ~40 threadpool
+# slots Starlette gives to sync routes. The engines are created on first use,
+# so the async drivers are only needed by processes that serve those routes.
+_async_engines: dict = {}
+
+
+def get_async_engine(read: bool = False):
+    key = "read" if read and read_settings is not None else "primary"
+    if key not in _async_engines:
+        _async_engines[key] = create_configured_async_engine(read_settings if key == "read" else settings)
+    return _async_engines[key]
+
+
+def async_session_factory(async_engine):
+    """AsyncSession factory whose sync sessions carry the SessionLocal hooks
+    (read-after-write marks, change counters)."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    # expire_on_commit=False: attributes can't lazy-load after commit outside the greenlet.
+    return async_sessionmaker(async_engine, sync_session_class=SessionLocal.class_, expire_on_commit=False)
+
+
+_async_factories: dict = {}
+
+
+def _async_session(read: bool = False):
+    async_engine = get_async_engine(read)
+    factory = _async_factories.get(async_engine)
+    if factory is None:
+        factory = _async_factories[async_engine] = async_session_factory(async_engine)
+    return factory()
+
+
+async def dispose_async_engines() -> None:
+    engines = list(_async_engines.values())
+    _async_engines.clear()
+    _async_factories.clear()
+    for async_engine in engines:
+        await async_engine.dispose()
+
+
+async def get_async_db():
+    async with _async_session() as db:
+        yield db
+
+
+async def get_async_read_db(request: Request, primary=Depends(get_async_db)):
+    """Async counterpart of get_read_db (same replica / read-after-write rules)."""
+    global _replica_down_until
+    if (
+        read_engine is engine
+        or time.monotonic() < _replica_down_until
+        or recent_writers.is_recent(_request_actor(request))
+    ):
+        yield primary
+        return
+
+    db = _async_session(read=True)
+    try:
+        await db.connection()
+    except OperationalError as e:
+        await db.close()
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        logger.warning("Read replica unavailable, using primary for %ss: %s", REPLICA_RETRY_SECONDS, e)
+        yield primary
+        return
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,205 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+from sqlalchemy import DateTime, cast, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+import crud
+import models
+
+# -----------------------------------------------------------------------------
+# Spreadsheet exports (rankings, attendance, code redemptions)
+#
+# Each export is a SELECT streamed through a server-side cursor
+# (stream_results + yield_per, as in audit.stream_csv) into a writer that
+# yields chunks of EXPORT_BATCH_SIZE rows, so memory stays flat no matter how
+# many rows there are. XLSX is written with zipfile into an unseekable sink
+# (data descriptors instead of seeking back), one inline-string sheet, no
+# shared strings table: nothing is held until the end.
+# -----------------------------------------------------------------------------
+EXPORT_BATCH_SIZE = 1000
+
+CSV = "csv"
+XLSX = "xlsx"
+MEDIA_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class Export:
+    def __init__(self, name: str, columns: list[str], stmt):
+        self.name = name        # nome do arquivo, sem extensão
+        self.columns = columns  # cabeçalho, na ordem das colunas do SELECT
+        self.stmt = stmt
+
+
+def ranking(db: Session, sector_id: int = None, month: int = None, year: int = None, start=None, end=None) -> Export:
+    """Mesma fonte do /ranking (snapshot para mês fechado, senão ao vivo)."""
+    source = crud._ranking_source(db, sector_id, month, year, start, end)
+    stmt = select(source.c.position, source.c.rank, source.c.user_id, source.c.username, source.c.nickname,
+                  source.c.total_points).order_by(source.c.position)
+    scope = f"setor-{sector_id}" if sector_id is not None else "geral"
+    period = f"-{year}-{month:02d}" if month and year else (f"-{year}" if year else "")
+    return Export(f"ranking-{scope}{period}", ["posicao", "rank", "user_id", "usuario", "apelido", "pontos"], stmt)
+
+
+def attendance(activity_id: int = None, sector_id: int = None, month: int = None, year: int = None, start=None, end=None) -> Export:
+    """Uma linha por check-in: de uma atividade, ou das atividades do setor
+    (None = gerais) no período."""
+    a, c, u = models.Activity, models.CheckIn, models.User
+    stmt = select(a.activity_id, a.title, a.activity_date, u.user_id, u.username, u.email, c.timestamp) \
+        .select_from(c).join(a, a.activity_id == c.activity_id).join(u, u.user_id == c.user_id)
+    if activity_id is not None:
+        stmt = stmt.where(a.activity_id == activity_id)
+        name = f"presenca-atividade-{activity_id}"
+    else:
+        stmt = stmt.where(a.sector_id == sector_id) if sector_id is not None else stmt.where(a.is_general == True)
+        stmt = crud.apply_date_filter(stmt, a.activity_date, month, year, start, end)
+        name = f"presenca-setor-{sector_id}" if sector_id is not None else "presenca-geral"
+    stmt = stmt.order_by(a.activity_date, a.activity_id, c.timestamp)
+    return Export(name, ["activity_id", "atividade", "data_atividade", "user_id", "usuario", "email", "check_in"], stmt)
+
+
+def redemptions(sector_id: int = None, month: int = None, year: int = None, start=None, end=None) -> Export:
+    """Códigos gerais resgatados + códigos únicos resgatados, do setor (None =
+    gerais), filtrados como no ranking (pela data de criação do código)."""
+    r, g, u = models.RedeemCode, models.GeneralCodeRedemption, models.User
+    scope = (r.sector_id == sector_id) if sector_id is not None else (r.is_general == True)
+    general = select(g.timestamp.label("redeemed_at"), r.code_string, r.title, literal("geral").label("kind"), r.points_value,
+                     u.user_id, u.username, r.created_at) \
+        .select_from(g).join(r, r.code_id == g.code_id).join(u, u.user_id == g.user_id).where(scope)
+    unique = select(cast(null(), DateTime).label("redeemed_at"), r.code_string, r.title, literal("unico").label("kind"), r.points_value,
+                    u.user_id, u.username, r.created_at) \
+        .select_from(r).join(u, u.user_id == r.assigned_user_id).where(scope, r.is_redeemed == True)
+    general = crud.apply_date_filter(general, r.created_at, month, year, start, end)
+    unique = crud.apply_date_filter(unique, r.created_at, month, year, start, end)
+    events = union_all(general, unique).subquery("redemptions")
+    stmt = select(events).order_by(events.c.created_at, events.c.code_string, events.c.user_id)
+    name = f"resgates-setor-{sector_id}" if sector_id is not None else "resgates-geral"
+    return Export(name, ["resgatado_em", "codigo", "titulo", "tipo", "pontos", "user_id", "usuario", "codigo_criado_em"], stmt)
+
+
+def iter_rows(db: Session, stmt) -> Iterator:
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    return str(value)
+
+
+def _csv_safe(value):
+    # Texto vindo do usuário (apelido, título) não vira fórmula no Excel.
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def stream_csv(columns: list[str], rows: Iterable) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_safe(_text(v)) if not isinstance(v, (int, float)) else v for v in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _Sink:
+    """Destino sem seek para o ZipFile: acumula bytes até alguém pegar."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+_SHEET_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_END = "</sheetData></worksheet>"
+
+
+def _xlsx_row(values) -> str:
+    cells = []
+    for v in values:
+        if isinstance(v, bool) or v is None or not isinstance(v, (int, float)):
+            text = _INVALID_XML.sub("", _text(v))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>' if text else "<c/>")
+        else:
+            cells.append(f"<c><v>{v}</v></c>")
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def stream_xlsx(columns: list[str], rows: Iterable, sheet_name: str = "Planilha") -> Iterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet_name[:31])))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xlsx_row(columns)).encode())
+            chunk = []
+            for row in rows:
+                chunk.append(_xlsx_row(row))
+                if len(chunk) >= EXPORT_BATCH_SIZE:
+                    sheet.write("".join(chunk).encode())
+                    chunk = []
+                    yield sink.take()
+            sheet.write(("".join(chunk) + _SHEET_END).encode())
+    yield sink.take()
+
+
+def stream(db: Session, export: Export, fmt: str) -> Iterator:
+    rows = iter_rows(db, export.stmt)
+    if fmt == XLSX:
+        return stream_xlsx(export.columns, rows)
+    return stream_csv(export.columns, rows)
+
+
+def filename(export: Export, fmt: str) -> str:
+    return f"{export.name}.{fmt}"
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Idempotency-Key for retried POSTs (check-in, resgate, distribuição)
+#
+# run() executes the write with the domain changes still uncommitted, then
+# stores the response row and commits both together. So:
+#   - a replay (same user, endpoint and key) gets the stored response and
+#     never touches the domain tables;
+#   - two concurrent twins race on the unique (user_id, endpoint, key): the
+#     loser's COMMIT fails, its domain writes roll back and it replays the
+#     winner's response (no double pay);
+#   - 4xx answers are stored too; 5xx are not (the client should retry).
+# Rows expire after IDEMPOTENCY_TTL_SECONDS and are purged in small batches.
+# -----------------------------------------------------------------------------
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_PURGE_EVERY = int(os.getenv("IDEMPOTENCY_PURGE_EVERY", "200"))
+IDEMPOTENCY_PURGE_BATCH = 1000
+REPLAY_HEADER = "Idempotent-Replayed"
+
+_KEY_RE = re.compile(r"^[A-Za-z0-9_.:\-]{1,100}$")
+_stores = 0
+_stores_lock = threading.Lock()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def fingerprint(endpoint: str, payload) -> str:
+    raw = json.dumps([endpoint, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _replay(row: models.IdempotencyKey) -> JSONResponse:
+    return JSONResponse(status_code=row.status_code, content=json.loads(row.response_body),
+                        headers={REPLAY_HEADER: "true"})
+
+
+def _find(db: Session, user_id: int, endpoint: str, key: str) -> Optional[models.IdempotencyKey]:
+    return db.execute(
+        select(models.IdempotencyKey).where(
+            models.IdempotencyKey.user_id == user_id,
+            models.IdempotencyKey.endpoint == endpoint,
+            models.IdempotencyKey.key == key,
+        )
+    ).scalar_one_or_none()
+
+
+def _check(row: models.IdempotencyKey, request_hash: str) -> Optional[JSONResponse]:
+    """Stored response for a live row; None when the row has expired."""
+    if row.expires_at <= _utcnow():
+        return None
+    if row.request_hash != request_hash:
+        raise HTTPException(422, "Idempotency-Key já usada com outra requisição.")
+    return _replay(row)
+
+
+def run(db: Session, user_id: int, endpoint: str, key: Optional[str], payload, action: Callable[[], dict]):
+    """
+    Runs action() (which must NOT commit) and commits its writes. With a key,
+    the response is stored in the same transaction and replayed later.
+    """
+    if not key:
+        result = action()
+        db.commit()
+        return result
+    if not _KEY_RE.match(key):
+        raise HTTPException(400, "Idempotency-Key inválida (até 100 caracteres: letras, números, . _ : -).")
+
+    request_hash = fingerprint(endpoint, payload)
+    row = _find(db, user_id, endpoint, key)
+    if row is not None:
+        replay = _check(row, request_hash)
+        if replay is not None:
+            return replay
+
+    error = None
+    try:
+        body, status_code = action(), 200
+    except HTTPException as e:
+        if e.status_code >= 500:
+            raise
+        db.rollback()
+        body, status_code, error = {"detail": e.detail}, e.status_code, e
+
+    now = _utcnow()
+    values = dict(request_hash=request_hash, status_code=status_code,
+                  response_body=json.dumps(body, ensure_ascii=False, default=str),
+                  created_at=now, expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+    if row is None:
+        db.add(models.IdempotencyKey(user_id=user_id, endpoint=endpoint, key=key, **values))
+    else:
+        # Expired row for the same key: reuse it.
+        for name, value in values.items():
+            setattr(row, name, value)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        twin = _find(db, user_id, endpoint, key)
+        if twin is None:
+            raise
+        replay = _check(twin, request_hash)
+        if replay is None:
+            raise
+        return replay
+
+    _maybe_purge(db)
+    if error is not None:
+        raise error
+    return body
+
+
+async def run_async(db, user_id: int, endpoint: str, key: Optional[str], payload, action: Callable[[Session], dict]):
+    """run() for AsyncSession routes; action(session) gets the underlying sync Session."""
+    return await db.run_sync(lambda session: run(session, user_id, endpoint, key, payload, lambda: action(session)))
+
+
+def purge_expired(db: Session, batch_size: int = IDEMPOTENCY_PURGE_BATCH) -> int:
+    ids = select(models.IdempotencyKey.id).where(models.IdempotencyKey.expires_at <= _utcnow()).limit(batch_size)
+    result = db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.id.in_(ids)))
+    db.commit()
+    return result.rowcount or 0
+
+
+def _maybe_purge(db: Session) -> None:
+    global _stores
+    with _stores_lock:
+        _stores += 1
+        due = _stores % IDEMPOTENCY_PURGE_EVERY == 0
+    if not due:
+        return
+    try:
+        removed = purge_expired(db)
+        if removed:
+            logger.info("idempotency: purged %s expired keys", removed)
+    except Exception as e:
+        db.rollback()
+        logger.warning("idempotency purge failed: %s", e)
@@ -0,0 +1,149 @@
+"""Relatório de cobertura de índices das queries do `crud`.
+
+Executa as funções de leitura (e os caminhos de escrita, dentro de uma
+transação que é desfeita no final) contra o banco configurado em
+DATABASE_URL, captura cada SELECT emitido e roda EXPLAIN (Postgres) ou
+EXPLAIN QUERY PLAN (SQLite) com os mesmos parâmetros. Queries que fazem
+varredura completa de tabela são marcadas.
+
+Rode contra um banco com dados realistas (veja o seeder de benchmarks):
+
+    python index_report.py
+    python index_report.py --all   # mostra também as queries cobertas
+"""
+import argparse
+import re
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+
+import crud, models
+import database
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(?! USING (COVERING )?INDEX)")
+_PG_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def _report_engine():
+    """Engine dedicada com SAVEPOINT funcionando também no pysqlite."""
+    engine = create_engine(database.settings.url, **database.settings.engine_kwargs())
+    if database.settings.is_sqlite:
+        @event.listens_for(engine, "connect")
+        def _no_pysqlite_begin(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _emit_begin(conn):
+            conn.exec_driver_sql("BEGIN")
+    return engine
+
+
+def _scenarios(db: Session):
+    """(label, callable) pairs covering every crud query path that has data to run on."""
+    user = db.scalars(select(models.User).where(models.User.role == models.UserRole.user)).first()
+    lider = db.scalars(select(models.User).where(models.User.role == models.UserRole.lider)).first()
+    sector = db.scalars(select(models.Sector)).first()
+    activity = db.scalars(select(models.Activity)).first()
+    code = db.scalars(select(models.RedeemCode).where(models.RedeemCode.type == models.CodeType.general)).first()
+    invite = db.scalars(select(models.SystemInvite)).first()
+
+    yield "get_pending_global_users", lambda: crud.get_pending_global_users(db)
+    yield "get_all_sectors", lambda: crud.get_all_sectors(db)
+    yield "get_general_codes", lambda: crud.get_general_codes(db)
+    yield "get_all_users", lambda: crud.get_all_users(db)
+    yield "get_liders", lambda: crud.get_liders(db)
+    yield "get_all_badges", lambda: crud.get_all_badges(db)
+    yield "get_all_system_invites", lambda: crud.get_all_system_invites(db)
+    if invite:
+        yield "validate_system_invite", lambda: crud.validate_system_invite(db, invite.code)
+    if user:
+        yield "get_user_by_email", lambda: crud.get_user_by_email(db, user.email)
+        yield "get_user_by_id", lambda: crud.get_user_by_id(db, user.user_id)
+        yield "calculate_points(general)", lambda: crud.calculate_points(db, user.user_id, is_general=True)
+        yield "calculate_points(general, month)", lambda: crud.calculate_points(db, user.user_id, is_general=True, month=1, year=2025)
+        yield "get_user_points_breakdown", lambda: crud.get_user_points_breakdown(db, user)
+        yield "get_user_badges", lambda: crud.get_user_badges(db, user.user_id)
+    yield "get_geral_ranking", lambda: crud.get_geral_ranking(db)
+    if sector:
+        yield "get_sector_by_id", lambda: crud.get_sector_by_id(db, sector.sector_id)
+        yield "get_sector_by_invite_code", lambda: crud.get_sector_by_invite_code(db, sector.invite_code)
+        yield "get_sector_ranking", lambda: crud.get_sector_ranking(db, sector.sector_id)
+        yield "get_activities_by_sector", lambda: crud.get_activities_by_sector(db, sector.sector_id)
+        yield "get_users_by_sector", lambda: crud.get_users_by_sector(db, sector.sector_id)
+        if user:
+            yield "join_sector", lambda: crud.join_sector(db, user, sector.invite_code)
+    if code:
+        yield "get_code_by_string", lambda: crud.get_code_by_string(db, code.code_string)
+        if user:
+            yield "redeem_code(general)", lambda: crud.redeem_code(db, user, code)
+    if activity and user:
+        yield "create_checkin", lambda: crud.create_checkin(db, user, activity.checkin_code)
+    if lider and user:
+        yield "distribute_points_from_budget", lambda: crud.distribute_points_from_budget(db, lider, user.user_id, 0, "index report")
+
+
+def _explain(conn, statement, parameters):
+    if conn.dialect.name == "postgresql":
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).fetchall()
+        plan = "\n".join(r[0] for r in rows)
+        scans = _PG_SCAN.findall(plan)
+    else:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        plan = "\n".join(str(r[-1]) for r in rows)
+        scans = [m[0] for m in _SQLITE_SCAN.findall(plan)]
+    return plan, scans
+
+
+def run(show_all: bool = False) -> int:
+    engine = _report_engine()
+    captured: list[tuple[str, str, object]] = []
+    current = {"label": None}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and current["label"]:
+            captured.append((current["label"], statement, parameters))
+
+    uncovered = 0
+    with engine.connect() as conn:
+        outer = conn.begin()
+        db = Session(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            for label, fn in list(_scenarios(db)):
+                current["label"] = label
+                try:
+                    fn()
+                except Exception as e:
+                    print(f"[erro] {label}: {e}")
+                    db.rollback()
+                current["label"] = None
+
+            seen = set()
+            for label, statement, parameters in captured:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                plan, scans = _explain(conn, statement, parameters)
+                if scans:
+                    uncovered += 1
+                if scans or show_all:
+                    status = "FULL SCAN " + ", ".join(sorted(set(scans))) if scans else "ok"
+                    print(f"== {label}: {status}")
+                    print("   " + " ".join(statement.split())[:300])
+                    print("   " + plan.replace("\n", "\n   "))
+        finally:
+            db.close()
+            outer.rollback()
+
+    print(f"\n{len(seen)} queries distintas, {uncovered} com varredura completa.")
+    return uncovered
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true", help="Mostrar também as queries cobertas por índice")
+    args = parser.parse_args()
+    run(show_all=args.all)
+
+
+if __name__ == "__main__":
+    main()
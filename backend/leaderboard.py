@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import select
+
+import cache_bus
+import metrics
+import versioning
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Live leaderboard (Server-Sent Events)
+#
+# One channel per ranking scope (geral/setor + mês/ano). Commits that bump a
+# ranking scope mark the matching channels dirty; a single flush task
+# recomputes each dirty channel at most once per interval, diffs it against
+# the previous snapshot and fans the serialized delta out to every
+# subscriber. Per connection there is only a 1-slot queue: a client that
+# falls behind gets the full snapshot instead of a backlog of deltas.
+#
+# The hub is per process; commits made by other workers arrive through the
+# cache bus.
+# -----------------------------------------------------------------------------
+LIVE_RANKING_INTERVAL_SECONDS = float(os.getenv("LIVE_RANKING_INTERVAL_SECONDS", "2"))
+LIVE_RANKING_HEARTBEAT_SECONDS = float(os.getenv("LIVE_RANKING_HEARTBEAT_SECONDS", "15"))
+LIVE_RANKING_MAX_SUBSCRIBERS = int(os.getenv("LIVE_RANKING_MAX_SUBSCRIBERS", "5000"))
+
+_HEARTBEAT = ": ping\n\n"
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ScopeKey:
+    sector_id: Optional[int] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        base = "general" if self.sector_id is None else f"sector:{self.sector_id}"
+        if self.year or self.month:
+            base += f":{self.year or '*'}-{self.month or '*'}"
+        return base
+
+    def affected_by(self, changed: frozenset) -> bool:
+        if versioning.USERS in changed or cache_bus.ALL in changed:
+            return True
+        if self.sector_id is None:
+            return versioning.RANKING_GENERAL in changed
+        return versioning.ranking_sector(self.sector_id) in changed
+
+
+def load_ranking(key: ScopeKey) -> list[dict]:
+    import crud
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ranking = crud.ranking_query(key.sector_id, key.month, key.year)
+        rows = db.execute(select(ranking).order_by(ranking.c.position)).all()
+    finally:
+        db.close()
+    return [
+        {"user_id": r.user_id, "username": r.username, "nickname": r.nickname, "profile_pic": r.profile_pic,
+         "total_points": r.total_points, "rank": r.rank, "position": r.position}
+        for r in rows
+    ]
+
+
+def _event(name: str, seq: int, payload: dict) -> str:
+    return f"event: {name}\nid: {seq}\ndata: {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+@dataclass
+class _Channel:
+    subscribers: set = field(default_factory=set)
+    entries: Optional[dict] = None       # user_id -> entry, in position order
+    seq: int = 0
+    _snapshot: Optional[str] = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def snapshot(self, key: ScopeKey) -> str:
+        if self._snapshot is None:
+            self._snapshot = _event("snapshot", self.seq, {"scope": key.label, "ranking": list(self.entries.values())})
+        return self._snapshot
+
+    def replace(self, entries: list[dict]) -> tuple[list[dict], list[int]]:
+        """Stores the new ranking; returns (changed entries, removed user_ids)."""
+        old = self.entries or {}
+        new = {e["user_id"]: e for e in entries}
+        changed = [e for uid, e in new.items() if old.get(uid) != e]
+        removed = [uid for uid in old if uid not in new]
+        self.entries = new
+        self._snapshot = None
+        if changed or removed or not old:
+            self.seq += 1
+        return changed, removed
+
+
+class LeaderboardHub:
+    def __init__(self, loader: Callable[[ScopeKey], list[dict]] = load_ranking,
+                 interval: float = LIVE_RANKING_INTERVAL_SECONDS,
+                 heartbeat: float = LIVE_RANKING_HEARTBEAT_SECONDS,
+                 max_subscribers: int = LIVE_RANKING_MAX_SUBSCRIBERS):
+        self._loader = loader
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._channels: dict[ScopeKey, _Channel] = {}
+        self._dirty: set[ScopeKey] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0  # recomputations actually run (handy for tests/metrics)
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(c.subscribers) for c in self._channels.values())
+
+    # --- lifecycle ------------------------------------------------------------
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        self._loop = None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # --- change notifications (any thread) -----------------------------------
+    def notify(self, changed: frozenset) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._mark_dirty, changed)
+
+    def _mark_dirty(self, changed: frozenset) -> None:
+        for key in self._channels:
+            if key.affected_by(changed):
+                self._dirty.add(key)
+        if self._dirty and self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("leaderboard flush failed")
+            # Bursts that arrive meanwhile are coalesced into the next flush.
+            await asyncio.sleep(self.interval)
+
+    async def flush(self) -> None:
+        dirty, self._dirty = self._dirty, set()
+        for key in dirty:
+            channel = self._channels.get(key)
+            if channel is None or not channel.subscribers:
+                continue
+            async with channel.lock:
+                entries = await asyncio.to_thread(self._loader, key)
+                self.flushes += 1
+                changed, removed = channel.replace(entries)
+                if not (changed or removed):
+                    continue
+                message = _event("delta", channel.seq, {"scope": key.label, "changed": changed, "removed": removed})
+                for queue in channel.subscribers:
+                    self._offer(queue, message, channel, key)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, message: str, channel: _Channel, key: ScopeKey) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow reader: the pending delta is superseded by the full state.
+            queue.get_nowait()
+            queue.put_nowait(channel.snapshot(key))
+
+    # --- subscribers ----------------------------------------------------------
+    def subscribe(self, key: ScopeKey) -> AsyncIterator[str]:
+        if self.subscriber_count >= self.max_subscribers:
+            raise TooManySubscribers()
+        return self._stream(key)
+
+    async def _stream(self, key: ScopeKey) -> AsyncIterator[str]:
+        channel = self._channels.setdefault(key, _Channel())
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        channel.subscribers.add(queue)
+        try:
+            async with channel.lock:
+                if channel.entries is None:
+                    channel.replace(await asyncio.to_thread(self._loader, key))
+                    self.flushes += 1
+                first = channel.snapshot(key)
+            yield first
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    message = _HEARTBEAT
+                yield message
+        finally:
+            channel.subscribers.discard(queue)
+            if not channel.subscribers and self._channels.get(key) is channel:
+                del self._channels[key]
+
+
+hub = LeaderboardHub()
+cache_bus.subscribe(hub.notify)
+
+LIVE_SUBSCRIBERS = metrics.REGISTRY.register(metrics.Gauge(
+    "live_ranking_subscribers", "Open live ranking streams", (), lambda: {(): hub.subscriber_count},
+))
@@ -3,96 +3,52 @@ import time
 import ssl
 import smtplib
 import logging
+import threading
 from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from dotenv import load_dotenv
-from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-# If you still want engine fallback:
-from database import engine
-
-load_dotenv()
 logger = logging.getLogger(__name__)
 
-# -----------------------------------------------------------------------------
-# Small TTL cache for DB envs (performance)
-# -----------------------------------------------------------------------------
-_ENV_CACHE: dict[str, tuple[float, Optional[str]]] = {}
-_ENV_CACHE_TTL_SECONDS = 60  # adjust as you like
-
-
-def _get_env_from_db(db: Session, name: str) -> Optional[str]:
-    row = db.execute(
-        text("""
-            SELECT value
-            FROM envs
-            WHERE active = true AND name = :name
-            LIMIT 1
-        """),
-        {"name": name},
-    ).fetchone()
-    return row[0] if row else None
-
-
-def _get_env_from_db_cached(db: Session, name: str) -> Optional[str]:
-    now = time.time()
-    cached = _ENV_CACHE.get(name)
-
-    if cached:
-        ts, value = cached
-        if now - ts < _ENV_CACHE_TTL_SECONDS:
-            return value
-
-    try:
-        value = _get_env_from_db(db, name)
-    except Exception as e:
-        # Don't fail if DB is unreachable; fallback to environment variables
-        logger.debug("DB env lookup failed for %s: %s", name, e)
-        value = None
+_DOTENV_LOADED = False
 
-    _ENV_CACHE[name] = (now, value)
-    return value
 
+def _load_dotenv_once() -> None:
+    """Loads .env on first use instead of at import time."""
+    global _DOTENV_LOADED
+    if not _DOTENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _DOTENV_LOADED = True
 
+# -----------------------------------------------------------------------------
+# DB envs (served from the shared config_store snapshot)
+# -----------------------------------------------------------------------------
 def get_env(
     name: str,
     default: Optional[str] = None,
     db: Optional[Session] = None,
 ) -> Optional[str]:
     """
-    DB-first env lookup with safe fallback.
+    DB-first env lookup with safe fallback to os.environ.
 
-    If db is provided, uses it (preferred).
-    If not, tries a short engine connection (keeps your original behavior).
+    Values come from config_store.envs, a snapshot of all active `envs` rows
+    loaded in one query and refreshed on a TTL, so steady-state lookups do
+    not touch the database. `db` is accepted for compatibility; the snapshot
+    loads over its own short connection so a missing `envs` table never
+    aborts the caller's transaction.
     """
-    if db is not None:
-        v = _get_env_from_db_cached(db, name)
-        if v is not None:
-            return v
-        return os.getenv(name, default)
-
-    # Engine fallback (kept for compatibility)
-    try:
-        with engine.connect() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT value
-                    FROM envs
-                    WHERE active = true AND name = :name
-                    LIMIT 1
-                """),
-                {"name": name},
-            ).fetchone()
-            if row:
-                return row[0]
-    except Exception as e:
-        logger.debug("Engine env lookup failed for %s: %s", name, e)
+    _load_dotenv_once()
+    import config_store
 
+    v = config_store.envs.get(name)
+    if v is not None:
+        return v
     return os.getenv(name, default)
 
 
@@ -139,21 +95,13 @@ class EmailSendError(RuntimeError):
     pass
 
 
-def send_email(
+def _build_message(
+    settings: EmailSettings,
     to_address: str,
     subject: str,
     body_text: str,
-    *,
     body_html: Optional[str] = None,
-    timeout: int = 10,
-    db: Optional[Session] = None,
-) -> bool:
-    settings = EmailSettings.load(db=db)
-
-    if not settings.email_address or not settings.email_password:
-        # If you want to allow unauthenticated SMTP internally, remove this.
-        raise EmailSendError("Missing EMAIL_ADDRESS or EMAIL_PASSWORD configuration.")
-
+) -> MIMEMultipart:
     msg = MIMEMultipart("alternative")
     msg["From"] = settings.email_address
     msg["To"] = to_address
@@ -165,19 +113,97 @@ def send_email(
     # Optional HTML
     if body_html:
         msg.attach(MIMEText(body_html, "html", "utf-8"))
+    return msg
 
-    context = ssl.create_default_context()
 
-    try:
-        with smtplib.SMTP(settings.smtp_server, settings.smtp_port, timeout=timeout) as server:
-            server.ehlo()
+class SMTPSession:
+    """
+    One authenticated SMTP connection reused across many messages.
+
+    EHLO/STARTTLS/LOGIN happen once; the connection is re-established
+    transparently if the server dropped it (idle timeout, restart).
+    """
 
-            if settings.use_starttls:
-                server.starttls(context=context)
+    def __init__(self, settings: EmailSettings, timeout: int = 10, max_idle_seconds: int = 60):
+        self.settings = settings
+        self.timeout = timeout
+        self.max_idle_seconds = max_idle_seconds
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.settings.smtp_server, self.settings.smtp_port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.settings.use_starttls:
+                server.starttls(context=ssl.create_default_context())
                 server.ehlo()
+            server.login(self.settings.email_address, self.settings.email_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _ensure_connected(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > self.max_idle_seconds:
+            # Most servers drop idle sessions; check before trusting it.
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def send(self, msg: MIMEMultipart) -> None:
+        try:
+            self._ensure_connected().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # One reconnect attempt; other errors are the message's problem.
+            self.close()
+            self._ensure_connected().send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                try:
+                    self._server.close()
+                except Exception:
+                    pass
+            self._server = None
+
+    def __enter__(self) -> "SMTPSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
-            server.login(settings.email_address, settings.email_password)
-            server.send_message(msg)
+
+def send_email(
+    to_address: str,
+    subject: str,
+    body_text: str,
+    *,
+    body_html: Optional[str] = None,
+    timeout: int = 10,
+    db: Optional[Session] = None,
+) -> bool:
+    """Sends a single message inline. Request handlers should use enqueue_email instead."""
+    settings = EmailSettings.load(db=db)
+
+    if not settings.email_address or not settings.email_password:
+        # If you want to allow unauthenticated SMTP internally, remove this.
+        raise EmailSendError("Missing EMAIL_ADDRESS or EMAIL_PASSWORD configuration.")
+
+    msg = _build_message(settings, to_address, subject, body_text, body_html)
+
+    try:
+        with SMTPSession(settings, timeout=timeout) as session:
+            session.send(msg)
 
         logger.info("Email sent to %s", to_address)
         return True
@@ -187,6 +213,201 @@ def send_email(
         raise EmailSendError(str(e)) from e
 
 
+# -----------------------------------------------------------------------------
+# Outbox (durable queue) + background worker
+# -----------------------------------------------------------------------------
+OUTBOX_BATCH_SIZE = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_POLL_SECONDS = float(os.getenv("MAIL_OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_BACKOFF_BASE_SECONDS = 30
+# A claimed message that is still "sending" after this long (worker crashed
+# mid-batch) becomes claimable again.
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue_email(
+    db: Session,
+    to_address: str,
+    subject: str,
+    body_text: str,
+    *,
+    body_html: Optional[str] = None,
+    commit: bool = True,
+):
+    """Persists a message in the outbox; the MailWorker delivers it."""
+    import models
+
+    item = models.OutboxEmail(
+        to_address=to_address,
+        subject=subject,
+        body_text=body_text,
+        body_html=body_html,
+        status="pending",
+        attempts=0,
+        next_attempt_at=_utcnow(),
+    )
+    db.add(item)
+    if commit:
+        db.commit()
+        if _worker is not None:
+            _worker.wake()
+    return item
+
+
+def _backoff_seconds(attempts: int) -> int:
+    return min(OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+class MailWorker:
+    """
+    Drains email_outbox in batches over a single SMTP session.
+
+    Claiming uses SELECT ... FOR UPDATE SKIP LOCKED on Postgres, so several
+    app workers can run it side by side without sending duplicates.
+    """
+
+    def __init__(self, session_factory, *, settings: Optional[EmailSettings] = None,
+                 batch_size: int = OUTBOX_BATCH_SIZE, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.settings = settings
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self._smtp: Optional[SMTPSession] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _session_for(self, settings: EmailSettings) -> SMTPSession:
+        if self._smtp is None or self._smtp.settings != settings:
+            if self._smtp is not None:
+                self._smtp.close()
+            self._smtp = SMTPSession(settings)
+        return self._smtp
+
+    def _claim(self, db: Session) -> list:
+        import models
+
+        now = _utcnow()
+        rows = (
+            db.query(models.OutboxEmail)
+            .filter(models.OutboxEmail.status.in_(("pending", "sending")), models.OutboxEmail.next_attempt_at <= now)
+            .order_by(models.OutboxEmail.next_attempt_at, models.OutboxEmail.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lease_until = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        for row in rows:
+            row.status = "sending"
+            row.next_attempt_at = lease_until
+        db.commit()
+        return rows
+
+    def process_batch(self) -> int:
+        """Sends one batch. Returns how many messages were processed."""
+        db = self.session_factory()
+        try:
+            rows = self._claim(db)
+            if not rows:
+                return 0
+            settings = self.settings or EmailSettings.load(db=db)
+            if not settings.email_address or not settings.email_password:
+                for row in rows:
+                    self._mark_failure(row, "Missing EMAIL_ADDRESS or EMAIL_PASSWORD configuration.")
+                db.commit()
+                return len(rows)
+
+            smtp = self._session_for(settings)
+            for row in rows:
+                msg = _build_message(settings, row.to_address, row.subject, row.body_text, row.body_html)
+                try:
+                    smtp.send(msg)
+                except Exception as e:
+                    logger.warning("Outbox email %s to %s failed: %s", row.id, row.to_address, e)
+                    self._mark_failure(row, str(e))
+                    if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)):
+                        # Connection-level trouble: start clean on the next message.
+                        smtp.close()
+                else:
+                    row.status = "sent"
+                    row.attempts += 1
+                    row.sent_at = _utcnow()
+                    row.last_error = None
+                # Per-message status survives a crash mid-batch.
+                db.commit()
+            return len(rows)
+        finally:
+            db.close()
+
+    def _mark_failure(self, row, error: str) -> None:
+        row.attempts += 1
+        row.last_error = error[:500]
+        if row.attempts >= self.max_attempts:
+            row.status = "failed"
+        else:
+            row.status = "pending"
+            row.next_attempt_at = _utcnow() + timedelta(seconds=_backoff_seconds(row.attempts))
+
+    def run_until_idle(self) -> int:
+        total = 0
+        while True:
+            n = self.process_batch()
+            total += n
+            if n < self.batch_size:
+                return total
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_until_idle()
+            except Exception:
+                logger.exception("Mail worker iteration failed")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+        if self._smtp is not None:
+            self._smtp.close()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="mail-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_worker: Optional[MailWorker] = None
+
+
+def start_worker(session_factory) -> MailWorker:
+    global _worker
+    if _worker is None:
+        _worker = MailWorker(session_factory)
+        _worker.start()
+    return _worker
+
+
+def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
 # -----------------------------------------------------------------------------
 # Recovery code (secure)
 # -----------------------------------------------------------------------------
@@ -220,11 +441,13 @@ def send_recovery_email_to_address(
     subject = "Código de Recuperação de Senha"
     body = f"Seu código de recuperação é: {code}"
 
-    #send_email(to_address, subject, body, db=db)
-    print(f"Sending email to {to_address} with code {code}")
-
-    # Persist using your existing CRUD
-    crud.add_last_recovery_code(db, user, code)
+    # Persist using your existing CRUD; the email goes out through the outbox
+    # in the same commit, so the request does not wait for SMTP.
+    user.last_recovery_code = code
+    enqueue_email(db, to_address, subject, body, commit=False)
+    db.commit()
+    if _worker is not None:
+        _worker.wake()
 
     return code
 
@@ -1,13 +1,59 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-from routers import auth, users, sectors, ranking, activities, admin
+from database import engine
+import database
+import metrics
+import ratelimit
+from routers import auth, users, sectors, ranking, activities, admin, exports
+import logging
 import os
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+logging.basicConfig(level=os.getenv("RITMISTAS_LOG_LEVEL", "INFO").upper())
 
-app = FastAPI(title="Projeto Ritmistas B10 API v5")
+
+def _env_flag(name: str, default: str = "true") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada de I/O no import: o schema só é verificado quando o servidor sobe.
+    # Em produção com vários workers, prefira RITMISTAS_MIGRATE_ON_STARTUP=false
+    # e `python -m migrations upgrade` como passo de release.
+    database.log_settings()
+    if _env_flag("RITMISTAS_MIGRATE_ON_STARTUP"):
+        import migrations
+        migrations.upgrade(engine)
+    mail_worker_enabled = _env_flag("MAIL_WORKER_ENABLED")
+    if mail_worker_enabled:
+        import mailer
+        mailer.start_worker(database.SessionLocal)
+    snapshot_worker_enabled = _env_flag("RANKING_SNAPSHOT_WORKER_ENABLED")
+    if snapshot_worker_enabled:
+        import snapshots
+        snapshots.start_worker(database.SessionLocal)
+    import cache_bus
+    import leaderboard
+    cache_bus.start(engine)
+    leaderboard.hub.start()
+    yield
+    await leaderboard.hub.stop()
+    cache_bus.stop()
+    await database.dispose_async_engines()
+    if snapshot_worker_enabled:
+        import snapshots
+        snapshots.stop_worker()
+    if mail_worker_enabled:
+        import mailer
+        mailer.stop_worker()
+
+
+app = FastAPI(title="Projeto Ritmistas B10 API v5", lifespan=lifespan)
+
+# Rate limiting (token bucket) nas rotas caras/adivinháveis; fica por dentro do
+# CORS para que o 429 chegue ao navegador com os headers certos.
+app.add_middleware(ratelimit.RateLimitMiddleware)
 
 # CORS Configuration
 allowed_origins_env = os.getenv("RITMISTAS_CORS_ORIGINS", "")
@@ -24,6 +70,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics (Prometheus text format em /metrics)
+# Streams longos ficam fora do histograma de latência (ver live_ranking_subscribers).
+app.add_middleware(metrics.MetricsMiddleware, exclude_paths=("/metrics", "/ranking/stream"))
+metrics.register_pool_metrics(engine, "primary")
+if database.read_engine is not engine:
+    metrics.register_pool_metrics(database.read_engine, "replica")
+
 # Include Routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -31,7 +84,12 @@ app.include_router(sectors.router)
 app.include_router(ranking.router)
 app.include_router(activities.router)
 app.include_router(admin.router)
+app.include_router(exports.router)
 
 @app.get("/")
 def health_check():
-    return {"status": "ok", "service": "ritmistas-api"}
\ No newline at end of file
+    return {"status": "ok", "service": "ritmistas-api"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import cache_bus
+import models
+import ttl_cache
+import versioning
+
+# -----------------------------------------------------------------------------
+# Sector membership cache
+#
+# Access checks on the write paths ("is user U in sector S?") read a small
+# frozenset of sector IDs per user instead of lazy-loading user.sectors.
+# Entries are dropped when a commit touches that user's memberships
+# (changed(db, user_id) -> versioning.notify -> cache bus, in this worker and
+# in the others) or all at once after an ecosystem sync. The TTL only bounds
+# how long a missed invalidation (e.g. a manual SQL edit) can live.
+# -----------------------------------------------------------------------------
+MEMBERSHIP_CACHE_TTL_SECONDS = float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "300"))
+MEMBERSHIP_CACHE_MAX_USERS = int(os.getenv("MEMBERSHIP_CACHE_MAX_USERS", "100000"))
+
+MEMBERSHIP = "membership"              # cache bus key: everybody
+_USER_PREFIX = "membership:user:"
+
+
+def user_key(user_id: int) -> str:
+    return f"{_USER_PREFIX}{user_id}"
+
+
+cache = ttl_cache.TTLCache(MEMBERSHIP_CACHE_TTL_SECONDS, MEMBERSHIP_CACHE_MAX_USERS)
+
+
+def _uncommitted(db: Session, user_id: int) -> bool:
+    pending = versioning.pending(db)
+    return MEMBERSHIP in pending or user_key(user_id) in pending
+
+
+def sector_ids(db: Session, user_id: int) -> frozenset:
+    """IDs of the sectors the user belongs to (cached)."""
+    # After changing them in this transaction, read our own writes and keep
+    # them out of the shared cache until they commit.
+    uncommitted = _uncommitted(db, user_id)
+    cached = None if uncommitted else cache.get(user_id)
+    if cached is not None:
+        return cached
+    generation = cache.generation()
+    ids = frozenset(db.execute(
+        select(models.user_sectors.c.sector_id).where(models.user_sectors.c.user_id == user_id)
+    ).scalars())
+    if not uncommitted:
+        cache.put(user_id, ids, generation)
+    return ids
+
+
+def is_member(db: Session, user_id: int, sector_id: Optional[int]) -> bool:
+    return sector_id is not None and sector_id in sector_ids(db, user_id)
+
+
+def changed(db: Session, *user_ids: int) -> None:
+    """Write paths call this for the users whose memberships they changed
+    (no arguments = possibly everyone); caches drop them on commit."""
+    if user_ids:
+        versioning.notify(db, *(user_key(u) for u in user_ids))
+    else:
+        versioning.notify(db, MEMBERSHIP)
+
+
+@cache_bus.subscribe
+def _on_invalidate(keys: frozenset) -> None:
+    if cache_bus.ALL in keys or MEMBERSHIP in keys:
+        cache.invalidate()
+        return
+    user_ids = [int(k[len(_USER_PREFIX):]) for k in keys if k.startswith(_USER_PREFIX)]
+    if user_ids:
+        cache.invalidate(*user_ids)
@@ -0,0 +1,303 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# -----------------------------------------------------------------------------
+# Minimal Prometheus-compatible metrics (text exposition format 0.0.4)
+#
+# Kept dependency-free on purpose: the hot path is one dict lookup, one bisect
+# and a couple of integer increments under a lock per observation.
+# -----------------------------------------------------------------------------
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets (seconds) tuned for an API whose typical responses are
+# between a few milliseconds and a couple of seconds.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+    1.0, 2.5, 5.0, 7.5, 10.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for values, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_fmt(v)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], dict]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        # Callback gauges are evaluated at scrape time only (zero hot-path cost).
+        self._callback = callback
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value: float, *labelvalues) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def collect(self) -> list[str]:
+        if self._callback is not None:
+            try:
+                items = list(self._callback().items())
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        lines = self._header()
+        for values, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_fmt(v)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram. Besides the standard _bucket/_sum/_count series
+    it exports p50/p95/p99 estimates (interpolated from the buckets at scrape
+    time) as <name>_quantile, so the numbers are readable without PromQL.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labelvalues)
+            if row is None:
+                row = [0] * (len(self.buckets) + 1) + [0.0]
+                self._values[labelvalues] = row
+            row[idx] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def _quantile(self, q: float, counts: list[int], total: int) -> float:
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for i, upper in enumerate(self.buckets):
+            prev = cumulative
+            cumulative += counts[i]
+            if cumulative >= rank:
+                if counts[i] == 0:
+                    return upper
+                return lower + (upper - lower) * (rank - prev) / counts[i]
+            lower = upper
+        # Falls in the +Inf bucket: the best estimate is the highest finite bound.
+        return self.buckets[-1]
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self._header()
+        quantile_lines = [
+            f"# HELP {self.name}_quantile {self.documentation} (estimated quantiles)",
+            f"# TYPE {self.name}_quantile gauge",
+        ]
+        for values, row in items:
+            counts, total_sum = row[:-1], row[-1]
+            total = sum(counts)
+            cumulative = 0
+            for i, upper in enumerate(self.buckets):
+                cumulative += counts[i]
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, ('le', _fmt(upper)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, ('le', '+Inf'))} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_fmt(total_sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {total}")
+            for q in QUANTILES:
+                est = self._quantile(q, counts, total)
+                quantile_lines.append(f"{self.name}_quantile{_labels(self.labelnames, values, ('quantile', q))} {_fmt(est)}")
+        return lines + quantile_lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# -----------------------------------------------------------------------------
+# Application metrics
+# -----------------------------------------------------------------------------
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route"),
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"),
+))
+REQUEST_ERRORS = REGISTRY.register(Counter(
+    "http_request_errors_total", "HTTP requests that ended in a 5xx or an unhandled exception", ("method", "route"),
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", (),
+))
+OUTBOUND_LATENCY = REGISTRY.register(Histogram(
+    "outbound_request_duration_seconds", "Latency of outbound calls to ecosystem services", ("service", "operation", "outcome"),
+))
+
+
+_POOLS: dict = {}
+
+
+def _pool_reader(attr: str):
+    def cb():
+        out = {}
+        for name, engine in list(_POOLS.items()):
+            fn = getattr(engine.pool, attr, None)
+            if callable(fn):
+                out[(name,)] = fn()
+        return out
+    return cb
+
+
+DB_POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool", ("engine",), _pool_reader("checkedout"),
+))
+DB_POOL_OVERFLOW = REGISTRY.register(Gauge(
+    "db_pool_overflow", "Connections opened beyond pool_size", ("engine",), _pool_reader("overflow"),
+))
+DB_POOL_SIZE = REGISTRY.register(Gauge(
+    "db_pool_size", "Configured pool size", ("engine",), _pool_reader("size"),
+))
+
+
+def register_pool_metrics(engine, name: str = "primary") -> None:
+    """Expose checked-out / overflow / size gauges for a SQLAlchemy engine pool."""
+    _POOLS[name] = engine
+
+
+@contextmanager
+def track_outbound(service: str, operation: str):
+    """Times an outbound call; exceptions are recorded as outcome=error and re-raised."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        OUTBOUND_LATENCY.observe(time.perf_counter() - start, service, operation, outcome)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (cheaper than BaseHTTPMiddleware: no extra task or
+    body buffering). The route label uses the matched path template, e.g.
+    /ranking/sector/{sector_id}, so cardinality stays bounded.
+    """
+
+    def __init__(self, app, exclude_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status_holder[0] = 500
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "<unmatched>"
+            status = status_holder[0]
+            REQUEST_LATENCY.observe(elapsed, method, route_label)
+            REQUESTS_TOTAL.inc(method, route_label, str(status))
+            if status >= 500:
+                REQUEST_ERRORS.inc(method, route_label)
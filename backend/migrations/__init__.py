@@ -0,0 +1,93 @@
+"""Migrações versionadas do schema.
+
+Cada módulo `vNNNN_<nome>.py` neste pacote define:
+
+    version: int          # número único e crescente
+    description: str
+    def upgrade(conn): ...  # recebe uma Connection já dentro de uma transação
+
+As migrações precisam ser idempotentes: `upgrade()` primeiro roda
+`Base.metadata.create_all` (bancos novos já nascem com o schema atual) e
+depois aplica, em ordem, as versões ainda não registradas em
+`schema_migrations`.
+
+Uso (na pasta `backend`):
+
+    python -m migrations status
+    python -m migrations upgrade
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_migrations"
+# Chave arbitrária do pg_advisory_xact_lock: impede que vários workers
+# migrem ao mesmo tempo no boot.
+_PG_LOCK_KEY = 74_310_010
+
+
+def discover():
+    """Returns the migration modules sorted by version."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith("v"):
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        found.append(module)
+    found.sort(key=lambda m: m.version)
+    versions = [m.version for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Versões de migração duplicadas: {versions}")
+    return found
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    """))
+
+
+def applied_versions(conn) -> set[int]:
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE}"))}
+
+
+def status(engine) -> list[tuple[int, str, bool]]:
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return [(m.version, m.description, m.version in done) for m in discover()]
+
+
+def upgrade(engine) -> list[int]:
+    """Creates missing tables and applies pending migrations. Returns applied versions."""
+    from database import Base
+    import models  # noqa: F401  (registers the tables on Base.metadata)
+
+    applied = []
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _PG_LOCK_KEY})
+        Base.metadata.create_all(bind=conn)
+        done = applied_versions(conn)
+        for migration in discover():
+            if migration.version in done:
+                continue
+            logger.info("Applying migration %04d: %s", migration.version, migration.description)
+            migration.upgrade(conn)
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": migration.version, "d": migration.description, "t": datetime.now(timezone.utc).replace(tzinfo=None)},
+            )
+            applied.append(migration.version)
+    if not applied:
+        logger.info("Schema up to date")
+    return applied
@@ -0,0 +1,27 @@
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+from database import engine
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m migrations")
+    parser.add_argument("command", choices=["status", "upgrade"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "upgrade":
+        applied = migrations.upgrade(engine)
+        print(f"Migrações aplicadas: {applied or 'nenhuma'}")
+    else:
+        for version, description, done in migrations.status(engine):
+            print(f"{version:04d} [{'x' if done else ' '}] {description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Índices para os filtros quentes + chave primária em user_sectors.
+
+Já cobertos por constraints existentes (não recriados aqui):
+- checkins.user_id            -> _user_activity_uc (user_id, activity_id)
+- general_code_redemptions.user_id -> _user_code_uc (user_id, code_id)
+- activities.checkin_code     -> UNIQUE (checkin_code)
+"""
+from sqlalchemy import inspect, text
+
+version = 1
+description = "hot query indexes and user_sectors primary key"
+
+INDEXES = [
+    ("ix_activities_sector_date", "activities", "sector_id, activity_date"),
+    ("ix_activities_created_by", "activities", "created_by"),
+    ("ix_activities_activity_date", "activities", "activity_date"),
+    ("ix_checkins_activity_id", "checkins", "activity_id"),
+    ("ix_redeem_codes_assigned_redeemed", "redeem_codes", "assigned_user_id, is_redeemed"),
+    ("ix_redeem_codes_sector_id", "redeem_codes", "sector_id"),
+    ("ix_redeem_codes_general_created", "redeem_codes", "is_general, created_at"),
+    ("ix_general_code_redemptions_code_id", "general_code_redemptions", "code_id"),
+    ("ix_users_status_role", "users", "status, role"),
+    ("ix_users_role", "users", "role"),
+    ("ix_user_badges_user_id", "user_badges", "user_id"),
+    ("ix_user_sectors_sector_user", "user_sectors", "sector_id, user_id"),
+]
+
+
+def _dedupe_user_sectors(conn):
+    conn.execute(text("DELETE FROM user_sectors WHERE user_id IS NULL OR sector_id IS NULL"))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("""
+            DELETE FROM user_sectors a USING user_sectors b
+            WHERE a.ctid < b.ctid AND a.user_id = b.user_id AND a.sector_id = b.sector_id
+        """))
+    else:
+        conn.execute(text("""
+            DELETE FROM user_sectors WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM user_sectors GROUP BY user_id, sector_id
+            )
+        """))
+
+
+def upgrade(conn):
+    pk = inspect(conn).get_pk_constraint("user_sectors")
+    if not pk.get("constrained_columns"):
+        _dedupe_user_sectors(conn)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE user_sectors ADD CONSTRAINT user_sectors_pkey PRIMARY KEY (user_id, sector_id)"))
+        else:
+            # SQLite não permite adicionar PK a uma tabela existente; o índice
+            # único tem o mesmo efeito para unicidade e buscas.
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_user_sectors_user_sector ON user_sectors (user_id, sector_id)"))
+
+    for name, table, columns in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
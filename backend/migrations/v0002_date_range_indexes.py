@@ -0,0 +1,24 @@
+"""Índices para os filtros por intervalo de data (`coluna >= início AND coluna < fim`).
+
+Cada ramo do ranking filtra por igualdade (escopo) e depois por intervalo
+(data), então a data vem por último no índice:
+
+- check-ins do geral      -> (is_general, activity_date)   [novo]
+- check-ins do setor      -> (sector_id, activity_date)    [v0001]
+- códigos gerais          -> (is_general, created_at)      [v0001]
+- códigos do setor        -> (sector_id, created_at)       [novo]
+"""
+from sqlalchemy import text
+
+version = 2
+description = "composite indexes for date-range ranking filters"
+
+INDEXES = [
+    ("ix_activities_general_date", "activities", "is_general, activity_date"),
+    ("ix_redeem_codes_sector_created", "redeem_codes", "sector_id, created_at"),
+]
+
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -0,0 +1,33 @@
+"""Regras de insígnia automáticas: colunas de regra em badges, contadores por
+usuário (badge_counters, criada pelo create_all) e unicidade de
+(user_id, badge_id) em user_badges para conceder com INSERT ... ON CONFLICT DO NOTHING.
+"""
+from sqlalchemy import inspect, text
+
+version = 3
+description = "badge rules, badge counters and unique user badges"
+
+COLUMNS = [
+    ("rule", "VARCHAR(30)"),
+    ("threshold", "INTEGER"),
+    ("sector_id", "INTEGER REFERENCES sectors(sector_id) ON DELETE CASCADE"),
+]
+
+
+def _dedupe_user_badges(conn):
+    # Mantém a concessão mais antiga de cada par.
+    conn.execute(text("""
+        DELETE FROM user_badges WHERE id NOT IN (
+            SELECT MIN(id) FROM user_badges GROUP BY user_id, badge_id
+        )
+    """))
+
+
+def upgrade(conn):
+    existing = {c["name"] for c in inspect(conn).get_columns("badges")}
+    for name, ddl in COLUMNS:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE badges ADD COLUMN {name} {ddl}"))
+
+    _dedupe_user_badges(conn)
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_user_badges_user_badge ON user_badges (user_id, badge_id)"))
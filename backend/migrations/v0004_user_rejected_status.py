@@ -0,0 +1,14 @@
+"""Status REJECTED para cadastros recusados (aprovação em lote no admin).
+
+No PostgreSQL o status é o tipo enum nativo `userstatus`; no SQLite é texto
+e não precisa de nada. ADD VALUE dentro de transação exige PostgreSQL 12+.
+"""
+from sqlalchemy import text
+
+version = 4
+description = "rejected user status"
+
+
+def upgrade(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TYPE userstatus ADD VALUE IF NOT EXISTS 'REJECTED'"))
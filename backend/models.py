@@ -1,7 +1,7 @@
 # backend/models.py
 import enum
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, UniqueConstraint, UUID, Table
+    Column, Integer, String, Boolean, Float, DateTime, Enum, ForeignKey, UniqueConstraint, UUID, Table, Index
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -16,6 +16,7 @@ class UserRole(enum.Enum):
 class UserStatus(enum.Enum):
     PENDING = "PENDING"
     ACTIVE = "ACTIVE"
+    REJECTED = "REJECTED"
 
 class ActivityType(enum.Enum):
     online = "online"
@@ -27,8 +28,9 @@ class CodeType(enum.Enum):
 
 user_sectors = Table(
     'user_sectors', Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.user_id')),
-    Column('sector_id', Integer, ForeignKey('sectors.sector_id'))
+    Column('user_id', Integer, ForeignKey('users.user_id'), primary_key=True),
+    Column('sector_id', Integer, ForeignKey('sectors.sector_id'), primary_key=True),
+    Index('ix_user_sectors_sector_user', 'sector_id', 'user_id'),
 )
 
 class SystemInvite(Base):
@@ -45,6 +47,10 @@ class Badge(Base):
     description = Column(String(200))
     icon_url = Column(String) # Sem limite para Base64 ou URL longa
     created_at = Column(DateTime, server_default=func.now())
+    # Regra de concessão automática (badges.py); None = só manual.
+    rule = Column(String(30), nullable=True)
+    threshold = Column(Integer, nullable=True)
+    sector_id = Column(Integer, ForeignKey("sectors.sector_id", ondelete="CASCADE"), nullable=True)
     awards = relationship("UserBadge", back_populates="badge")
 
 class UserBadge(Base):
@@ -55,6 +61,17 @@ class UserBadge(Base):
     awarded_at = Column(DateTime, server_default=func.now())
     user = relationship("User", back_populates="badges")
     badge = relationship("Badge", back_populates="awards")
+    __table_args__ = (
+        Index('ix_user_badges_user_id', 'user_id'),
+        Index('uq_user_badges_user_badge', 'user_id', 'badge_id', unique=True),
+    )
+
+class BadgeCounter(Base):
+    """Contadores por usuário que as regras de insígnia consultam (badges.py)."""
+    __tablename__ = "badge_counters"
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    name = Column(String(40), primary_key=True)  # "checkins", "checkins:s3", "points:2026-10", "points:2026-10:s3"
+    value = Column(Integer, nullable=False, default=0)
 
 class Sector(Base):
     __tablename__ = "sectors"
@@ -91,6 +108,10 @@ class User(Base):
     assigned_codes = relationship("RedeemCode", back_populates="assigned_user", foreign_keys="[RedeemCode.assigned_user_id]")
     general_redemptions = relationship("GeneralCodeRedemption", back_populates="user")
     last_recovery_code = Column(String(20), nullable=True)
+    __table_args__ = (
+        Index('ix_users_status_role', 'status', 'role'),
+        Index('ix_users_role', 'role'),
+    )
 
 class Activity(Base):
     __tablename__ = "activities"
@@ -112,6 +133,12 @@ class Activity(Base):
     sector = relationship("Sector", back_populates="activities")
     creator = relationship("User", back_populates="created_activities")
     checkins = relationship("CheckIn", back_populates="activity")
+    __table_args__ = (
+        Index('ix_activities_sector_date', 'sector_id', 'activity_date'),
+        Index('ix_activities_created_by', 'created_by'),
+        Index('ix_activities_activity_date', 'activity_date'),
+        Index('ix_activities_general_date', 'is_general', 'activity_date'),
+    )
 
 class CheckIn(Base):
     __tablename__ = "checkins"
@@ -121,7 +148,10 @@ class CheckIn(Base):
     timestamp = Column(DateTime, server_default=func.now())
     user = relationship("User", back_populates="checkins")
     activity = relationship("Activity", back_populates="checkins")
-    __table_args__ = (UniqueConstraint('user_id', 'activity_id', name='_user_activity_uc'),)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'activity_id', name='_user_activity_uc'),  # também serve buscas por user_id
+        Index('ix_checkins_activity_id', 'activity_id'),
+    )
 
 class RedeemCode(Base):
     __tablename__ = "redeem_codes"
@@ -146,6 +176,12 @@ class RedeemCode(Base):
     creator = relationship("User", back_populates="created_codes", foreign_keys=[created_by])
     assigned_user = relationship("User", back_populates="assigned_codes", foreign_keys=[assigned_user_id])
     general_redemptions = relationship("GeneralCodeRedemption", back_populates="code")
+    __table_args__ = (
+        Index('ix_redeem_codes_assigned_redeemed', 'assigned_user_id', 'is_redeemed'),
+        Index('ix_redeem_codes_sector_id', 'sector_id'),
+        Index('ix_redeem_codes_general_created', 'is_general', 'created_at'),
+        Index('ix_redeem_codes_sector_created', 'sector_id', 'created_at'),
+    )
 
 class GeneralCodeRedemption(Base):
     __tablename__ = "general_code_redemptions"
@@ -155,4 +191,105 @@ class GeneralCodeRedemption(Base):
     timestamp = Column(DateTime, server_default=func.now())
     user = relationship("User", back_populates="general_redemptions")
     code = relationship("RedeemCode", back_populates="general_redemptions")
-    __table_args__ = (UniqueConstraint('user_id', 'code_id', name='_user_code_uc'),)
\ No newline at end of file
+    __table_args__ = (
+        UniqueConstraint('user_id', 'code_id', name='_user_code_uc'),  # também serve buscas por user_id
+        Index('ix_general_code_redemptions_code_id', 'code_id'),
+    )
+
+class OutboxEmail(Base):
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    to_address = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body_text = Column(String, nullable=False)
+    body_html = Column(String, nullable=True)
+    status = Column(String(10), nullable=False, default="pending")  # pending | sending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+    __table_args__ = (Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),)
+
+
+class AuditLog(Base):
+    """Append-only ledger of point-affecting events (check-ins, resgates, orçamento)."""
+    __tablename__ = "audit_logs"
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    event_type = Column(String(30), nullable=False)  # checkin | code_redeem | budget_grant | points_distribution
+    # SET NULL: excluir usuário/setor não apaga o histórico, só a referência.
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)   # quem recebeu os pontos
+    actor_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)  # líder/admin responsável
+    sector_id = Column(Integer, ForeignKey("sectors.sector_id", ondelete="SET NULL"), nullable=True)
+    points = Column(Integer, nullable=False, default=0)
+    is_general = Column(Boolean, nullable=False, default=False)
+    description = Column(String(255), nullable=True)
+    ref_id = Column(Integer, nullable=True)  # activity_id / code_id de origem
+    __table_args__ = (
+        Index('ix_audit_logs_created_id', 'created_at', 'id'),
+        Index('ix_audit_logs_sector_created_id', 'sector_id', 'created_at', 'id'),
+        Index('ix_audit_logs_user_created', 'user_id', 'created_at'),
+    )
+
+
+class ChangeCounter(Base):
+    """Versão por escopo (ranking geral/setor, setores, atividades...), usada nos ETags."""
+    __tablename__ = "change_counters"
+    scope = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class RankingPeriod(Base):
+    """Mês fechado de um escopo de ranking (sector_id 0 = geral). stale=True:
+    chegou ponto atrasado para o mês e o snapshot precisa ser refeito."""
+    __tablename__ = "ranking_periods"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    sector_id = Column(Integer, primary_key=True)
+    participants = Column(Integer, nullable=False, default=0)
+    stale = Column(Boolean, nullable=False, default=False)
+    closed_at = Column(DateTime, nullable=False)
+
+
+class RankingSnapshot(Base):
+    """Ranking congelado: uma linha por participante e mês, na ordem final (position)."""
+    __tablename__ = "ranking_snapshots"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    sector_id = Column(Integer, primary_key=True)  # 0 = geral
+    position = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    rank = Column(Integer, nullable=False)
+    total_points = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index('ix_ranking_snapshots_user_history', 'user_id', 'sector_id', 'year', 'month'),
+    )
+
+
+class RateLimitBucket(Base):
+    """Token bucket compartilhado entre workers (RATE_LIMIT_STORE=database)."""
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String(200), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    allowed = Column(Boolean, nullable=False, default=True)  # resultado da última tentativa
+    updated_at = Column(Float, nullable=False, index=True)   # epoch seconds
+
+
+class IdempotencyKey(Base):
+    """Resposta guardada por (usuário, endpoint, Idempotency-Key) para replays de POST."""
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    endpoint = Column(String(40), nullable=False)
+    key = Column(String(100), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(String, nullable=False)  # JSON
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'endpoint', 'key', name='uq_idempotency_user_endpoint_key'),
+        Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
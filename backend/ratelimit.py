@@ -0,0 +1,316 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qs
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import models
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Rate limiting (token bucket) for the expensive / guessable endpoints
+#
+#   /auth/token                          bcrypt per attempt      -> IP + e-mail
+#   /auth/send-recovery-password-email   SMTP + DB write         -> IP + e-mail
+#   /auth/recover-password               6-digit code guessing   -> IP
+#   /users/redeem, /users/join-sector    code guessing           -> user (sub)
+#   /users/checkin                       code guessing           -> user (sub)
+#
+# Each bucket holds up to `burst` tokens and refills at `per_minute`/60 per
+# second; a request takes one token from every bucket of its route and gets
+# 429 + Retry-After when one of them is empty.
+#
+# Stores:
+#   memory   (default) per-worker dict with LRU eviction, O(1) per request;
+#   database rate_limit_buckets table, one atomic upsert per bucket, so all
+#            workers share the limits (PostgreSQL or SQLite).
+# -----------------------------------------------------------------------------
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").strip().lower() in ("1", "true", "yes", "y", "on")
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").strip().lower()  # memory | database
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+# (Render: 1). 0 uses the socket address.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    per_minute: float
+    burst: int
+    key: str                     # "ip" | "user" | "email"
+    param: Optional[str] = None  # query parameter holding the e-mail
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+    def configured(self) -> "Policy":
+        """Overrides from RATE_LIMIT_<NAME>="<por minuto>/<burst>", e.g. RATE_LIMIT_LOGIN_IP=60/20."""
+        raw = os.getenv(f"RATE_LIMIT_{self.name.upper()}")
+        if not raw:
+            return self
+        try:
+            per_minute, burst = raw.split("/", 1)
+            return Policy(self.name, float(per_minute), int(burst), self.key, self.param)
+        except ValueError:
+            logger.warning("Invalid RATE_LIMIT_%s=%r, using %s/%s", self.name.upper(), raw, self.per_minute, self.burst)
+            return self
+
+
+_REDEEM_USER = Policy("redeem_user", 20, 10, "user")
+
+ROUTES: dict[tuple[str, str], tuple[Policy, ...]] = {
+    ("POST", "/auth/token"): (
+        Policy("login_ip", 30, 10, "ip"),
+        Policy("login_email", 5, 5, "email", param="email"),
+    ),
+    ("POST", "/auth/send-recovery-password-email"): (
+        Policy("recovery_ip", 5, 5, "ip"),
+        Policy("recovery_email", 0.2, 3, "email", param="to_address"),
+    ),
+    ("POST", "/auth/recover-password"): (
+        Policy("recover_ip", 5, 5, "ip"),
+    ),
+    ("POST", "/users/redeem"): (_REDEEM_USER,),
+    ("POST", "/users/join-sector"): (_REDEEM_USER,),
+    ("POST", "/users/checkin"): (
+        Policy("checkin_user", 30, 10, "user"),
+    ),
+    ("POST", "/users/checkin/offline"): (
+        Policy("checkin_offline_user", 6, 3, "user"),
+    ),
+}
+
+
+# --- Stores ----------------------------------------------------------------------
+class MemoryStore:
+    """Buckets in an OrderedDict used as an LRU: get/move_to_end/popitem are O(1).
+
+    An evicted bucket comes back full, so max_keys must comfortably exceed the
+    number of clients active within one refill period.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        """Takes one token; returns 0 when allowed, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(burst)
+            else:
+                tokens, last = bucket
+                tokens = min(float(burst), tokens + max(0.0, now - last) * rate)
+                self._buckets.move_to_end(key)
+            if tokens >= 1.0:
+                tokens -= 1.0
+                wait = 0.0
+            else:
+                wait = (1.0 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class DatabaseStore:
+    """Shared buckets: one INSERT .. ON CONFLICT DO UPDATE .. RETURNING per take.
+
+    SET expressions see the row as it was before the update, so the refill,
+    the decision and the decrement happen atomically in the database.
+    """
+
+    PURGE_EVERY = 1000
+    IDLE_SECONDS = 3600  # buckets untouched for this long are full again anyway
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        if self.dialect not in ("postgresql", "sqlite"):
+            raise ValueError(f"RATE_LIMIT_STORE=database não suporta {self.dialect}")
+        self._takes = 0
+
+    def _least(self, *args):
+        return func.least(*args) if self.dialect == "postgresql" else func.min(*args)
+
+    def _greatest(self, *args):
+        return func.greatest(*args) if self.dialect == "postgresql" else func.max(*args)
+
+    def take(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        table = models.RateLimitBucket.__table__
+        insert = postgresql.insert if self.dialect == "postgresql" else sqlite.insert
+        refill = self._least(float(burst), table.c.tokens + self._greatest(0.0, now - table.c.updated_at) * rate)
+        allowed = refill >= 1.0
+        stmt = insert(table).values(key=key, tokens=float(burst) - 1.0, allowed=True, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "tokens": case((allowed, refill - 1.0), else_=refill),
+                "allowed": allowed,
+                "updated_at": now,
+            },
+        ).returning(table.c.tokens, table.c.allowed)
+        with self.engine.begin() as conn:
+            tokens, ok = conn.execute(stmt).one()
+        self._takes += 1
+        if self._takes % self.PURGE_EVERY == 0:
+            self.purge(now)
+        return 0.0 if ok else (1.0 - tokens) / rate
+
+    def purge(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        table = models.RateLimitBucket.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(table.delete().where(table.c.updated_at < now - self.IDLE_SECONDS)).rowcount or 0
+
+
+# --- Limiter + middleware -------------------------------------------------------
+class RateLimiter:
+    def __init__(self, store=None, routes: Optional[dict] = None, trusted_proxies: int = RATE_LIMIT_TRUSTED_PROXIES):
+        self.store = store if store is not None else MemoryStore()
+        self.routes = {route: tuple(p.configured() for p in policies)
+                       for route, policies in (ROUTES if routes is None else routes).items()}
+        self.trusted_proxies = trusted_proxies
+
+    def client_ip(self, scope) -> str:
+        if self.trusted_proxies:
+            for name, value in scope.get("headers") or ():
+                if name == b"x-forwarded-for":
+                    hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                    # The last N entries were appended by our proxies; anything
+                    # to the left of them is whatever the client sent.
+                    if len(hops) >= self.trusted_proxies:
+                        return hops[-self.trusted_proxies]
+                    break
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def _subject(scope) -> Optional[str]:
+        for name, value in scope.get("headers") or ():
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return None
+                import security
+                payload = security.decode_token(token.strip()) or {}
+                subject = payload.get("sub") or payload.get("email")
+                return str(subject) if subject else None
+        return None
+
+    def keys(self, scope, policies: tuple) -> list[tuple[Policy, str]]:
+        query = None
+        keys = []
+        for policy in policies:
+            if policy.key == "email":
+                if query is None:
+                    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+                value = (query.get(policy.param) or [""])[0].strip().lower()
+                if not value:
+                    continue  # the IP policy still applies
+                ident = value
+            elif policy.key == "user":
+                subject = self._subject(scope)
+                ident = f"sub:{subject}" if subject else f"ip:{self.client_ip(scope)}"
+            else:
+                ident = self.client_ip(scope)
+            keys.append((policy, f"{policy.name}:{ident}"))
+        return keys
+
+    def check(self, scope) -> Optional[tuple[Policy, float]]:
+        """(policy, retry_after) of the most restrictive empty bucket, or None."""
+        policies = self.routes.get((scope["method"], scope["path"]))
+        if not policies:
+            return None
+        denied = None
+        for policy, key in self.keys(scope, policies):
+            wait = self.store.take(key, policy.rate, policy.burst)
+            if wait and (denied is None or wait > denied[1]):
+                denied = (policy, wait)
+        return denied
+
+
+RATE_LIMITED = metrics.REGISTRY.register(metrics.Counter(
+    "rate_limited_total", "Requests rejected with 429", ("policy",),
+))
+
+
+class RateLimitMiddleware:
+    """Pure ASGI, like MetricsMiddleware. Only the routes in ROUTES pay anything."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self._limiter = limiter
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return self._limiter or limiter
+
+    async def __call__(self, scope, receive, send):
+        current = self.limiter
+        if (scope["type"] != "http" or not RATE_LIMIT_ENABLED
+                or (scope["method"], scope["path"]) not in current.routes):
+            await self.app(scope, receive, send)
+            return
+        try:
+            if isinstance(current.store, MemoryStore):
+                denied = current.check(scope)
+            else:
+                denied = await run_in_threadpool(current.check, scope)
+        except Exception as e:
+            # Fail open: a broken shared store must not take the API down.
+            logger.warning("rate limit check failed: %s", e)
+            denied = None
+        if denied is None:
+            await self.app(scope, receive, send)
+            return
+
+        policy, wait = denied
+        retry_after = max(1, math.ceil(wait))
+        RATE_LIMITED.inc(policy.name)
+        body = json.dumps(
+            {"detail": f"Muitas tentativas. Tente novamente em {retry_after} s."}, ensure_ascii=False
+        ).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _default_store():
+    if RATE_LIMIT_STORE == "database":
+        import database
+        try:
+            return DatabaseStore(database.engine)
+        except ValueError as e:
+            logger.warning("%s; usando memória", e)
+    return MemoryStore()
+
+
+limiter = RateLimiter(_default_store())
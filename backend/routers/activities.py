@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Header
 from sqlalchemy.orm import Session
-from typing import List
-import crud, models, schemas, security
+from typing import List, Optional
+import crud, models, schemas, security, versioning, idempotency, checkin_tokens
 from database import get_db
 
 router = APIRouter(prefix="/activities", tags=["activities"])
@@ -13,16 +13,25 @@ def create_act(act: schemas.ActivityCreate, db: Session = Depends(get_db), l: mo
     return crud.create_activity(db, act, l)
 
 @router.get("/", response_model=List[schemas.Activity])
-def get_act(db: Session = Depends(get_db), l: models.User = Depends(security.get_current_lider)):
+def get_act(request: Request, response: Response, db: Session = Depends(get_db), l: models.User = Depends(security.get_current_lider)):
     if not l.led_sector:
         return []
-    return crud.get_activities_by_sector(db, l.led_sector.sector_id)
+    not_modified = versioning.conditional(request, response, db, [versioning.activities_sector(l.led_sector.sector_id)], l.user_id)
+    if not_modified:
+        return not_modified
+    activities = crud.get_activities_by_sector(db, l.led_sector.sector_id)
+    for a in activities:
+        a.checkin_token = checkin_tokens.issue(a.activity_id, a.activity_date)
+    return activities
 
 @router.post("/distribute-points")
-def distribute(req: schemas.DistributePointsRequest, db: Session = Depends(get_db), lider: models.User = Depends(security.get_current_lider)):
+def distribute(req: schemas.DistributePointsRequest, db: Session = Depends(get_db), lider: models.User = Depends(security.get_current_lider),
+               idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     if not lider.led_sector:
         raise HTTPException(400, "Sem setor.")
-    success, msg = crud.distribute_points_from_budget(db, lider, req.user_id, req.points, req.description)
-    if not success:
-        raise HTTPException(400, msg)
-    return {"detail": msg}
+    def action():
+        success, msg = crud.distribute_points_from_budget(db, lider, req.user_id, req.points, req.description, commit=False)
+        if not success:
+            raise HTTPException(400, msg)
+        return {"detail": msg}
+    return idempotency.run(db, lider.user_id, "distribute_points", idempotency_key, req.model_dump(), action)
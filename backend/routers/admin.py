@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import crud, models, schemas, security
-from database import get_db
+from datetime import datetime
+from typing import List, Optional
+import crud, models, schemas, security, audit, versioning
+from database import get_db, get_read_db
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 @router.get("/users", response_model=List[schemas.UserAdminView])
-def get_all_usrs(db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+def get_all_usrs(db: Session = Depends(get_read_db), a: models.User = Depends(security.get_current_admin_master)):
     return crud.get_all_users(db)
 
 @router.get("/pending-global", response_model=List[schemas.UserAdminView])
@@ -19,16 +21,79 @@ def approve_global(user_id: int, db: Session = Depends(get_db), a: models.User =
     u = crud.get_user_by_id(db, user_id)
     return crud.update_user_status(db, u, models.UserStatus.ACTIVE)
 
+def _selection(d: schemas.BulkUserSelection) -> dict:
+    f = d.filter or schemas.BulkUserFilter()
+    return dict(user_ids=d.user_ids, sector_id=f.sector_id,
+                status=models.UserStatus(f.status) if f.status else None,
+                role=models.UserRole(f.role) if f.role else None)
+
+def _bulk(action, *args, **kwargs):
+    try:
+        return action(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@router.post("/users/bulk/approve", response_model=List[schemas.BulkUserResult])
+def bulk_approve(d: schemas.BulkUserSelection, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    """Ex.: todos os pendentes de um setor: `{"filter": {"status": "PENDING", "sector_id": 3}}`."""
+    return _bulk(crud.bulk_update_user_status, db, a, models.UserStatus.ACTIVE, **_selection(d))
+
+@router.post("/users/bulk/reject", response_model=List[schemas.BulkUserResult])
+def bulk_reject(d: schemas.BulkUserSelection, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    return _bulk(crud.bulk_update_user_status, db, a, models.UserStatus.REJECTED, **_selection(d))
+
+@router.post("/users/bulk/role", response_model=List[schemas.BulkUserResult])
+def bulk_role(d: schemas.BulkRoleRequest, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    return _bulk(crud.bulk_update_user_role, db, a, models.UserRole(d.role), **_selection(d))
+
+@router.post("/users/bulk/sector", response_model=List[schemas.BulkUserResult])
+def bulk_sector(d: schemas.BulkSectorRequest, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    if not crud.get_sector_by_id(db, d.sector_id):
+        raise HTTPException(404, "Setor não encontrado.")
+    return _bulk(crud.bulk_add_users_to_sector, db, d.sector_id, **_selection(d))
+
 @router.post("/budget")
 def add_budget(req: schemas.AddBudgetRequest, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
-    l = crud.add_budget_to_lider(db, req.lider_id, req.points)
+    l = crud.add_budget_to_lider(db, req.lider_id, req.points, actor=a)
     if not l:
         raise HTTPException(404)
     return {"detail": "OK"}
 
-@router.get("/audit/json")
-def audit(db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
-    return crud.get_audit_logs_json(db)
+@router.get("/audit/json", response_model=List[schemas.AuditLogItem])
+def get_audit(
+    response: Response,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    sector_id: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    a: models.User = Depends(security.get_current_admin_master),
+):
+    """Mais recentes primeiro. A próxima página vem no header X-Next-Cursor."""
+    try:
+        items, next_cursor = crud.get_audit_logs_json(db, limit=limit, start=start, end=end, sector_id=sector_id, cursor=cursor)
+    except ValueError:
+        raise HTTPException(400, "Cursor inválido.")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+@router.get("/audit/export")
+def export_audit(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    sector_id: Optional[int] = Query(None),
+    db: Session = Depends(get_read_db),
+    a: models.User = Depends(security.get_current_admin_master),
+):
+    if format == "ndjson":
+        body = audit.stream_ndjson(db, start=start, end=end, sector_id=sector_id)
+        return StreamingResponse(body, media_type="application/x-ndjson")
+    body = crud.generate_audit_csv(db, start=start, end=end, sector_id=sector_id)
+    return StreamingResponse(body, media_type="text/csv; charset=utf-8",
+                             headers={"Content-Disposition": 'attachment; filename="audit.csv"'})
 
 @router.post("/codes/general", status_code=status.HTTP_201_CREATED)
 def create_admin_general_code(d: schemas.CodeCreateGeneral, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
@@ -36,9 +101,27 @@ def create_admin_general_code(d: schemas.CodeCreateGeneral, db: Session = Depend
     return crud.create_general_code(db, d, a)
 
 @router.get("/codes/general", response_model=List[schemas.CodeDetail])
-def get_admin_codes(db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+def get_admin_codes(request: Request, response: Response, db: Session = Depends(get_read_db), a: models.User = Depends(security.get_current_admin_master)):
+    not_modified = versioning.conditional(request, response, db, [versioning.CODES_GENERAL])
+    if not_modified:
+        return not_modified
     return crud.get_general_codes(db)
 
+@router.get("/badges", response_model=List[schemas.Badge])
+def get_badges(db: Session = Depends(get_read_db), a: models.User = Depends(security.get_current_admin_master)):
+    return crud.get_all_badges(db)
+
+@router.post("/badges", response_model=schemas.Badge, status_code=status.HTTP_201_CREATED)
+def create_badge(d: schemas.BadgeCreate, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    """Com `rule`, a insígnia é concedida automaticamente (quem já cumpre recebe na hora)."""
+    return crud.create_badge(db, d)
+
+@router.post("/badges/{badge_id}/award/{user_id}")
+def award_badge(badge_id: int, user_id: int, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    if not db.get(models.Badge, badge_id) or not crud.get_user_by_id(db, user_id):
+        raise HTTPException(404)
+    return {"detail": crud.award_badge(db, user_id, badge_id)}
+
 @router.post("/sync-ecosystem")
 def sync_with_ecosystem(db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
     """
@@ -15,6 +15,8 @@ def login(form: schemas.TokenData = Depends(), db: Session = Depends(get_db)):
         raise HTTPException(401, "Login falhou.")
     if u.status == models.UserStatus.PENDING:
         raise HTTPException(403, "Conta pendente de aprovação do Admin Master.")
+    if u.status == models.UserStatus.REJECTED:
+        raise HTTPException(403, "Cadastro recusado pelo Admin Master.")
     
     token = security.create_access_token(
         data={"user_uuid": u.external_id, "role": u.role}, 
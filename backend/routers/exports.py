@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+import exports, models, security
+from database import get_read_db
+from routers.ranking import MONTH, YEAR, date_range
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+FORMAT = Query(exports.CSV, pattern="^(csv|xlsx)$")
+
+def _sector_scope(sector_id: Optional[int], user: models.User) -> Optional[int]:
+    """Admin escolhe (None = gerais); líder só exporta o próprio setor."""
+    if user.role == models.UserRole.admin:
+        return sector_id
+    if not user.led_sector or sector_id not in (None, user.led_sector.sector_id):
+        raise HTTPException(403, "Você só pode exportar o seu setor.")
+    return user.led_sector.sector_id
+
+def _download(db: Session, export: exports.Export, format: str) -> StreamingResponse:
+    return StreamingResponse(exports.stream(db, export, format), media_type=exports.MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{exports.filename(export, format)}"'})
+
+@router.get("/ranking")
+def export_ranking(sector_id: Optional[int] = Query(None), month: Optional[int] = MONTH, year: Optional[int] = YEAR,
+                   window: tuple = Depends(date_range), format: str = FORMAT,
+                   db: Session = Depends(get_read_db), l: models.User = Depends(security.get_current_lider)):
+    """Ranking em qualquer período (mesmos filtros do /ranking). Admin exporta
+    qualquer escopo; líder só o do próprio setor."""
+    return _download(db, exports.ranking(db, _sector_scope(sector_id, l), month, year, *window), format)
+
+@router.get("/attendance")
+def export_attendance(sector_id: Optional[int] = Query(None), month: Optional[int] = MONTH, year: Optional[int] = YEAR,
+                      window: tuple = Depends(date_range), format: str = FORMAT,
+                      db: Session = Depends(get_read_db), l: models.User = Depends(security.get_current_lider)):
+    """Todos os check-ins das atividades do setor no período."""
+    return _download(db, exports.attendance(sector_id=_sector_scope(sector_id, l), month=month, year=year,
+                                            start=window[0], end=window[1]), format)
+
+@router.get("/activities/{activity_id}/attendance")
+def export_activity_attendance(activity_id: int, format: str = FORMAT,
+                               db: Session = Depends(get_read_db), l: models.User = Depends(security.get_current_lider)):
+    activity = db.get(models.Activity, activity_id)
+    if not activity:
+        raise HTTPException(404, "Atividade não encontrada.")
+    if activity.is_general:
+        if l.role != models.UserRole.admin:
+            raise HTTPException(403, "Você só pode exportar o seu setor.")
+    else:
+        _sector_scope(activity.sector_id, l)
+    return _download(db, exports.attendance(activity_id=activity_id), format)
+
+@router.get("/redemptions")
+def export_redemptions(sector_id: Optional[int] = Query(None), month: Optional[int] = MONTH, year: Optional[int] = YEAR,
+                       window: tuple = Depends(date_range), format: str = FORMAT,
+                       db: Session = Depends(get_read_db), l: models.User = Depends(security.get_current_lider)):
+    """Códigos resgatados (gerais e únicos) do setor no período."""
+    return _download(db, exports.redemptions(_sector_scope(sector_id, l), month, year, *window), format)
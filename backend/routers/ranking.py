@@ -1,15 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import crud, models, schemas, security
-from database import get_db
+from datetime import date
+import crud, models, schemas, security, versioning, leaderboard
+from database import get_db, get_read_db, get_async_read_db
 
 router = APIRouter(prefix="/ranking", tags=["ranking"])
 
+# Fora disso datetime(year, month, 1) estoura (500) em crud.date_window.
+MONTH = Query(None, ge=1, le=12)
+YEAR = Query(None, ge=2000, le=2100)
+
+def date_range(start: Optional[date] = Query(None, description="Início (inclusivo)"),
+               end: Optional[date] = Query(None, description="Fim (exclusivo)"),
+               season: Optional[int] = Query(None, ge=2000, le=2100, description="Temporada (ano em que começa)")):
+    """Intervalo extra de datas, somado (interseção) ao filtro de month/year."""
+    if start and end and start >= end:
+        raise HTTPException(422, "A data final deve ser depois da inicial.")
+    if season is not None:
+        return crud.season_window(season, start, end)
+    return start, end
+
+@router.get("/me", response_model=schemas.MyRankResponse)
+async def rank_me(request: Request, response: Response,
+                  sector_id: Optional[int] = Query(None), month: Optional[int] = MONTH, year: Optional[int] = YEAR,
+                  k: int = Query(5, ge=0, le=50), top: int = Query(10, ge=0, le=100), window: tuple = Depends(date_range),
+                  db: AsyncSession = Depends(get_async_read_db), u: models.User = Depends(security.get_current_user_async)):
+    scopes = [versioning.ranking_sector(sector_id) if sector_id is not None else versioning.RANKING_GENERAL, versioning.USERS]
+    not_modified = await versioning.conditional_async(request, response, db, scopes, u.user_id)
+    if not_modified:
+        return not_modified
+    return await crud.get_my_rank_async(db, u.user_id, sector_id=sector_id, month=month, year=year, k=k, top_n=top,
+                                        start=window[0], end=window[1])
+
 @router.get("/geral", response_model=schemas.RankingResponse)
-def rank_geral(month: Optional[int] = Query(None), year: Optional[int] = Query(None), db: Session = Depends(get_db), u: models.User = Depends(security.get_current_user)):
-    return {"ranking": crud.get_geral_ranking(db, month, year), "my_user_id": u.user_id}
+async def rank_geral(request: Request, response: Response, month: Optional[int] = MONTH, year: Optional[int] = YEAR, window: tuple = Depends(date_range), db: AsyncSession = Depends(get_async_read_db), u: models.User = Depends(security.get_current_user_async)):
+    not_modified = await versioning.conditional_async(request, response, db, [versioning.RANKING_GENERAL, versioning.USERS], u.user_id)
+    if not_modified:
+        return not_modified
+    return {"ranking": await crud.get_geral_ranking_async(db, month, year, *window), "my_user_id": u.user_id}
 
 @router.get("/sector/{sector_id}", response_model=schemas.RankingResponse)
-def rank_sector(sector_id: int, month: Optional[int] = Query(None), year: Optional[int] = Query(None), db: Session = Depends(get_db), u: models.User = Depends(security.get_current_user)):
-    return {"my_user_id": u.user_id, "ranking": crud.get_sector_ranking(db, sector_id, month, year)}
+async def rank_sector(request: Request, response: Response, sector_id: int, month: Optional[int] = MONTH, year: Optional[int] = YEAR, window: tuple = Depends(date_range), db: AsyncSession = Depends(get_async_read_db), u: models.User = Depends(security.get_current_user_async)):
+    not_modified = await versioning.conditional_async(request, response, db, [versioning.ranking_sector(sector_id), versioning.USERS], u.user_id)
+    if not_modified:
+        return not_modified
+    return {"my_user_id": u.user_id, "ranking": await crud.get_sector_ranking_async(db, sector_id, month, year, *window)}
+
+@router.get("/history", response_model=schemas.RankHistoryResponse)
+def rank_history(sector_id: Optional[int] = Query(None), months: int = Query(12, ge=1, le=60),
+                 db: Session = Depends(get_read_db), u: models.User = Depends(security.get_current_user)):
+    """Posição do usuário nos últimos meses fechados (dos snapshots mensais)."""
+    return crud.get_rank_history(db, u.user_id, sector_id=sector_id, limit=months)
+
+@router.get("/stream")
+def rank_stream(sector_id: Optional[int] = Query(None), month: Optional[int] = MONTH, year: Optional[int] = YEAR,
+                db: Session = Depends(get_db), u: models.User = Depends(security.get_current_user)):
+    """
+    Ranking ao vivo (text/event-stream): um evento `snapshot` ao conectar e
+    depois eventos `delta` com as posições que mudaram.
+    """
+    # A sessão só serve para autenticar: não segura conexão do pool enquanto o stream estiver aberto.
+    db.close()
+    key = leaderboard.ScopeKey(sector_id=sector_id, month=month, year=year)
+    try:
+        events = leaderboard.hub.subscribe(key)
+    except leaderboard.TooManySubscribers:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Muitas conexões ao vivo. Tente novamente.", headers={"Retry-After": "30"})
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
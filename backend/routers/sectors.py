@@ -1,27 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Request, Response, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
-import crud, models, schemas, security
-from database import get_db
+import csv
+import io
+import itertools
+import crud, models, schemas, security, versioning
+from database import get_db, get_read_db
 
 router = APIRouter(prefix="/sectors", tags=["sectors"])
 
 @router.get("/", response_model=List[schemas.Sector])
-def get_secs(db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+def get_secs(request: Request, response: Response, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    not_modified = versioning.conditional(request, response, db, [versioning.SECTORS])
+    if not_modified:
+        return not_modified
     return crud.get_all_sectors(db)
 
 @router.post("/", response_model=schemas.Sector)
 def create_sec(name: str = Body(..., embed=True), db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
     return crud.create_sector(db, name)
 
+@router.post("/members/import", response_model=schemas.MembershipImportResult)
+def import_members(d: schemas.MembershipImportRequest, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    """Cada linha: `email` ou `external_id` + `sector_id` ou `sector` (nome). Vínculos já existentes são ignorados."""
+    return crud.import_sector_memberships(db, [r.model_dump() for r in d.rows])
+
+@router.post("/members/import/csv", response_model=schemas.MembershipImportResult)
+def import_members_csv(file: UploadFile = File(...), db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+    """Planilha com cabeçalho `email`/`external_id` e `sector_id`/`sector`, separada por vírgula ou ponto e vírgula."""
+    # Lê linha a linha e para em MAX+1: um arquivo enorme não é carregado inteiro.
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        header = text.readline()
+        try:
+            dialect = csv.Sniffer().sniff(header, delimiters=",;")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(itertools.chain([header], text), dialect=dialect)
+        rows = [{(k or "").strip().lower(): v for k, v in row.items()}
+                for row in itertools.islice(reader, crud.MEMBERSHIP_IMPORT_MAX_ROWS + 1)]
+    except UnicodeDecodeError:
+        raise HTTPException(400, "O arquivo precisa estar em UTF-8.")
+    finally:
+        text.detach()
+    if not rows:
+        raise HTTPException(400, "Planilha vazia.")
+    if len(rows) > crud.MEMBERSHIP_IMPORT_MAX_ROWS:
+        raise HTTPException(400, f"Máximo de {crud.MEMBERSHIP_IMPORT_MAX_ROWS} linhas por importação.")
+    return crud.import_sector_memberships(db, rows)
+
 @router.put("/{sector_id}/assign-lider")
 def assign(sector_id: int, lider_id: int = Body(..., embed=True), db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
     return crud.assign_lider_to_sector(db, lider_id, sector_id)
 
 @router.get("/{sector_id}/users", response_model=List[schemas.UserAdminView])
-def get_sec_usrs_admin(sector_id: int, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+def get_sec_usrs_admin(sector_id: int, db: Session = Depends(get_read_db), a: models.User = Depends(security.get_current_admin_master)):
     return crud.get_users_by_sector(db, sector_id)
 
 @router.get("/{sector_id}/ranking", response_model=schemas.RankingResponse)
-def get_sec_rank_admin(sector_id: int, db: Session = Depends(get_db), a: models.User = Depends(security.get_current_admin_master)):
+def get_sec_rank_admin(request: Request, response: Response, sector_id: int, db: Session = Depends(get_read_db), a: models.User = Depends(security.get_current_admin_master)):
+    not_modified = versioning.conditional(request, response, db, [versioning.ranking_sector(sector_id), versioning.USERS], a.user_id)
+    if not_modified:
+        return not_modified
     return {"my_user_id": a.user_id, "ranking": crud.get_sector_ranking(db, sector_id)}
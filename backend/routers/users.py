@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Header
 from sqlalchemy.orm import Session
-from typing import List
-import crud, models, schemas, security
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import crud, models, schemas, security, idempotency
 import database
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -51,12 +52,32 @@ def join(req: schemas.JoinSectorRequest, db: Session = Depends(database.get_db),
     return {"detail": crud.join_sector(db, u, req.invite_code)}
 
 @router.post("/checkin")
-def checkin(req: schemas.CheckInRequest, db: Session = Depends(database.get_db), u: models.User = Depends(security.get_current_user)):
-    return {"detail": crud.create_checkin(db, u, req.activity_code)}
+async def checkin(req: schemas.CheckInRequest, db: AsyncSession = Depends(database.get_async_db),
+                  u: models.User = Depends(security.get_current_user_async),
+                  idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if not idempotency_key:
+        return {"detail": await crud.create_checkin_async(db, u, req.activity_code)}
+    return await idempotency.run_async(db, u.user_id, "checkin", idempotency_key, req.model_dump(),
+                                       lambda s: {"detail": crud.create_checkin(s, u, req.activity_code, commit=False)})
+
+@router.post("/checkin/offline", response_model=List[schemas.OfflineCheckInResult])
+def checkin_offline(req: schemas.OfflineCheckInRequest, db: Session = Depends(database.get_db), u: models.User = Depends(security.get_current_user)):
+    """Envia a fila de check-ins lidos sem conexão (tokens assinados do QR code)."""
+    return crud.ingest_offline_checkins(db, u, [(c.token, c.scanned_at) for c in req.checkins])
 
 @router.post("/redeem")
-def redeem(req: schemas.RedeemCodeRequest, db: Session = Depends(database.get_db), u: models.User = Depends(security.get_current_user)):
-    code = crud.get_code_by_string(db, req.code_string)
-    if not code:
-        raise HTTPException(404, "Código inválido.")
-    return {"detail": crud.redeem_code(db, u, code)}
+async def redeem(req: schemas.RedeemCodeRequest, db: AsyncSession = Depends(database.get_async_db),
+                 u: models.User = Depends(security.get_current_user_async),
+                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if not idempotency_key:
+        code = await crud.get_code_by_string_async(db, req.code_string)
+        if not code:
+            raise HTTPException(404, "Código inválido.")
+        return {"detail": await crud.redeem_code_async(db, u, code)}
+
+    def action(s: Session):
+        code = crud.get_code_by_string(s, req.code_string)
+        if not code:
+            raise HTTPException(404, "Código inválido.")
+        return {"detail": crud.redeem_code(s, u, code, commit=False)}
+    return await idempotency.run_async(db, u.user_id, "redeem", idempotency_key, req.model_dump(), action)
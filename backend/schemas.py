@@ -23,11 +23,25 @@ class Badge(BaseConfig):
     description: str | None = None
     icon_url: str | None = None
     created_at: datetime
+    rule: str | None = None
+    threshold: int | None = None
+    sector_id: int | None = None
 
 class BadgeCreate(BaseConfig):
     name: str
     description: str | None = None
     icon_url: str | None = None
+    # Concessão automática (badges.py): checkins | monthly_points | perfect_attendance
+    rule: str | None = Field(None, pattern="^(checkins|monthly_points|perfect_attendance)$")
+    threshold: int | None = Field(None, gt=0)
+    sector_id: int | None = None
+
+    @model_validator(mode="after")
+    def _attendance_needs_sector(self):
+        # Sem setor a regra nunca é carregada (badges.load_rules) e ninguém recebe.
+        if self.rule == "perfect_attendance" and self.sector_id is None:
+            raise ValueError("Presença total precisa de um setor.")
+        return self
 
 class UserBadge(BaseConfig):
     id: int
@@ -106,6 +120,51 @@ class AddBudgetRequest(BaseConfig):
     lider_id: int
     points: int
 
+# Ações em lote no admin: lista de IDs, filtro ou os dois (interseção)
+class BulkUserFilter(BaseConfig):
+    status: UserStatus | None = None
+    sector_id: int | None = None
+    role: UserRole | None = None
+
+class BulkUserSelection(BaseConfig):
+    user_ids: list[int] | None = Field(None, min_length=1, max_length=1000)
+    filter: BulkUserFilter | None = None
+
+    @model_validator(mode="after")
+    def _not_everyone(self):
+        if self.user_ids is None and (self.filter is None or not self.filter.model_dump(exclude_none=True)):
+            raise ValueError("Informe user_ids ou um filtro.")
+        return self
+
+class BulkRoleRequest(BulkUserSelection):
+    role: UserRole
+
+class BulkSectorRequest(BulkUserSelection):
+    sector_id: int
+
+class BulkUserResult(BaseConfig):
+    user_id: int
+    status: str  # ok | unchanged | skipped | forbidden
+
+# Importação de vínculos usuário-setor (JSON; o CSV tem as mesmas colunas)
+class MembershipImportRow(BaseConfig):
+    email: str | None = None
+    external_id: str | None = None
+    sector_id: int | None = None
+    sector: str | None = None  # nome do setor
+
+class MembershipImportRequest(BaseConfig):
+    rows: list[MembershipImportRow] = Field(..., min_length=1, max_length=5000)
+
+class MembershipImportError(BaseConfig):
+    row: int
+    detail: str
+
+class MembershipImportResult(BaseConfig):
+    added: int
+    existing: int
+    errors: list[MembershipImportError]
+
 # Pontos Gerais (Com Título)
 class CodeCreateGeneral(BaseConfig):
     points_value: int = 10
@@ -122,6 +181,18 @@ class CodeCreateUnique(BaseConfig):
 
 class CheckInRequest(BaseConfig): activity_code: str 
 
+class OfflineCheckIn(BaseConfig):
+    token: str = Field(..., max_length=200)
+    scanned_at: datetime | None = None  # quando o app leu o QR code (UTC)
+
+class OfflineCheckInRequest(BaseConfig):
+    checkins: list[OfflineCheckIn] = Field(..., min_length=1, max_length=500)
+
+class OfflineCheckInResult(BaseConfig):
+    token: str
+    status: str  # ok | duplicate | invalid | forbidden
+    detail: str
+
 class RankingEntry(BaseConfig):
     user_id: int
     username: str
@@ -131,6 +202,30 @@ class RankingEntry(BaseConfig):
 class RankingResponse(BaseConfig):
     my_user_id: int
     ranking: list[RankingEntry]
+class RankedEntry(RankingEntry):
+    rank: int
+    position: int
+class MyRankResponse(BaseConfig):
+    my_user_id: int
+    my_rank: int | None = None
+    my_position: int | None = None
+    my_points: int = 0
+    participants: int
+    top: list[RankedEntry]
+    neighbors: list[RankedEntry]
+
+class RankHistoryEntry(BaseConfig):
+    year: int
+    month: int
+    rank: int
+    position: int
+    total_points: int
+    participants: int
+
+class RankHistoryResponse(BaseConfig):
+    user_id: int
+    sector_id: int | None = None
+    history: list[RankHistoryEntry]
 
 class SectorInfo(BaseConfig):
     name: str
@@ -149,6 +244,7 @@ class Activity(ActivityCreate):
     created_by: int
     sector_id: int | None
     checkin_code: str | None = None
+    checkin_token: str | None = None  # QR code assinado (check-in offline)
 
 class UserAdminView(UserBase): 
     user_id: int
@@ -140,6 +140,49 @@ def get_current_user(
         if not user:
             raise credentials_exception
 
+    database.set_actor(db, external_id or email)
+    return user
+
+def _resolve_user_id_sync(token: str) -> int:
+    db = database.SessionLocal()
+    try:
+        return get_current_user(token, db).user_id
+    finally:
+        db.close()
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db=Depends(database.get_async_db),
+) -> User:
+    """
+    Versão async de get_current_user para as rotas `async def`.
+    O caminho comum (usuário já existe com o UUID do token) é uma consulta
+    async; o resto (conta antiga achada por e-mail, criação via user service)
+    é raro e faz chamadas HTTP síncronas, então roda o fluxo síncrono numa
+    thread e depois carrega o usuário nesta sessão.
+    """
+    from sqlalchemy import select
+    from starlette.concurrency import run_in_threadpool
+
+    payload = decode_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Não foi possível validar as credenciais",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    external_id = payload.get("sub")
+    user = None
+    if external_id:
+        try:
+            uuid_val = uuid.UUID(external_id) if isinstance(external_id, str) else external_id
+            user = (await db.execute(select(User).where(User.external_id == uuid_val).limit(1))).scalars().first()
+        except (ValueError, AttributeError):
+            pass
+    if user is None:
+        user = await db.get(User, await run_in_threadpool(_resolve_user_id_sync, token))
+    database.set_actor(db.sync_session, external_id or payload.get("email"))
     return user
 
 # --- NOVAS DEPENDÊNCIAS DE AUTORIZAÇÃO ---
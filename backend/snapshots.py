@@ -0,0 +1,266 @@
+"""Snapshots mensais do ranking (arquivo histórico).
+
+Um mês fechado tem o ranking geral e o de cada setor congelados em
+ranking_snapshots (uma linha por participante, já na ordem final) e um
+registro por escopo em ranking_periods. `/ranking/*?month=&year=` de um mês
+fechado lê o snapshot pela chave primária em vez de recalcular tudo a partir
+de check-ins e códigos.
+
+Pontos que caem num mês já fechado (check-in em atividade antiga, código
+criado no mês anterior resgatado agora) marcam o período como `stale`: ele
+volta a ser calculado ao vivo até o worker refazer o snapshot.
+
+Uso (na pasta `backend`):
+
+    python snapshots.py close --year 2026 --month 9
+    python snapshots.py pending          # fecha/refaz tudo que estiver pendente
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import and_, delete, func, insert, literal, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+GENERAL = 0  # sector_id dos snapshots do ranking geral
+
+RANKING_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("RANKING_SNAPSHOT_INTERVAL_SECONDS", "3600"))
+RANKING_SNAPSHOT_BACKFILL_MONTHS = int(os.getenv("RANKING_SNAPSHOT_BACKFILL_MONTHS", "24"))
+RANKING_SNAPSHOT_START_DELAY_SECONDS = 60.0
+_PG_LOCK_KEY = 74_310_042
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def current_month() -> tuple[int, int]:
+    now = _utcnow()
+    return now.year, now.month
+
+
+def _previous(year: int, month: int) -> tuple[int, int]:
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+# --- Leitura ---------------------------------------------------------------------
+def is_frozen(db: Session, year: int, month: int, sector_id: Optional[int] = None) -> bool:
+    """True when the scope (general or that sector) has an up-to-date snapshot
+    for (year, month) (one PK lookup). A sector created after the month was
+    closed has no period row and is computed live."""
+    stale = db.execute(
+        select(models.RankingPeriod.stale).where(
+            models.RankingPeriod.year == year,
+            models.RankingPeriod.month == month,
+            models.RankingPeriod.sector_id == (sector_id or GENERAL),
+        )
+    ).scalar_one_or_none()
+    return stale is not None and not stale
+
+
+def snapshot_query(sector_id: Optional[int], month: int, year: int):
+    """Same columns as crud.ranking_query, read from the snapshot."""
+    snap = models.RankingSnapshot
+    return select(
+        snap.user_id, models.User.username, models.User.nickname, models.User.profile_pic,
+        snap.total_points, snap.rank, snap.position,
+        func.count().over().label("participants"),
+    ).join(models.User, models.User.user_id == snap.user_id).where(
+        snap.year == year, snap.month == month, snap.sector_id == (sector_id or GENERAL),
+    ).cte("ranking")
+
+
+def rank_history(db: Session, user_id: int, sector_id: Optional[int] = None, limit: int = 12) -> list[dict]:
+    """The user's rank in the last `limit` closed months (oldest first)."""
+    snap, period = models.RankingSnapshot, models.RankingPeriod
+    rows = db.execute(
+        select(snap.year, snap.month, snap.rank, snap.position, snap.total_points, period.participants)
+        .join(period, and_(period.year == snap.year, period.month == snap.month, period.sector_id == snap.sector_id))
+        .where(snap.user_id == user_id, snap.sector_id == (sector_id or GENERAL))
+        .order_by(snap.year.desc(), snap.month.desc())
+        .limit(limit)
+    ).all()
+    return [dict(r._mapping) for r in reversed(rows)]
+
+
+# --- Escrita ---------------------------------------------------------------------
+def touch(db: Session, when: Optional[datetime]) -> None:
+    """Called by write paths whose points count in `when`'s month: a closed
+    month is marked stale (no-op for the current month, the common case)."""
+    if when is None or (when.year, when.month) >= current_month():
+        return
+    db.execute(
+        update(models.RankingPeriod)
+        .where(models.RankingPeriod.year == when.year, models.RankingPeriod.month == when.month,
+               models.RankingPeriod.stale == False)  # noqa: E712
+        .values(stale=True)
+    )
+
+
+def close_month(db: Session, year: int, month: int, commit: bool = True) -> dict[int, int]:
+    """Freezes the general and per-sector rankings of a finished month
+    (replacing an older snapshot). Returns {sector_id: participants}."""
+    import crud
+
+    if (year, month) >= current_month():
+        raise ValueError("Só meses já encerrados podem ser congelados.")
+    snap, period = models.RankingSnapshot, models.RankingPeriod
+    db.execute(delete(snap).where(snap.year == year, snap.month == month))
+    db.execute(delete(period).where(period.year == year, period.month == month))
+
+    now = _utcnow()
+    participants = {}
+    sector_ids = db.execute(select(models.Sector.sector_id)).scalars().all()
+    for sector_id in [None, *sector_ids]:
+        key = sector_id or GENERAL
+        ranking = crud.ranking_query(sector_id, month, year)
+        db.execute(insert(snap).from_select(
+            ["year", "month", "sector_id", "position", "user_id", "rank", "total_points"],
+            select(literal(year), literal(month), literal(key), ranking.c.position, ranking.c.user_id,
+                   ranking.c.rank, ranking.c.total_points),
+        ))
+        participants[key] = db.execute(
+            select(func.count()).select_from(snap).where(snap.year == year, snap.month == month, snap.sector_id == key)
+        ).scalar()
+        db.add(period(year=year, month=month, sector_id=key, participants=participants[key], stale=False, closed_at=now))
+    if commit: db.commit()
+    else: db.flush()
+    return participants
+
+
+def _first_month(db: Session) -> Optional[tuple[int, int]]:
+    first = db.execute(select(func.min(models.Activity.activity_date))).scalar()
+    codes = db.execute(select(func.min(models.RedeemCode.created_at))).scalar()
+    dates = [d for d in (first, codes) if d is not None]
+    if not dates:
+        return None
+    earliest = min(dates)
+    return earliest.year, earliest.month
+
+
+def pending_months(db: Session, backfill_months: int = RANKING_SNAPSHOT_BACKFILL_MONTHS) -> list[tuple[int, int]]:
+    """Finished months (newest `backfill_months`) without a snapshot or with a stale one."""
+    first = _first_month(db)
+    if first is None:
+        return []
+    fresh = {(y, m) for y, m in db.execute(
+        select(models.RankingPeriod.year, models.RankingPeriod.month)
+        .where(models.RankingPeriod.sector_id == GENERAL, models.RankingPeriod.stale == False)  # noqa: E712
+    )}
+    months = []
+    year, month = _previous(*current_month())
+    for _ in range(backfill_months):
+        if (year, month) < first:
+            break
+        if (year, month) not in fresh:
+            months.append((year, month))
+        year, month = _previous(year, month)
+    return sorted(months)
+
+
+def close_pending(db: Session) -> list[tuple[int, int]]:
+    """Closes every pending month in one transaction. With several app workers,
+    only the one that gets the advisory lock (Postgres) does the work."""
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _PG_LOCK_KEY}).scalar():
+            db.rollback()
+            return []
+    closed = []
+    for year, month in pending_months(db):
+        participants = close_month(db, year, month, commit=False)
+        closed.append((year, month))
+        logger.info("ranking snapshot %04d-%02d: %s participants (geral)", year, month, participants.get(GENERAL, 0))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # someone closed the same month at the same time (e.g. the CLI); next run retries
+        return []
+    return closed
+
+
+class SnapshotWorker:
+    """Closes finished months in the background (first run shortly after boot)."""
+
+    def __init__(self, session_factory, interval: float = RANKING_SNAPSHOT_INTERVAL_SECONDS,
+                 start_delay: float = RANKING_SNAPSHOT_START_DELAY_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.start_delay = start_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> list[tuple[int, int]]:
+        db = self.session_factory()
+        try:
+            return close_pending(db)
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        delay = self.start_delay
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("ranking snapshot run failed")
+            delay = self.interval
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="ranking-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+
+_worker: Optional[SnapshotWorker] = None
+
+
+def start_worker(session_factory) -> SnapshotWorker:
+    global _worker
+    if _worker is None:
+        _worker = SnapshotWorker(session_factory)
+        _worker.start()
+    return _worker
+
+
+def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
+def main():
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    close = sub.add_parser("close", help="congela (ou refaz) um mês")
+    close.add_argument("--year", type=int, required=True)
+    close.add_argument("--month", type=int, required=True)
+    sub.add_parser("pending", help="fecha todos os meses pendentes")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "close":
+            print(close_month(db, args.year, args.month))
+        else:
+            print(close_pending(db) or "nada pendente")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import crud
+import database
+import models
+from conftest import auth_headers
+
+
+def _member_with_activity(db):
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x", role=models.UserRole.lider,
+                        status=models.UserStatus.ACTIVE)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([lider, member])
+    db.flush()
+    sector = models.Sector(name="Caixa", lider_id=lider.user_id)
+    member.sectors.append(sector)
+    db.add(models.Activity(title="Ensaio", type=models.ActivityType.presencial, points_value=10,
+                           activity_date=datetime.utcnow(), sector=sector, created_by=lider.user_id, checkin_code="ENS123"))
+    db.add(models.RedeemCode(code_string="GERAL10", points_value=5, type=models.CodeType.general,
+                             is_general=True, created_by=lider.user_id))
+    db.commit()
+    return member
+
+
+def test_async_checkin_and_redeem_routes(client, session_factory):
+    db = session_factory()
+    member = _member_with_activity(db)
+    headers = auth_headers(member)
+
+    assert client.post("/users/checkin", json={"activity_code": "ENS123"}, headers=headers).json() == {"detail": "Check-in realizado! +10 pts"}
+    assert client.post("/users/checkin", json={"activity_code": "ENS123"}, headers=headers).json() == {"detail": "Check-in já realizado."}
+    assert client.post("/users/redeem", json={"code_string": "GERAL10"}, headers=headers).json() == {"detail": "Resgatado! +5 pts"}
+    assert client.post("/users/redeem", json={"code_string": "NADA"}, headers=headers).status_code == 404
+
+    keyed = {**headers, "Idempotency-Key": "redeem-1"}
+    assert client.post("/users/redeem", json={"code_string": "GERAL10"}, headers=keyed).json() == {"detail": "Você já usou este código."}
+
+    # Same audit/versioning side effects as the sync path.
+    assert db.query(models.AuditLog).count() == 2
+    assert crud.calculate_points(db, member.user_id, sector_id=member.sectors[0].sector_id) == 10
+    assert client.get("/ranking/geral", headers=headers).json()["ranking"][0]["total_points"] == 5  # só o código geral
+    db.close()
+
+
+def test_async_rankings_match_sync(session_factory):
+    db = session_factory()
+    member = _member_with_activity(db)
+    crud.create_checkin(db, member, "ENS123")
+    sector_id = member.sectors[0].sector_id
+
+    async def fetch():
+        engine = create_async_engine(database.async_url(str(session_factory.kw["bind"].url)))
+        async with database.async_session_factory(engine)() as adb:
+            result = (await crud.get_geral_ranking_async(adb), await crud.get_sector_ranking_async(adb, sector_id),
+                      await crud.get_my_rank_async(adb, member.user_id, sector_id=sector_id))
+        await engine.dispose()
+        return result
+
+    geral, sector, me = asyncio.run(fetch())
+    assert geral == crud.get_geral_ranking(db)
+    assert sector == crud.get_sector_ranking(db, sector_id)
+    assert me == crud.get_my_rank(db, member.user_id, sector_id=sector_id)
+    db.close()
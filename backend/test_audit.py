@@ -0,0 +1,88 @@
+import sys
+import os
+from datetime import datetime
+
+from sqlalchemy import text
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import audit
+import crud
+import models
+from conftest import auth_headers
+
+
+def _seed(db):
+    admin = models.User(email="admin@b10.local", username="admin", hashed_password="x",
+                        role=models.UserRole.admin, status=models.UserStatus.ACTIVE)
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x",
+                        role=models.UserRole.lider, status=models.UserStatus.ACTIVE, points_budget=100)
+    ritmista = models.User(email="ritmista@b10.local", username="ritmista", hashed_password="x",
+                           status=models.UserStatus.ACTIVE)
+    db.add_all([admin, lider, ritmista]); db.flush()
+    sector = models.Sector(name="Caixa", lider_id=lider.user_id)
+    db.add(sector); db.flush()
+    db.execute(models.user_sectors.insert().values(user_id=ritmista.user_id, sector_id=sector.sector_id))
+    activity = models.Activity(title="Ensaio", type=models.ActivityType.presencial, activity_date=datetime(2025, 3, 1),
+                               points_value=10, sector_id=sector.sector_id, created_by=lider.user_id, checkin_code="ENS001")
+    code = models.RedeemCode(code_string="GERAL123", points_value=5, type=models.CodeType.general,
+                             is_general=True, created_by=admin.user_id, title="Live")
+    db.add_all([activity, code]); db.commit()
+    return admin, lider, ritmista, sector, code
+
+
+def test_write_paths_append_audit_rows_and_paginate(db):
+    admin, lider, ritmista, sector, code = _seed(db)
+
+    crud.create_checkin(db, ritmista, "ENS001")
+    crud.redeem_code(db, ritmista, code)
+    crud.add_budget_to_lider(db, lider.user_id, 50, actor=admin)
+    crud.distribute_points_from_budget(db, lider, ritmista.user_id, 20, "Destaque do ensaio")
+
+    types = [r.event_type for r in db.query(models.AuditLog).order_by(models.AuditLog.id)]
+    assert types == [audit.CHECKIN, audit.CODE_REDEEM, audit.BUDGET_GRANT, audit.POINTS_DISTRIBUTION]
+
+    page1, cursor = audit.list_logs(db, limit=3)
+    page2, last = audit.list_logs(db, limit=3, cursor=cursor)
+    assert [i["type"] for i in page1] == [audit.POINTS_DISTRIBUTION, audit.BUDGET_GRANT, audit.CODE_REDEEM]
+    assert [i["type"] for i in page2] == [audit.CHECKIN]
+    assert last is None
+    assert page2[0]["sector_name"] == "Caixa"
+    assert page2[0]["lider_name"] == "lider"
+
+    in_sector, _ = audit.list_logs(db, sector_id=sector.sector_id)
+    assert [i["type"] for i in in_sector] == [audit.BUDGET_GRANT, audit.CHECKIN]
+
+
+def test_deleting_a_user_keeps_their_audit_rows(db):
+    db.execute(text("PRAGMA foreign_keys=ON"))  # como no PostgreSQL
+    admin, lider, ritmista, sector, code = _seed(db)
+    crud.create_checkin(db, ritmista, "ENS001")
+    crud.redeem_code(db, ritmista, code)
+    crud.distribute_points_from_budget(db, lider, ritmista.user_id, 20, "Destaque do ensaio")
+
+    crud.delete_user(db, db.get(models.User, ritmista.user_id))
+    rows = db.query(models.AuditLog).order_by(models.AuditLog.id).all()
+    assert [(r.event_type, r.user_id) for r in rows] == [
+        (audit.CHECKIN, None), (audit.CODE_REDEEM, None), (audit.POINTS_DISTRIBUTION, None)]
+    assert rows[2].actor_id == lider.user_id
+
+
+def test_export_streams_csv_and_ndjson(client, db):
+    admin, lider, ritmista, sector, code = _seed(db)
+    crud.create_checkin(db, ritmista, "ENS001")
+    crud.redeem_code(db, ritmista, code)
+
+    r = client.get("/admin/audit/export?format=csv", headers=auth_headers(admin))
+    assert r.status_code == 200
+    lines = r.text.strip().splitlines()
+    assert lines[0] == ",".join(audit.EXPORT_FIELDS)
+    assert len(lines) == 3
+
+    r = client.get("/admin/audit/export?format=ndjson", headers=auth_headers(admin))
+    assert len(r.text.strip().splitlines()) == 2
+
+    r = client.get("/admin/audit/json?limit=1", headers=auth_headers(admin))
+    assert len(r.json()) == 1
+    assert r.headers["X-Next-Cursor"]
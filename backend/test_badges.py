@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import select
+
+import badges
+import crud
+import models
+import schemas
+from conftest import auth_headers
+
+
+def _awarded(db, user):
+    return set(db.execute(select(models.UserBadge.badge_id).where(models.UserBadge.user_id == user.user_id)).scalars())
+
+
+def _setup(db, staff):
+    admin, lider, sector, _ = staff
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE,
+                         sectors=[sector])
+    db.add(member)
+    now = datetime.utcnow()
+    for i in range(3):
+        db.add(models.Activity(title=f"Ensaio {i}", type=models.ActivityType.presencial, points_value=10, activity_date=now,
+                               sector=sector, created_by=lider.user_id, checkin_code=f"REP{i}"))
+    db.add(models.RedeemCode(code_string="GERAL50", points_value=50, type=models.CodeType.general, is_general=True,
+                             created_by=admin.user_id))
+    db.commit()
+    return admin, sector, member
+
+
+def test_rules_are_awarded_incrementally(client, db, staff):
+    admin, sector, member = _setup(db, staff)
+    headers = auth_headers(admin)
+    created = [client.post("/admin/badges", json=body, headers=headers).json() for body in (
+        {"name": "Dois ensaios", "rule": "checkins", "threshold": 2},
+        {"name": "Mês de 50", "rule": "monthly_points", "threshold": 50},
+        {"name": "Presença total", "rule": "perfect_attendance", "sector_id": sector.sector_id},
+        {"name": "Manual"},
+    )]
+    two, month50, attendance, manual = (b["badge_id"] for b in created)
+    res = client.post("/admin/badges", json={"name": "x", "rule": "perfect_attendance"}, headers=headers)
+    assert res.status_code == 422 and "Presença total precisa de um setor." in res.text
+    with pytest.raises(ValidationError):
+        schemas.BadgeCreate(name="x", rule="perfect_attendance")
+
+    crud.create_checkin(db, member, "REP0")
+    assert _awarded(db, member) == set()
+    crud.create_checkin(db, member, "REP1")
+    assert _awarded(db, member) == {two}
+    crud.redeem_code(db, member, crud.get_code_by_string(db, "GERAL50"))
+    assert _awarded(db, member) == {two, month50}
+    crud.create_checkin(db, member, "REP2")
+    assert _awarded(db, member) == {two, month50, attendance}
+
+    counters = dict(db.execute(select(models.BadgeCounter.name, models.BadgeCounter.value)
+                               .where(models.BadgeCounter.user_id == member.user_id)).all())
+    now = datetime.utcnow()
+    assert counters == {"checkins": 3, f"checkins:s{sector.sector_id}": 3,
+                        badges.points_counter(now): 50, badges.points_counter(now, sector.sector_id): 30}
+
+    assert crud.award_badge(db, member.user_id, manual) == "Insígnia concedida!"
+    assert crud.award_badge(db, member.user_id, manual) == "Usuário já possui."
+
+
+def test_rebuild_matches_incremental_and_new_rules_backfill(db, staff, monkeypatch):
+    admin, sector, member = _setup(db, staff)
+    for code in ("REP0", "REP1"):
+        crud.create_checkin(db, member, code)
+    live = dict(db.execute(select(models.BadgeCounter.name, models.BadgeCounter.value)).all())
+
+    assert badges.rebuild(db) == 0
+    assert dict(db.execute(select(models.BadgeCounter.name, models.BadgeCounter.value)).all()) == live
+
+    # Regra criada depois dos pontos: quem já cumpre recebe na criação, avaliando
+    # só a regra nova (nada de evaluate_all).
+    monkeypatch.setattr(badges, "evaluate_all", lambda *a, **k: pytest.fail("varredura completa"))
+    new = [crud.create_badge(db, schemas.BadgeCreate(name=name, **rule)).badge_id for name, rule in (
+        ("Dois", {"rule": "checkins", "threshold": 2, "sector_id": sector.sector_id}),
+        ("Vinte no mês", {"rule": "monthly_points", "threshold": 20, "sector_id": sector.sector_id}),
+        ("Trinta no mês", {"rule": "monthly_points", "threshold": 30}),
+        ("Presença total", {"rule": "perfect_attendance", "sector_id": sector.sector_id}),  # 2 de 3 ensaios
+    )]
+    assert _awarded(db, member) == set(new[:2])
@@ -0,0 +1,32 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from sqlalchemy import create_engine, func, select
+
+import models
+import seed
+from load import percentile
+
+
+def test_seed_builds_consistent_dataset(tmp_path):
+    url = f"sqlite:///{tmp_path / 'bench.db'}"
+    manifest = seed.seed(url, users=60, sectors=4, activities=30, checkins_per_user=5, general_codes=10)
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.CheckIn.__table__)).scalar() == manifest["counts"]["checkins"]
+        assert conn.execute(select(func.count()).select_from(models.user_sectors)).scalar() == manifest["counts"]["memberships"]
+    engine.dispose()
+    user = manifest["users"][0]
+    assert user["sectors"] and manifest["activity_codes"]["general"]
+
+
+def test_percentile_nearest_rank():
+    values = sorted(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.95) == 0.0
@@ -0,0 +1,90 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+import membership
+import models
+from conftest import auth_headers
+
+
+def _setup(db, staff):
+    admin, lider, caixa, surdo = staff
+    pending = [models.User(email=f"p{i}@ritmistas.com.br", username=f"p{i}", hashed_password="x", status=models.UserStatus.PENDING,
+                           sectors=[caixa] if i < 3 else [surdo]) for i in range(5)]
+    db.add_all(pending)
+    db.commit()
+    return admin, lider, caixa, surdo, pending
+
+
+def _statements(engine, kind):
+    seen = []
+
+    def _count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(kind):
+            seen.append(statement)
+    event.listen(engine, "before_cursor_execute", _count)
+    return seen
+
+
+def test_bulk_approve_by_filter_is_one_update(client, db, staff):
+    admin, lider, caixa, surdo, pending = _setup(db, staff)
+    headers = auth_headers(admin)
+    updates = _statements(db.get_bind(), "UPDATE USERS")
+
+    res = client.post("/admin/users/bulk/approve", headers=headers,
+                      json={"filter": {"status": "PENDING", "sector_id": caixa.sector_id}})
+    assert res.status_code == 200
+    assert res.json() == [{"user_id": u.user_id, "status": "ok"} for u in pending[:3]]
+    assert len(updates) == 1
+
+    ids = [pending[0].user_id, pending[3].user_id, 9999, pending[3].user_id]
+    res = client.post("/admin/users/bulk/approve", headers=headers, json={"user_ids": ids})
+    assert res.json() == [{"user_id": pending[0].user_id, "status": "unchanged"},
+                          {"user_id": pending[3].user_id, "status": "ok"},
+                          {"user_id": 9999, "status": "skipped"}]
+
+    db.expire_all()
+    statuses = {u.username: u.status for u in db.query(models.User)}
+    assert statuses["p4"] == models.UserStatus.PENDING
+    assert all(statuses[f"p{i}"] == models.UserStatus.ACTIVE for i in range(4))
+
+    assert client.post("/admin/users/bulk/approve", headers=headers, json={}).status_code == 422
+    assert client.post("/admin/users/bulk/approve", headers=auth_headers(lider), json={"user_ids": [1]}).status_code == 403
+
+
+def test_bulk_reject_role_and_sector(client, db, staff):
+    admin, lider, caixa, surdo, pending = _setup(db, staff)
+    headers = auth_headers(admin)
+
+    res = client.post("/admin/users/bulk/reject", headers=headers,
+                      json={"user_ids": [pending[4].user_id, lider.user_id, admin.user_id]})
+    assert [r["status"] for r in res.json()] == ["ok", "forbidden", "forbidden"]
+    pending_ids = {u["user_id"] for u in client.get("/admin/pending-global", headers=headers).json()}
+    assert pending_ids == {u.user_id for u in pending[:4]}
+
+    res = client.post("/admin/users/bulk/role", headers=headers,
+                      json={"user_ids": [lider.user_id, admin.user_id], "role": "2"})
+    assert [r["status"] for r in res.json()] == ["ok", "forbidden"]
+    db.expire_all()
+    assert db.get(models.Sector, caixa.sector_id).lider_id is None
+    assert db.get(models.User, lider.user_id).role == models.UserRole.user
+
+    res = client.post("/admin/users/bulk/role", headers=headers, json={"user_ids": [pending[0].user_id], "role": "1"})
+    assert res.json() == [{"user_id": pending[0].user_id, "status": "ok"}]
+    db.expire_all()
+    assert db.get(models.User, pending[0].user_id).status == models.UserStatus.ACTIVE
+
+    assert membership.is_member(db, pending[0].user_id, surdo.sector_id) is False
+    res = client.post("/admin/users/bulk/sector", headers=headers,
+                      json={"filter": {"sector_id": caixa.sector_id}, "sector_id": surdo.sector_id})
+    assert [r["status"] for r in res.json()] == ["ok", "ok", "ok"]
+    res = client.post("/admin/users/bulk/sector", headers=headers,
+                      json={"user_ids": [pending[0].user_id, pending[3].user_id], "sector_id": surdo.sector_id})
+    assert [r["status"] for r in res.json()] == ["unchanged", "unchanged"]
+    assert membership.is_member(db, pending[0].user_id, surdo.sector_id) is True
+    assert client.post("/admin/users/bulk/sector", headers=headers,
+                       json={"user_ids": [1], "sector_id": 9999}).status_code == 404
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cache_bus
+import config_store
+import versioning
+
+
+def _foreign(keys):
+    # A message as another worker would write it.
+    return ('{"o":"other-worker","k":%s}\n' % str(sorted(keys)).replace("'", '"')).encode()
+
+
+def test_file_transport_relays_other_workers_and_skips_own(tmp_path, db):
+    path = str(tmp_path / "bus")
+    transport = cache_bus.FileTransport(path, poll_seconds=60)
+    received = []
+    callback = cache_bus.subscribe(received.append)
+    try:
+        transport._offset = transport._size()
+        versioning.on_commit(transport._after_commit)
+        versioning.bump(db, versioning.RANKING_GENERAL)
+        db.commit()
+        assert received == [frozenset({versioning.RANKING_GENERAL})]  # local, immediate
+
+        with open(path, "ab") as f:
+            f.write(_foreign({versioning.ranking_sector(4)}))
+            f.write(b'{"o":"other-worker","k":["us')  # torn write: read on a later poll
+        received.clear()
+        transport.poll()
+        assert received == [frozenset({versioning.ranking_sector(4)})]  # own line skipped
+
+        with open(path, "ab") as f:
+            f.write(b'ers"]}\n')
+        transport.poll()
+        assert received[-1] == frozenset({versioning.USERS})
+
+        with open(path, "wb"):
+            pass  # rotated by another worker
+        transport.poll()
+        assert received[-1] == frozenset({cache_bus.ALL})
+    finally:
+        versioning._callbacks.remove(transport._after_commit)
+        cache_bus._subscribers.remove(callback)
+
+
+def test_envs_snapshot_is_invalidated_by_bus():
+    store = config_store.envs
+    store._values, store._expires_at = {"SMTP_SERVER": "old"}, float("inf")
+    try:
+        cache_bus.broadcast(cache_bus.ENVS)
+        assert store._expires_at == 0.0
+    finally:
+        store._values, store._expires_at = None, 0.0
@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import checkin_tokens
+import crud
+import models
+from conftest import auth_headers
+
+
+def test_token_is_signed_and_time_boxed():
+    start = datetime(2026, 3, 7, 19, 0)
+    token = checkin_tokens.issue(42, start)
+    assert token == checkin_tokens.issue(42, start) and len(token) < 60
+
+    assert checkin_tokens.verify(token, scanned_at=start + timedelta(minutes=5), now=start + timedelta(hours=1)) == 42
+    assert checkin_tokens.verify(token, now=start) == 42  # lido agora
+    tampered = token.replace(".42.", ".43.")
+    cases = [
+        (tampered, start, start),
+        (token[:-2] + "xx", start, start),
+        ("lixo", start, start),
+        ("ck1.42.1.2.é", start, start),                                          # assinatura fora do ASCII
+        (token, start - timedelta(hours=3), start),                              # antes da janela
+        (token, start + timedelta(hours=1), start),                              # leitura no futuro
+        (token, start + timedelta(hours=1), start + timedelta(days=5)),          # fila enviada tarde
+    ]
+    for bad, scanned_at, now in cases:
+        with pytest.raises(checkin_tokens.InvalidToken):
+            checkin_tokens.verify(bad, scanned_at=scanned_at, now=now)
+
+
+def test_offline_batch_is_ingested_once(client, session_factory):
+    db = session_factory()
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x", role=models.UserRole.lider,
+                        status=models.UserStatus.ACTIVE)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([lider, member])
+    db.flush()
+    mine, other = models.Sector(name="Agogô", lider_id=lider.user_id), models.Sector(name="Chocalho")
+    member.sectors.append(mine)
+    lider.sectors.append(mine)
+    db.add(other)
+    db.commit()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    body = {"title": "Ensaio", "type": "presencial", "points_value": 10, "activity_date": now.isoformat()}
+    created = client.post("/activities/", json=body, headers=auth_headers(lider)).json()
+    token = created["checkin_token"]
+    assert checkin_tokens.verify(token) == created["activity_id"]
+    assert client.get("/activities/", headers=auth_headers(lider)).json()[0]["checkin_token"] == token
+
+    foreign = models.Activity(title="Outro", type=models.ActivityType.presencial, points_value=99, activity_date=now,
+                              sector=other, created_by=lider.user_id, checkin_code="OUTRO1")
+    db.add(foreign)
+    db.commit()
+    foreign_token = checkin_tokens.issue(foreign.activity_id, now)
+
+    scanned = (now + timedelta(minutes=3)).isoformat()
+    batch = {"checkins": [{"token": token, "scanned_at": scanned}, {"token": token}, {"token": "ck1.1.2.3.abc"},
+                          {"token": foreign_token}]}
+    results = client.post("/users/checkin/offline", json=batch, headers=auth_headers(member)).json()
+    assert [r["status"] for r in results] == ["ok", "duplicate", "invalid", "forbidden"]
+    assert results[0]["detail"] == "Check-in realizado! +10 pts"
+
+    again = client.post("/users/checkin/offline", json={"checkins": [{"token": token}]}, headers=auth_headers(member)).json()
+    assert again[0]["status"] == "duplicate"
+    assert crud.create_checkin(db, member, created["checkin_code"]) == "Check-in já realizado."
+
+    checkin = db.query(models.CheckIn).filter_by(user_id=member.user_id).one()
+    assert checkin.timestamp == now + timedelta(minutes=3)
+    assert crud.calculate_points(db, member.user_id, sector_id=mine.sector_id) == 10
+    assert db.query(models.AuditLog).filter_by(user_id=member.user_id).count() == 1
+    db.close()
@@ -0,0 +1,71 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime
+
+from sqlalchemy import event
+
+import code_cache
+import crud
+import models
+import schemas
+
+
+def _count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_negative_entries_and_invalidation_on_create(session_factory):
+    db = session_factory()
+    admin = models.User(email="adm@b10.local", username="adm", hashed_password="x", role=models.UserRole.admin,
+                        status=models.UserStatus.ACTIVE)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([admin, member])
+    db.commit()
+    statements = _count_queries(session_factory.kw["bind"])
+
+    for _ in range(5):
+        assert crud.get_code_by_string(db, "CHUTE123") is None
+    assert sum("FROM redeem_codes" in s for s in statements) == 1
+
+    activity = crud.create_activity(db, schemas.ActivityCreate(title="Ensaio", type="presencial", points_value=10,
+                                                               activity_date=datetime.utcnow()), admin)
+    code = crud.create_general_code(db, schemas.CodeCreateGeneral(points_value=5, title="Geral"), admin)
+    checkin_code, activity_id, code_string, code_id = activity.checkin_code, activity.activity_id, code.code_string, code.code_id
+    found = crud.get_code_by_string(db, code_string)
+    assert found.code_id == code_id and found.points_value == 5 and found.is_general
+
+    statements.clear()
+    for _ in range(3):
+        assert code_cache.activity(db, checkin_code).activity_id == activity_id
+        crud.get_code_by_string(db, code_string)
+    assert sum("FROM activities" in s for s in statements) == 1 and not any("FROM redeem_codes" in s for s in statements)
+    assert crud.create_checkin(db, member, checkin_code) == "Check-in realizado! +10 pts"
+    db.close()
+
+
+def test_unique_code_is_claimed_once(session_factory):
+    db = session_factory()
+    admin = models.User(email="adm@b10.local", username="adm", hashed_password="x", role=models.UserRole.admin,
+                        status=models.UserStatus.ACTIVE, points_budget=100)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([admin, member])
+    db.flush()
+    db.add(models.RedeemCode(code_string="UNICO1", points_value=7, type=models.CodeType.unique, is_general=True,
+                             assigned_user_id=member.user_id, created_by=admin.user_id))
+    db.commit()
+
+    # Two requests read the (cached) code before either redeems it.
+    first, second = session_factory(), session_factory()
+    code = crud.get_code_by_string(first, "UNICO1")
+    assert crud.get_code_by_string(second, "UNICO1") is code
+    assert crud.redeem_code(first, crud.get_user_by_id(first, member.user_id), code) == "Resgatado! +7 pts"
+    assert crud.redeem_code(second, crud.get_user_by_id(second, member.user_id), code) == "Código já utilizado."
+    assert crud.calculate_points(db, member.user_id, is_general=True) == 7
+    for s in (first, second, db):
+        s.close()
@@ -0,0 +1,46 @@
+import sys
+import os
+import threading
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config_store
+
+
+def test_concurrent_first_load_is_single_flight():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"SMTP_SERVER": "smtp.b10.local"}
+
+    store = config_store.EnvStore(loader, ttl_seconds=60)
+    threads = [threading.Thread(target=store.get, args=("SMTP_SERVER",)) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert store.get("SMTP_SERVER") == "smtp.b10.local"
+    assert store.get("MISSING", "fallback") == "fallback"
+    assert len(calls) == 1
+
+
+def test_failed_load_falls_back_and_keeps_previous_snapshot():
+    state = {"fail": False}
+
+    def loader():
+        if state["fail"]:
+            raise RuntimeError("envs table missing")
+        return {"EMAIL_ADDRESS": "noreply@b10.local"}
+
+    store = config_store.EnvStore(loader, ttl_seconds=60)
+    assert store.get("EMAIL_ADDRESS") == "noreply@b10.local"
+
+    state["fail"] = True
+    store.invalidate()
+    assert store.get("EMAIL_ADDRESS") == "noreply@b10.local"
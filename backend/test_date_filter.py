@@ -0,0 +1,64 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date, datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+
+import crud
+import models
+from conftest import auth_headers
+
+
+def test_date_window_is_half_open():
+    assert crud.date_window(2, 2024) == (datetime(2024, 2, 1), datetime(2024, 3, 1))
+    assert crud.date_window(12, 2024) == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+    assert crud.date_window(year=2024) == (datetime(2024, 1, 1), datetime(2025, 1, 1))
+    assert crud.date_window(start=date(2024, 3, 10)) == (datetime(2024, 3, 10), None)
+    # mês/ano + intervalo = interseção
+    assert crud.date_window(3, 2024, start=date(2024, 3, 10), end=date(2024, 5, 1)) == (datetime(2024, 3, 10), datetime(2024, 4, 1))
+    assert crud.season_window(2024) == (datetime(2024, crud.RANKING_SEASON_START_MONTH, 1), datetime(2025, crud.RANKING_SEASON_START_MONTH, 1))
+
+    sql = str(crud.apply_date_filter(select(models.Activity.activity_id), models.Activity.activity_date, 3, 2024)
+              .compile(dialect=sqlite.dialect()))
+    assert "strftime" not in sql and "activity_date >=" in sql and "activity_date <" in sql
+
+
+def test_ranking_boundaries(client, session_factory):
+    db = session_factory()
+    admin = models.User(email="adm@b10.local", username="adm", hashed_password="x", role=models.UserRole.admin,
+                        status=models.UserStatus.ACTIVE)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([admin, member])
+    db.flush()
+    moments = [datetime(2024, 2, 29, 23, 59, 59), datetime(2024, 3, 1), datetime(2024, 3, 31, 23, 59, 59, 999999),
+               datetime(2024, 4, 1), datetime(2023, 3, 15)]
+    for i, when in enumerate(moments):
+        db.add(models.Activity(title=f"A{i}", type=models.ActivityType.presencial, points_value=10 ** i,
+                               activity_date=when, is_general=True, created_by=admin.user_id, checkin_code=f"DT{i}"))
+    db.commit()
+    for i in range(len(moments)):
+        crud.create_checkin(db, member, f"DT{i}")
+
+    def total(**kw):
+        return crud.get_geral_ranking(db, **kw)[0].total_points
+
+    assert total(month=3, year=2024) == 10 + 100
+    assert total(year=2024) == 1 + 10 + 100 + 1000
+    assert total(month=3) == 10 + 100 + 10000  # mês sem ano: todos os anos
+    assert total(start=date(2024, 3, 1), end=date(2024, 4, 2)) == 10 + 100 + 1000
+    assert crud.calculate_points(db, member.user_id, is_general=True, month=2, year=2024) == 1
+
+    headers = auth_headers(member)
+    body = client.get("/ranking/geral", params={"start": "2024-02-29", "end": "2024-03-01"}, headers=headers).json()
+    assert body["ranking"][0]["total_points"] == 1
+    assert client.get("/ranking/geral", params={"season": 2023}, headers=headers).json()["ranking"][0]["total_points"] == \
+        total(start=crud.season_window(2023)[0], end=crud.season_window(2023)[1])
+    assert client.get("/ranking/geral", params={"start": "2024-03-02", "end": "2024-03-01"}, headers=headers).status_code == 422
+    for params in ({"month": 13, "year": 2024}, {"month": 0}, {"month": 12, "year": 9999}):
+        assert client.get("/ranking/geral", params=params, headers=headers).status_code == 422
+    db.close()
@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, timedelta
+
+import crud
+import exports
+import models
+from conftest import auth_headers
+
+
+def _setup(db, staff):
+    admin, lider, caixa, surdo = staff
+    members = [models.User(email=f"m{i}@b10.local", username=name, hashed_password="x", status=models.UserStatus.ACTIVE,
+                           sectors=[caixa]) for i, name in enumerate(["ana", "=cmd|' /C calc'!A0", "bia"])]
+    db.add_all(members)
+    db.flush()
+    now = datetime.utcnow()
+    ensaio = models.Activity(title="Ensaio <geral> & cia", type=models.ActivityType.presencial, points_value=10,
+                             activity_date=now - timedelta(hours=1), sector=caixa, created_by=lider.user_id, checkin_code="CX1")
+    outro = models.Activity(title="Ensaio surdo", type=models.ActivityType.presencial, points_value=5,
+                            activity_date=now, sector=surdo, created_by=admin.user_id, checkin_code="SD1")
+    db.add_all([ensaio, outro,
+                models.RedeemCode(code_string="CX50", points_value=50, type=models.CodeType.general, sector=caixa,
+                                  created_by=lider.user_id, title="Bônus")])
+    db.commit()
+    for m in members:
+        crud.create_checkin(db, m, "CX1")
+    crud.redeem_code(db, members[0], crud.get_code_by_string(db, "CX50"))
+    return admin, lider, caixa, surdo, members, ensaio, outro
+
+
+def _xlsx_rows(content: bytes) -> list[list[str]]:
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert zf.testzip() is None
+        assert {"[Content_Types].xml", "xl/workbook.xml", "xl/worksheets/sheet1.xml"} <= set(zf.namelist())
+        sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+    rows = []
+    for row in re.findall(r"<row>(.*?)</row>", sheet):
+        rows.append([re.sub(r"<[^>]+>", "", cell) for cell in re.findall(r"<c[^>]*>(.*?)</c>|<c/>", row)])
+    return rows
+
+
+def test_ranking_and_attendance_exports(client, db, staff):
+    admin, lider, caixa, surdo, members, ensaio, outro = _setup(db, staff)
+    headers = auth_headers(lider)
+
+    res = client.get(f"/exports/ranking?sector_id={caixa.sector_id}", headers=headers)
+    assert res.status_code == 200
+    assert res.headers["content-disposition"] == f'attachment; filename="ranking-setor-{caixa.sector_id}.csv"'
+    rows = list(csv.reader(io.StringIO(res.text)))
+    assert rows[0] == ["posicao", "rank", "user_id", "usuario", "apelido", "pontos"]
+    assert [(r[3], r[5]) for r in rows[1:]] == [("ana", "60"), ("'=cmd|' /C calc'!A0", "10"), ("bia", "10")]
+
+    res = client.get(f"/exports/activities/{ensaio.activity_id}/attendance?format=xlsx", headers=headers)
+    assert res.headers["content-type"] == exports.MEDIA_TYPES[exports.XLSX]
+    rows = _xlsx_rows(res.content)
+    assert rows[0][:2] == ["activity_id", "atividade"]
+    assert len(rows) == 4 and rows[1][1] == "Ensaio &lt;geral&gt; &amp; cia"
+
+    assert client.get(f"/exports/activities/{outro.activity_id}/attendance", headers=headers).status_code == 403
+    assert client.get(f"/exports/attendance?sector_id={surdo.sector_id}", headers=headers).status_code == 403
+    assert client.get("/exports/ranking", headers=auth_headers(members[0])).status_code == 403
+    # Ranking: líder só o próprio setor (sem sector_id = o dele); admin qualquer escopo.
+    assert client.get(f"/exports/ranking?sector_id={surdo.sector_id}", headers=headers).status_code == 403
+    res = client.get("/exports/ranking", headers=headers)
+    assert res.headers["content-disposition"] == f'attachment; filename="ranking-setor-{caixa.sector_id}.csv"'
+    res = client.get("/exports/ranking", headers=auth_headers(admin))
+    assert res.headers["content-disposition"] == 'attachment; filename="ranking-geral.csv"'
+    assert client.get("/exports/ranking?month=13&year=2024", headers=auth_headers(admin)).status_code == 422
+
+    res = client.get("/exports/redemptions", headers=headers)  # líder: o próprio setor
+    rows = list(csv.reader(io.StringIO(res.text)))
+    assert [(r[1], r[3], r[4], r[6]) for r in rows[1:]] == [("CX50", "geral", "50", "ana")]
+    res = client.get(f"/exports/attendance?sector_id={surdo.sector_id}&format=xlsx", headers=auth_headers(admin))
+    assert _xlsx_rows(res.content) == [_xlsx_rows(res.content)[0]]  # só o cabeçalho
+
+
+def test_writers_stream_in_batches(monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 10)
+    rows = ((i, f"user{i}", datetime(2026, 1, 1) + timedelta(minutes=i)) for i in range(35))
+    chunks = list(exports.stream_csv(["id", "nome", "quando"], rows))
+    assert len(chunks) == 4
+    assert list(csv.reader(io.StringIO("".join(chunks))))[-1] == ["34", "user34", "2026-01-01 00:34:00"]
+
+    rows = ((i, f"user{i}\x01", None) for i in range(35))
+    chunks = list(exports.stream_xlsx(["id", "nome", "vazio"], rows))
+    assert len(chunks) == 4
+    parsed = _xlsx_rows(b"".join(chunks))
+    assert len(parsed) == 36 and parsed[-1] == ["34", "user34", ""]
@@ -0,0 +1,63 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import crud
+import idempotency
+import models
+from conftest import auth_headers
+
+
+def _lider_and_member(db):
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x", role=models.UserRole.lider,
+                        status=models.UserStatus.ACTIVE, points_budget=100)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([lider, member])
+    db.flush()
+    db.add(models.Sector(name="Repique", lider_id=lider.user_id))
+    db.commit()
+    return lider, member
+
+
+def test_retried_distribute_pays_once(client, session_factory):
+    db = session_factory()
+    lider, member = _lider_and_member(db)
+    headers = {**auth_headers(lider), "Idempotency-Key": "dist-001"}
+    body = {"user_id": member.user_id, "points": 30, "description": "Bônus ensaio"}
+
+    first = client.post("/activities/distribute-points", json=body, headers=headers)
+    retry = client.post("/activities/distribute-points", json=body, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers.get(idempotency.REPLAY_HEADER) == "true"
+
+    db.expire_all()
+    assert db.get(models.User, lider.user_id).points_budget == 70
+    assert db.query(models.AuditLog).count() == 1
+
+    other_body = client.post("/activities/distribute-points", json={**body, "points": 10}, headers=headers)
+    assert other_body.status_code == 422
+    db.close()
+
+
+def test_concurrent_twin_rolls_back_and_replays_winner(session_factory):
+    db, twin = session_factory(), session_factory()
+    lider, member = _lider_and_member(db)
+    payload = {"user_id": member.user_id, "points": 30}
+
+    def action():
+        # The twin request commits first...
+        idempotency.run(twin, lider.user_id, "distribute_points", "k1", payload,
+                        lambda: {"detail": crud.distribute_points_from_budget(
+                            twin, twin.get(models.User, lider.user_id), member.user_id, 30, "", commit=False)[1]})
+        # ...while this one was still doing the same write.
+        return {"detail": crud.distribute_points_from_budget(db, lider, member.user_id, 30, "", commit=False)[1]}
+
+    response = idempotency.run(db, lider.user_id, "distribute_points", "k1", payload, action)
+    assert response.headers[idempotency.REPLAY_HEADER] == "true"
+    db.expire_all()
+    assert db.get(models.User, lider.user_id).points_budget == 70
+    db.close()
+    twin.close()
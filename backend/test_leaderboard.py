@@ -0,0 +1,62 @@
+import sys
+import os
+import asyncio
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import leaderboard
+import versioning
+
+
+def _entry(user_id, points, position):
+    return {"user_id": user_id, "username": f"u{user_id}", "nickname": None, "profile_pic": None,
+            "total_points": points, "rank": position, "position": position}
+
+
+def test_bursts_are_coalesced_into_one_delta():
+    state = {"ranking": [_entry(1, 20, 1), _entry(2, 10, 2)]}
+    hub = leaderboard.LeaderboardHub(lambda key: list(state["ranking"]), interval=0.2, heartbeat=5)
+
+    async def scenario():
+        hub.start()
+        stream = hub.subscribe(leaderboard.ScopeKey())
+        snapshot = await stream.__anext__()
+        assert snapshot.startswith("event: snapshot")
+
+        state["ranking"] = [_entry(2, 30, 1), _entry(1, 20, 2)]
+        for _ in range(50):
+            hub.notify(frozenset({versioning.RANKING_GENERAL}))
+        hub.notify(frozenset({versioning.ranking_sector(9)}))  # other scope: ignored
+        delta = await asyncio.wait_for(stream.__anext__(), 2)
+        await stream.aclose()
+        await hub.stop()
+        return delta
+
+    delta = asyncio.run(scenario())
+    assert delta.startswith("event: delta")
+    assert '"user_id":2,' in delta and '"total_points":30' in delta
+    assert hub.flushes == 2  # initial load + one coalesced recompute
+    assert hub.subscriber_count == 0
+
+
+def test_slow_subscriber_gets_snapshot_instead_of_backlog():
+    state = {"points": 0}
+    hub = leaderboard.LeaderboardHub(lambda key: [_entry(1, state["points"], 1)], interval=0, heartbeat=5)
+    key = leaderboard.ScopeKey(sector_id=3)
+
+    async def scenario():
+        hub._wake = asyncio.Event()
+        stream = hub.subscribe(key)
+        await stream.__anext__()
+        for points in (10, 20, 30):
+            state["points"] = points
+            hub._mark_dirty(frozenset({versioning.ranking_sector(3)}))
+            await hub.flush()
+        message = await stream.__anext__()
+        await stream.aclose()
+        return message
+
+    message = asyncio.run(scenario())
+    assert message.startswith("event: snapshot")
+    assert '"total_points":30' in message
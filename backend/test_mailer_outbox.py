@@ -0,0 +1,69 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import mailer
+import models
+
+
+def _settings(smtp_server):
+    return mailer.EmailSettings(
+        smtp_server="127.0.0.1",
+        smtp_port=smtp_server.port,
+        email_address="noreply@b10.local",
+        email_password="secret",
+        use_starttls=False,
+    )
+
+
+def test_worker_reuses_one_smtp_session(session_factory, db, smtp_server):
+    for i in range(5):
+        mailer.enqueue_email(db, f"user{i}@example.com", "Assunto", f"Corpo {i}")
+
+    worker = mailer.MailWorker(session_factory, settings=_settings(smtp_server), batch_size=2)
+    assert worker.run_until_idle() == 5
+    worker._smtp.close()
+
+    assert len(smtp_server.messages) == 5
+    assert smtp_server.connections == 1
+    assert smtp_server.logins == 1
+    statuses = {row.status for row in db.query(models.OutboxEmail).all()}
+    assert statuses == {"sent"}
+
+
+def test_failed_message_is_rescheduled_with_backoff(session_factory, db, smtp_server):
+    mailer.enqueue_email(db, "bad@example.com", "Assunto", "Corpo")
+    mailer.enqueue_email(db, "good@example.com", "Assunto", "Corpo")
+    smtp_server.fail_next = 1
+
+    worker = mailer.MailWorker(session_factory, settings=_settings(smtp_server))
+    worker.process_batch()
+    worker._smtp.close()
+
+    db.expire_all()
+    bad = db.query(models.OutboxEmail).filter_by(to_address="bad@example.com").one()
+    good = db.query(models.OutboxEmail).filter_by(to_address="good@example.com").one()
+    assert good.status == "sent"
+    assert bad.status == "pending"
+    assert bad.attempts == 1
+    assert bad.last_error
+    assert bad.next_attempt_at > mailer._utcnow()
+    assert [m["to"] for m in smtp_server.messages] == [["good@example.com"]]
+    assert smtp_server.connections == 1
+
+
+def test_recovery_email_is_queued_not_sent_inline(db, smtp_server):
+    user = models.User(email="ritmista@example.com", username="ritmista", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    code = mailer.send_recovery_email_to_address(db, "ritmista@example.com")
+
+    db.refresh(user)
+    assert user.last_recovery_code == code
+    queued = db.query(models.OutboxEmail).one()
+    assert queued.status == "pending"
+    assert code in queued.body_text
+    assert smtp_server.messages == []
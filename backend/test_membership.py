@@ -0,0 +1,52 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime
+
+import crud
+import membership
+import models
+
+
+def test_membership_cache_is_invalidated_on_commit(session_factory):
+    db = session_factory()
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x", role=models.UserRole.lider,
+                        status=models.UserStatus.ACTIVE)
+    member = models.User(email="m@b10.local", username="m", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([lider, member])
+    db.flush()
+    caixa, surdo = models.Sector(name="Caixa", lider_id=lider.user_id), models.Sector(name="Surdo")
+    db.add_all([caixa, surdo])
+    db.flush()
+    db.add(models.Activity(title="Ensaio", type=models.ActivityType.presencial, points_value=10, activity_date=datetime.utcnow(),
+                           sector=surdo, created_by=lider.user_id, checkin_code="SUR1"))
+    db.commit()
+
+    assert crud.create_checkin(db, member, "SUR1") == "Você não pertence ao setor desta atividade."
+    assert membership.cache.get(member.user_id) == frozenset()
+
+    # Another session joins: the committed change drops the cached entry.
+    other = session_factory()
+    assert crud.join_sector(other, crud.get_user_by_id(other, member.user_id), str(surdo.invite_code)).startswith("Bem-vindo")
+    other.close()
+    assert membership.cache.get(member.user_id) is None
+    assert crud.create_checkin(db, member, "SUR1") == "Check-in realizado! +10 pts"
+    assert membership.sector_ids(db, member.user_id) == {surdo.sector_id}
+
+    hits = membership.cache.hits
+    assert membership.is_member(db, member.user_id, surdo.sector_id) and not membership.is_member(db, member.user_id, caixa.sector_id)
+    assert membership.cache.hits == hits + 2
+
+    crud.assign_lider_to_sector(db, member.user_id, caixa.sector_id)
+    assert membership.sector_ids(db, member.user_id) == {surdo.sector_id, caixa.sector_id}
+
+    # Uncommitted changes never reach the shared cache; a rollback leaves it clean.
+    membership.changed(db, member.user_id)
+    db.execute(models.user_sectors.delete().where(models.user_sectors.c.user_id == member.user_id))
+    assert membership.sector_ids(db, member.user_id) == frozenset()
+    db.rollback()
+    assert membership.sector_ids(db, member.user_id) == {surdo.sector_id, caixa.sector_id}
+    db.close()
@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func, select
+
+import crud
+import membership
+import models
+from conftest import auth_headers
+
+
+def _setup(db):
+    admin = models.User(email="adm@b10.local", username="adm", hashed_password="x", role=models.UserRole.admin,
+                        status=models.UserStatus.ACTIVE)
+    users = [models.User(email=f"Ritmista{i}@b10.local", username=f"r{i}", hashed_password="x",
+                         status=models.UserStatus.ACTIVE) for i in range(4)]
+    caixa, surdo, dup1, dup2 = (models.Sector(name=n) for n in ("Caixa", "Surdo", "Chocalho", "chocalho"))
+    users[0].sectors.append(caixa)
+    db.add_all([admin, *users, caixa, surdo, dup1, dup2])
+    db.commit()
+    return admin, users, caixa, surdo
+
+
+def test_json_import_resolves_in_bulk_and_ignores_existing(client, session_factory):
+    db = session_factory()
+    admin, users, caixa, surdo = _setup(db)
+    rows = [
+        {"email": "ritmista0@b10.local", "sector": "caixa"},                       # já vinculado
+        {"email": "RITMISTA1@b10.local", "sector_id": caixa.sector_id},
+        {"external_id": str(users[2].external_id), "sector": "Surdo"},
+        {"external_id": str(users[2].external_id), "sector": "surdo"},             # repetida na planilha
+        {"email": "ninguem@b10.local", "sector": "Caixa"},
+        {"email": "ritmista3@b10.local", "sector": "Chocalho"},                    # dois setores com esse nome
+        {"external_id": "nao-e-uuid", "sector_id": 1},
+        {"email": "ritmista3@b10.local"},
+    ]
+    selects = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *a: selects.append(statement) if statement.lstrip().upper().startswith("SELECT") else None)
+
+    res = client.post("/sectors/members/import", json={"rows": rows}, headers=auth_headers(admin))
+    assert res.status_code == 200
+    body = res.json()
+    assert (body["added"], body["existing"]) == (2, 1)
+    assert [e["row"] for e in body["errors"]] == [5, 6, 7, 8]
+    assert 0 < len(selects) <= 6  # autenticação + uma query por tipo de chave, não uma por linha
+
+    pairs = db.execute(select(models.user_sectors.c.user_id, models.user_sectors.c.sector_id)).all()
+    assert len(pairs) == len(set(pairs)) == 3
+    assert membership.is_member(db, users[2].user_id, surdo.sector_id)
+    db.close()
+
+
+def test_csv_import_accepts_semicolons(client, session_factory, monkeypatch):
+    db = session_factory()
+    admin, users, caixa, surdo = _setup(db)
+    csv_text = "﻿Email;Sector\nritmista1@b10.local;Surdo\nritmista2@b10.local;Surdo\nritmista2@b10.local;Surdo\n"
+    res = client.post("/sectors/members/import/csv", headers=auth_headers(admin),
+                      files={"file": ("membros.csv", csv_text.encode("utf-8"), "text/csv")})
+    assert res.json() == {"added": 2, "existing": 0, "errors": []}
+    count = db.execute(select(func.count()).select_from(models.user_sectors)
+                       .where(models.user_sectors.c.sector_id == surdo.sector_id)).scalar()
+    assert count == 2
+    res = client.post("/sectors/members/import/csv", headers=auth_headers(admin),
+                      files={"file": ("vazio.csv", b"email,sector\n", "text/csv")})
+    assert res.status_code == 400
+    monkeypatch.setattr(crud, "MEMBERSHIP_IMPORT_MAX_ROWS", 2)
+    res = client.post("/sectors/members/import/csv", headers=auth_headers(admin),
+                      files={"file": ("grande.csv", csv_text.encode("utf-8") * 100, "text/csv")})
+    assert res.status_code == 400 and "2 linhas" in res.json()["detail"]
+    res = client.post("/sectors/members/import/csv", headers=auth_headers(admin),
+                      files={"file": ("latin1.csv", "email,sector\nj\xe3o@b10.local,Surdo\n".encode("latin-1"), "text/csv")})
+    assert res.status_code == 400
+    db.close()
@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+def test_histogram_quantiles_and_exposition():
+    h = metrics.Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 0.2, 0.5))
+    for _ in range(90):
+        h.observe(0.05, "/a")
+    for _ in range(10):
+        h.observe(0.4, "/a")
+
+    text = "\n".join(h.collect())
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 90' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 100' in text
+    assert 'test_latency_seconds_count{route="/a"} 100' in text
+
+    counts = h._values[("/a",)][:-1]
+    assert h._quantile(0.5, counts, 100) <= 0.1
+    assert 0.2 < h._quantile(0.99, counts, 100) <= 0.5
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(500, "boom")
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/items/0")
+
+    text = metrics.REGISTRY.render()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'http_request_errors_total{method="GET",route="/items/{item_id}"} 1' in text
+    assert 'http_request_duration_seconds_quantile{method="GET",route="/items/{item_id}",quantile="0.99"}' in text
+    assert "http_requests_in_flight 0" in text
+
+
+if __name__ == "__main__":
+    test_histogram_quantiles_and_exposition()
+    test_middleware_labels_by_route_template()
+    print("✅ Metrics tests passed!")
@@ -0,0 +1,91 @@
+import sys
+import os
+from datetime import datetime
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import crud
+import models
+from conftest import auth_headers
+
+
+def _seed(db):
+    admin = models.User(email="admin@b10.local", username="admin", hashed_password="x",
+                        role=models.UserRole.admin, status=models.UserStatus.ACTIVE)
+    users = [models.User(email=f"u{i}@b10.local", username=f"u{i}", hashed_password="x",
+                         status=models.UserStatus.ACTIVE) for i in range(8)]
+    pending = models.User(email="p@b10.local", username="pending", hashed_password="x")
+    db.add_all([admin, pending, *users])
+    db.flush()
+    sector = models.Sector(name="Caixa", lider_id=users[0].user_id)
+    sector.members = users[:5] + [pending]
+    db.add(sector)
+    db.flush()
+
+    for i, user in enumerate(users):
+        for month, general in ((1, True), (2, True), (1, False)):
+            act = models.Activity(title=f"a{i}{month}{general}", type=models.ActivityType.presencial,
+                                  activity_date=datetime(2025, month, 10), points_value=10 * (i % 4 + 1),
+                                  is_general=general, sector_id=None if general else sector.sector_id,
+                                  created_by=admin.user_id)
+            db.add(act)
+            db.flush()
+            db.add(models.CheckIn(user_id=user.user_id, activity_id=act.activity_id))
+    general_code = models.RedeemCode(code_string="GERAL", points_value=7, type=models.CodeType.general,
+                                     is_general=True, created_by=admin.user_id)
+    unique_code = models.RedeemCode(code_string="UNICO", points_value=13, type=models.CodeType.unique,
+                                    sector_id=sector.sector_id, assigned_user_id=users[4].user_id,
+                                    is_redeemed=True, created_by=admin.user_id)
+    db.add_all([general_code, unique_code])
+    db.flush()
+    db.add(models.GeneralCodeRedemption(user_id=users[6].user_id, code_id=general_code.code_id))
+    db.commit()
+    return users, sector
+
+
+def _expected(db, users, **kw):
+    totals = sorted(((crud.calculate_points(db, u.user_id, **kw), u.user_id) for u in users), key=lambda t: (-t[0], t[1]))
+    return [uid for _, uid in totals], dict((uid, pts) for pts, uid in totals)
+
+
+def test_window_ranking_matches_calculate_points(db):
+    users, sector = _seed(db)
+    for kw in ({"is_general": True}, {"is_general": True, "month": 1, "year": 2025}):
+        order, points = _expected(db, users, **kw)
+        ranking = crud.get_geral_ranking(db, kw.get("month"), kw.get("year"))
+        assert [e.user_id for e in ranking] == order
+        assert all(e.total_points == points[e.user_id] for e in ranking)
+
+    order, points = _expected(db, users[:5], sector_id=sector.sector_id)
+    ranking = crud.get_sector_ranking(db, sector.sector_id)
+    assert [e.user_id for e in ranking] == order
+    assert all(e.total_points == points[e.user_id] for e in ranking)
+
+
+def test_my_rank_returns_window_around_caller(db):
+    users, _ = _seed(db)
+    full = crud.get_geral_ranking(db)
+    me = full[5]
+
+    result = crud.get_my_rank(db, me.user_id, k=1, top_n=2)
+    assert result.participants == len(users)
+    assert result.my_position == 6
+    assert result.my_points == me.total_points
+    assert [e.user_id for e in result.top] == [e.user_id for e in full[:2]]
+    assert [e.user_id for e in result.neighbors] == [e.user_id for e in full[4:7]]
+    # RANK() shares the position on ties
+    assert result.my_rank == 1 + sum(1 for e in full if e.total_points > me.total_points)
+
+
+def test_my_rank_endpoint(client, session_factory):
+    db = session_factory()
+    users, sector = _seed(db)
+    outsider = users[7]
+
+    resp = client.get("/ranking/me", params={"sector_id": sector.sector_id, "top": 3}, headers=auth_headers(outsider))
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["my_rank"] is None and body["neighbors"] == []
+    assert body["participants"] == 5 and len(body["top"]) == 3
+    db.close()
@@ -0,0 +1,66 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine
+
+import models
+import ratelimit
+from database import Base
+
+
+@pytest.fixture
+def fresh_limiter(monkeypatch):
+    monkeypatch.setattr(ratelimit.limiter, "store", ratelimit.MemoryStore())
+    return ratelimit.limiter
+
+
+def test_memory_bucket_refills_and_evicts_lru():
+    store = ratelimit.MemoryStore(max_keys=2)
+    rate = 1 / 60  # one token per minute
+    assert [store.take("a", rate, 3, now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.take("a", rate, 3, now=0.0) == pytest.approx(60.0)
+    assert store.take("a", rate, 3, now=30.0) == pytest.approx(30.0)
+    assert store.take("a", rate, 3, now=61.0) == 0.0
+
+    store.take("b", rate, 3, now=61.0)
+    store.take("a", rate, 3, now=61.0)   # "a" becomes most recent
+    store.take("c", rate, 3, now=61.0)   # evicts "b"
+    assert len(store) == 2 and "b" not in store._buckets
+
+
+def test_database_store_is_atomic_token_bucket(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rl.db'}")
+    Base.metadata.create_all(bind=engine, tables=[models.RateLimitBucket.__table__])
+    store = ratelimit.DatabaseStore(engine)
+    rate = 1.0  # one token per second
+    assert [store.take("k", rate, 2, now=100.0) for _ in range(2)] == [0.0, 0.0]
+    assert store.take("k", rate, 2, now=100.0) == pytest.approx(1.0)
+    assert store.take("k", rate, 2, now=100.5) == pytest.approx(0.5)
+    assert store.take("k", rate, 2, now=101.0) == 0.0
+    assert store.purge(now=100.0 + store.IDLE_SECONDS + 2) == 1
+    engine.dispose()
+
+
+def test_login_is_limited_per_email_with_retry_after(client, fresh_limiter):
+    statuses = [client.post("/auth/token", params={"email": "alvo@b10.com", "password": "x"}).status_code
+                for _ in range(6)]
+    assert statuses == [401] * 5 + [429]
+
+    blocked = client.post("/auth/token", params={"email": "alvo@b10.com", "password": "x"})
+    assert blocked.status_code == 429
+    assert int(blocked.headers["Retry-After"]) >= 1
+    assert "Tente novamente" in blocked.json()["detail"]
+
+    # Another account from the same IP still goes through (IP bucket not empty yet).
+    assert client.post("/auth/token", params={"email": "outro@b10.com", "password": "x"}).status_code == 401
+
+
+def test_forwarded_for_only_trusts_configured_hops():
+    limiter = ratelimit.RateLimiter(ratelimit.MemoryStore(), trusted_proxies=1)
+    scope = {"client": ("10.0.0.1", 1234), "headers": [(b"x-forwarded-for", b"6.6.6.6, 200.1.2.3")]}
+    assert limiter.client_ip(scope) == "200.1.2.3"
+    assert ratelimit.RateLimiter(ratelimit.MemoryStore(), trusted_proxies=0).client_ip(scope) == "10.0.0.1"
@@ -0,0 +1,107 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import crud
+import models
+import snapshots
+from conftest import auth_headers
+
+
+def _past_month():
+    first_of_month = datetime.utcnow().replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+    day = first_of_month - timedelta(days=40)
+    return day, day.year, day.month
+
+
+def _live(db, sector_id, month, year):
+    ranking = crud.ranking_query(sector_id, month, year)
+    return [crud.user_to_ranking_entry(r, r.total_points) for r in db.execute(select(ranking).order_by(ranking.c.position))]
+
+
+def _setup(db, when):
+    lider = models.User(email="lider@b10.local", username="lider", hashed_password="x", role=models.UserRole.lider,
+                        status=models.UserStatus.ACTIVE)
+    users = [models.User(email=f"u{i}@b10.local", username=f"u{i}", hashed_password="x", status=models.UserStatus.ACTIVE)
+             for i in range(4)]
+    db.add_all([lider, *users])
+    db.flush()
+    sector = models.Sector(name="Surdo", lider_id=lider.user_id)
+    for u in users[:3]:
+        u.sectors.append(sector)
+    db.flush()
+    for i, points in enumerate((10, 30, 20)):
+        db.add(models.Activity(title=f"Ensaio {i}", type=models.ActivityType.presencial, points_value=points,
+                               activity_date=when, is_general=i == 0, sector=None if i == 0 else sector,
+                               created_by=lider.user_id, checkin_code=f"ACT{i}"))
+    db.add(models.RedeemCode(code_string="ATRASADO", points_value=50, type=models.CodeType.general, is_general=True,
+                             created_by=lider.user_id, created_at=when))
+    db.commit()
+    crud.create_checkin(db, users[0], "ACT0")
+    crud.create_checkin(db, users[1], "ACT1")
+    crud.create_checkin(db, users[2], "ACT2")
+    crud.create_checkin(db, users[1], "ACT2")
+    return sector, users
+
+
+def test_closed_month_is_served_from_snapshot(client, session_factory):
+    db = session_factory()
+    when, year, month = _past_month()
+    sector, users = _setup(db, when)
+    live_geral, live_sector = _live(db, None, month, year), _live(db, sector.sector_id, month, year)
+    live_me = crud.get_my_rank(db, users[2].user_id, sector_id=sector.sector_id, month=month, year=year)
+
+    assert (year, month) in snapshots.pending_months(db)
+    participants = snapshots.close_month(db, year, month)
+    assert participants[snapshots.GENERAL] == 5 and participants[sector.sector_id] == 3  # líder entra no geral
+    assert snapshots.is_frozen(db, year, month)
+    assert (year, month) not in snapshots.pending_months(db)
+
+    assert crud.get_geral_ranking(db, month, year) == live_geral
+    assert crud.get_sector_ranking(db, sector.sector_id, month, year) == live_sector
+    assert crud.get_my_rank(db, users[2].user_id, sector_id=sector.sector_id, month=month, year=year) == live_me
+
+    params = {"sector_id": sector.sector_id, "month": month, "year": year}
+    body = client.get("/ranking/me", params=params, headers=auth_headers(users[2])).json()
+    assert body["my_position"] == live_me.my_position and body["participants"] == 3
+
+    history = client.get("/ranking/history", params={"sector_id": sector.sector_id}, headers=auth_headers(users[1])).json()
+    assert history["history"] == [{"year": year, "month": month, "rank": 1, "position": 1, "total_points": 50, "participants": 3}]
+
+    # Setor criado depois do fechamento: sem período próprio, calculado ao vivo.
+    novo = models.Sector(name="Caixa")
+    users[3].sectors.append(novo)
+    db.commit()
+    assert not snapshots.is_frozen(db, year, month, novo.sector_id)
+    assert [e.user_id for e in crud.get_sector_ranking(db, novo.sector_id, month, year)] == [users[3].user_id]
+    body = client.get("/ranking/me", params={"sector_id": novo.sector_id, "month": month, "year": year},
+                      headers=auth_headers(users[3])).json()
+    assert body["my_position"] == 1 and body["participants"] == 1
+    db.close()
+
+
+def test_late_points_mark_month_stale_until_rebuilt(session_factory):
+    db = session_factory()
+    when, year, month = _past_month()
+    sector, users = _setup(db, when)
+    snapshots.close_month(db, year, month)
+
+    # Code created in the closed month, redeemed now: counts for that month.
+    crud.redeem_code(db, users[3], crud.get_code_by_string(db, "ATRASADO"))
+    assert not snapshots.is_frozen(db, year, month)
+    assert crud.get_geral_ranking(db, month, year)[0].user_id == users[3].user_id  # served live meanwhile
+
+    assert (year, month) in snapshots.close_pending(db)
+    assert snapshots.is_frozen(db, year, month)
+    assert crud.get_geral_ranking(db, month, year) == _live(db, None, month, year)
+
+    with pytest.raises(ValueError):
+        snapshots.close_month(db, *snapshots.current_month())
+    db.close()
@@ -0,0 +1,65 @@
+import sys
+import os
+from datetime import datetime
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import crud
+import models
+import schemas
+import versioning
+from conftest import auth_headers
+
+
+def test_bump_is_written_on_commit_and_discarded_on_rollback(db):
+    seen = []
+    callback = versioning.on_commit(seen.append)
+    try:
+        versioning.bump(db, versioning.SECTORS, versioning.ranking_sector(3))
+        db.commit()
+        versioning.bump(db, versioning.SECTORS)
+        db.commit()
+        db.add(models.Sector(name="Descartado"))
+        db.flush()
+        versioning.bump(db, versioning.SECTORS)
+        db.rollback()
+        db.commit()
+    finally:
+        versioning._callbacks.remove(callback)
+
+    versions, last_modified = versioning.current(db, [versioning.SECTORS, versioning.ranking_sector(3), versioning.USERS])
+    assert versions == {versioning.SECTORS: 2, versioning.ranking_sector(3): 1, versioning.USERS: 0}
+    assert last_modified is not None
+    assert seen == [frozenset({versioning.SECTORS, versioning.ranking_sector(3)}), frozenset({versioning.SECTORS})]
+
+
+def test_ranking_answers_304_until_a_checkin_commits(client, session_factory):
+    db = session_factory()
+    admin = models.User(email="admin@b10.local", username="admin", hashed_password="x",
+                        role=models.UserRole.admin, status=models.UserStatus.ACTIVE)
+    user = models.User(email="u@b10.local", username="u", hashed_password="x", status=models.UserStatus.ACTIVE)
+    db.add_all([admin, user])
+    db.commit()
+    headers = auth_headers(user)
+
+    first = client.get("/ranking/geral", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    cached = client.get("/ranking/geral", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    # Query params are part of the version
+    assert client.get("/ranking/geral", params={"month": 1}, headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    activity = crud.create_activity(db, schemas.ActivityCreate(
+        title="Ensaio", type=models.ActivityType.presencial, activity_date=datetime(2025, 1, 10),
+        points_value=10, is_general=True), admin)
+    assert crud.create_checkin(db, user, activity.checkin_code).startswith("Check-in realizado")
+
+    fresh = client.get("/ranking/geral", headers={**headers, "If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+    assert fresh.json()["ranking"][0]["total_points"] == 10
+    db.close()
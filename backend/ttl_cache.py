@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# -----------------------------------------------------------------------------
+# Per-worker LRU + TTL map shared by the process caches (membership.py,
+# code_cache.py). Invalidation comes from the cache bus; the TTL only bounds
+# how long a missed invalidation can live.
+# -----------------------------------------------------------------------------
+
+
+class TTLCache:
+    """Bounded LRU map with per-entry expiry, safe to share between threads."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation: a load that raced with one is not stored.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        """The cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        """Read before loading from the database; pass it back to put()."""
+        return self._generation
+
+    def put(self, key: Hashable, value, generation: int, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Drops the given keys (everything when called without arguments)."""
+        with self._lock:
+            self._generation += 1
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
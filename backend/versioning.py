@@ -0,0 +1,211 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Change counters + conditional GETs
+#
+# Write paths call bump(db, *scopes); the counters are incremented in the
+# same transaction, right before COMMIT, so a version is never visible
+# without the data it describes. Read endpoints hash the versions of the
+# scopes they depend on into an ETag and answer If-None-Match with 304
+# before running the heavy query.
+#
+# After a successful commit the changed scopes are handed to the on_commit
+# callbacks (live leaderboard, invalidation bus...). Callbacks run inside
+# SQLAlchemy's after_commit hook: they must not touch the session.
+# -----------------------------------------------------------------------------
+RANKING_GENERAL = "ranking:general"
+USERS = "users"          # status/papel/perfil: muda quem aparece e como
+SECTORS = "sectors"
+CODES_GENERAL = "codes:general"
+
+_PENDING_KEY = "changed_scopes"
+_NOTIFY_KEY = "changed_keys"
+
+
+def ranking_sector(sector_id: int) -> str:
+    return f"ranking:sector:{sector_id}"
+
+
+def activities_sector(sector_id: int) -> str:
+    return f"activities:sector:{sector_id}"
+
+
+def ranking_scopes(is_general: bool, sector_id: Optional[int]) -> list[str]:
+    """Rankings afetados por pontos com esse escopo (mesmas regras de calculate_points)."""
+    scopes = []
+    if is_general:
+        scopes.append(RANKING_GENERAL)
+    if sector_id is not None:
+        scopes.append(ranking_sector(sector_id))
+    return scopes
+
+
+def bump(db: Session, *scopes: str) -> None:
+    """Marks scopes as changed; counters are written when the session commits."""
+    db.info.setdefault(_PENDING_KEY, set()).update(s for s in scopes if s)
+
+
+def notify(db: Session, *keys: str) -> None:
+    """Cache-only keys (e.g. one user's memberships): handed to the on_commit
+    callbacks together with the bumped scopes, but without a change counter."""
+    db.info.setdefault(_NOTIFY_KEY, set()).update(k for k in keys if k)
+
+
+def pending(db: Session) -> frozenset:
+    """Scopes bumped (and keys notified) in the current transaction and not yet committed."""
+    return frozenset(db.info.get(_PENDING_KEY) or ()) | frozenset(db.info.get(_NOTIFY_KEY) or ())
+
+
+# --- Commit hooks ----------------------------------------------------------------
+_callbacks: list[Callable[[frozenset], None]] = []
+
+
+def on_commit(callback: Callable[[frozenset], None]) -> Callable[[frozenset], None]:
+    """Registers callback(scopes) to run after every commit that bumped something."""
+    _callbacks.append(callback)
+    return callback
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _increment(session: Session, scope: str, now: datetime) -> None:
+    table = models.ChangeCounter.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(scope=scope, version=1, updated_at=now).on_conflict_do_update(
+            index_elements=[table.c.scope],
+            set_={"version": table.c.version + 1, "updated_at": now},
+        )
+        session.execute(stmt)
+        return
+    result = session.execute(
+        update(table).where(table.c.scope == scope).values(version=table.c.version + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        session.execute(table.insert().values(scope=scope, version=1, updated_at=now))
+
+
+@event.listens_for(Session, "before_commit")
+def _write_counters(session):
+    scopes = session.info.get(_PENDING_KEY)
+    if not scopes:
+        return
+    now = _utcnow()
+    # Ordem fixa: duas transações bumpando os mesmos escopos não se travam.
+    for scope in sorted(scopes):
+        _increment(session, scope, now)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify(session):
+    scopes = session.info.pop(_PENDING_KEY, None)
+    keys = session.info.pop(_NOTIFY_KEY, None)
+    if not scopes and not keys:
+        return
+    changed = frozenset(scopes or ()) | frozenset(keys or ())
+    for callback in list(_callbacks):
+        try:
+            callback(changed)
+        except Exception:
+            logger.exception("on_commit callback failed")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    # Savepoint rollbacks keep what the outer transaction already bumped.
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_NOTIFY_KEY, None)
+
+
+# --- Reading -------------------------------------------------------------------
+def current(db: Session, scopes: Iterable[str]) -> tuple[dict[str, int], Optional[datetime]]:
+    """Returns ({scope: version}, last updated_at) in one PK lookup; unknown scopes are 0."""
+    scopes = sorted(set(scopes))
+    rows = db.execute(
+        select(models.ChangeCounter.scope, models.ChangeCounter.version, models.ChangeCounter.updated_at)
+        .where(models.ChangeCounter.scope.in_(scopes))
+    ).all()
+    versions = {scope: 0 for scope in scopes}
+    last_modified = None
+    for scope, version, updated_at in rows:
+        versions[scope] = version
+        if updated_at and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+    return versions, last_modified
+
+
+def make_etag(versions: dict[str, int], *vary) -> str:
+    raw = ";".join(f"{k}={v}" for k, v in sorted(versions.items()))
+    raw += "|" + "|".join(str(v) for v in vary)
+    return 'W/"%s"' % hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional(request: Request, response: Response, db: Session, scopes: Iterable[str], *vary) -> Optional[Response]:
+    """
+    Sets ETag/Last-Modified on `response`. Returns a 304 Response when the
+    client's copy is current (the endpoint should return it as-is), else None.
+
+    The ETag covers the scope versions, the path/query string and `vary`
+    (e.g. the caller's user_id, for bodies that depend on who asks).
+    """
+    versions, last_modified = current(db, scopes)
+    etag = make_etag(versions, request.url.path, sorted(request.query_params.multi_items()), *vary)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = bool(if_modified_since and last_modified and _not_modified_since(if_modified_since, last_modified))
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def conditional_async(request: Request, response: Response, db, scopes: Iterable[str], *vary) -> Optional[Response]:
+    """conditional() for AsyncSession routes (one PK lookup, run on the async driver)."""
+    return await db.run_sync(lambda session: conditional(request, response, session, scopes, *vary))